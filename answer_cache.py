@@ -0,0 +1,238 @@
+"""
+答案缓存
+基于SQLite的持久化问答缓存，按 (文档内容哈希, 规范化问题, 提供商, 模型, 生成参数) 缓存LLM回答
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    计算文件内容的SHA-256哈希
+    
+    Args:
+        path: 文件路径
+        chunk_size: 每次读取的字节数
+    
+    Returns:
+        十六进制哈希字符串
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题：统一空白、大小写并去掉结尾的问号"""
+    question = re.sub(r"\s+", " ", question).strip().casefold()
+    return question.rstrip("?？ ")
+
+
+class AnswerCache:
+    """SQLite问答缓存，支持过期时间和条目数上限"""
+    
+    def __init__(self, db_path: str = ".qa_cache.sqlite", ttl: Optional[float] = 7 * 24 * 3600,
+                 max_entries: int = 10000):
+        """
+        初始化答案缓存
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 缓存有效期（秒），None表示永不过期
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    doc_hash TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    provider TEXT,
+                    model TEXT,
+                    params TEXT,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_accessed ON answers (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_doc ON answers (doc_hash)")
+    
+    @contextmanager
+    def _connect(self):
+        """打开数据库连接并在结束时提交、关闭（每次操作单独连接，可在多线程中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def make_key(doc_hash: str, question: str, provider: str, model: str,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        生成缓存键
+        
+        Args:
+            doc_hash: 文档内容哈希
+            question: 用户问题（会被规范化）
+            provider: LLM提供商
+            model: 模型名称
+            params: 生成参数（temperature、max_tokens等）
+        
+        Returns:
+            缓存键
+        """
+        payload = json.dumps(
+            [doc_hash, normalize_question(question), provider, model, params or {}],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的回答
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            缓存的回答，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            answer, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            
+            conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+        
+        self.hits += 1
+        return answer
+    
+    def set(self, key: str, answer: str, doc_hash: str = "", question: str = "",
+            provider: str = "", model: str = "", params: Optional[Dict[str, Any]] = None):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键（由make_key生成）
+            answer: LLM回答
+            doc_hash, question, provider, model, params: 便于排查的原始信息
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, doc_hash, question, provider, model, params, answer, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, doc_hash, normalize_question(question), provider, model,
+                 json.dumps(params or {}, sort_keys=True, default=str), answer, now, now)
+            )
+            self._evict(conn, now)
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并在超出上限时淘汰最久未使用的条目"""
+        if self.ttl is not None:
+            conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+        
+        count = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM answers WHERE key IN "
+                "(SELECT key FROM answers ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+    
+    def clear(self, doc_hash: Optional[str] = None):
+        """
+        清空缓存
+        
+        Args:
+            doc_hash: 只清除该文档的缓存（可选）
+        """
+        with self._connect() as conn:
+            if doc_hash:
+                conn.execute("DELETE FROM answers WHERE doc_hash = ?", (doc_hash,))
+            else:
+                conn.execute("DELETE FROM answers")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            包含条目数、命中数、未命中数的字典
+        """
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_path": self.db_path
+        }
+
+
+def create_answer_cache(config: Dict[str, Any]) -> Optional[AnswerCache]:
+    """
+    从配置创建答案缓存
+    
+    Args:
+        config: 配置字典（config.json 中的 "cache" 部分）
+    
+    Returns:
+        答案缓存实例，配置中禁用时返回None
+    """
+    if not config.get("enabled", True):
+        return None
+    return AnswerCache(
+        db_path=config.get("path", ".qa_cache.sqlite"),
+        ttl=config.get("ttl_seconds", 7 * 24 * 3600),
+        max_entries=config.get("max_entries", 10000)
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    
+    db_path = sys.argv[1] if len(sys.argv) > 1 else ".qa_cache.sqlite"
+    cache = AnswerCache(db_path)
+    
+    if len(sys.argv) > 2 and sys.argv[2] == "clear":
+        cache.clear()
+        print(f"✓ 已清空缓存: {db_path}")
+    else:
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
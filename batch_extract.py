@@ -0,0 +1,471 @@
+"""
+批量PDF提取
+在工作进程中逐个提取PDF，记录每个文档的峰值内存（tracemalloc + RSS采样）；
+单个文档超过内存上限时中止并标记该文件，工作进程处理N个文档或RSS超过M MB后自动重启
+"""
+
+import os
+import gc
+import sys
+import json
+import glob
+import time
+import signal
+import _thread
+import argparse
+import threading
+import tracemalloc
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait as wait_connections
+from typing import Dict, Any, List, Optional, Callable
+from pdf_extractor import PDFExtractor
+from answer_cache import hash_file
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+MB = 1024 * 1024
+
+# 默认配置（config.json 的 batch 部分）
+DEFAULT_BATCH_CONFIG = {
+    "workers": 2,
+    "max_document_mb": 1024,
+    "recycle_after_documents": 50,
+    "recycle_after_mb": 1536,
+    "trace_python": True,
+    "sample_interval": 0.02,
+    "low_memory": None
+}
+
+# 提取模式：名称 -> 对提取器执行的函数
+EXTRACT_MODES: Dict[str, Callable[[PDFExtractor], Any]] = {
+    "all": lambda extractor: extractor.extract_all_content(),
+    "text": lambda extractor: extractor.extract_text(),
+    "fields": lambda extractor: extractor.extract_form_fields(),
+    "formatted": lambda extractor: extractor.get_formatted_content(),
+    # 问答所需的内容（供 PDFQASystem.load_extracted 使用）
+    "qa": lambda extractor: extractor.get_qa_content(),
+    # 字段明细、元数据和文件哈希（供 field_store.FieldStore 使用，哈希在工作进程中计算）
+    "records": lambda extractor: {
+        "metadata": extractor._extract_metadata(),
+        "fields": extractor.get_field_records(),
+        "doc_hash": hash_file(extractor.pdf_path)
+    }
+}
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节），无法获取时返回0"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # 只能得到历史峰值：Linux 单位为KB，macOS 为字节
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return 0
+
+
+class MemoryLimitExceeded(MemoryError):
+    """单个文档的内存用量超过上限"""
+
+
+class MemoryMonitor:
+    """
+    在后台线程中采样内存，记录峰值
+    
+    内存增长（RSS相对开始时的增量，或tracemalloc统计的当前Python堆）超过上限时中断主线程，
+    正在进行的提取以 MemoryLimitExceeded 结束。设置上限时只能在主线程中使用。
+    """
+    
+    def __init__(self, limit_mb: Optional[float] = None, interval: float = 0.02, trace_python: bool = True):
+        """
+        初始化内存监控
+        
+        Args:
+            limit_mb: 内存增长上限（MB），为None时只记录不限制
+            interval: RSS采样间隔（秒）
+            trace_python: 是否同时用tracemalloc统计Python堆（更精确，但会使提取变慢）
+        """
+        self.limit = limit_mb * MB if limit_mb else None
+        self.interval = interval
+        self.trace_python = trace_python
+        self.baseline_rss = 0
+        self.peak_rss = 0
+        self.peak_traced = 0
+        self.exceeded = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous_handler = None
+    
+    def _usage(self) -> int:
+        """当前的内存增长（字节）"""
+        rss = current_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        traced = tracemalloc.get_traced_memory()[0] if self.trace_python else 0
+        return max(rss - self.baseline_rss, traced)
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            if self.limit and self._usage() > self.limit and not self.exceeded:
+                self.exceeded = True
+                _thread.interrupt_main()
+    
+    def __enter__(self):
+        gc.collect()
+        self.baseline_rss = self.peak_rss = current_rss()
+        self.exceeded = False
+        self._stop.clear()
+        if self.limit:
+            # 模拟的SIGINT只有在Python处理该信号时才生效（工作进程平时忽略SIGINT）
+            self._previous_handler = signal.signal(signal.SIGINT, signal.default_int_handler)
+        if self.trace_python:
+            tracemalloc.start()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        interrupted = exc_type is KeyboardInterrupt
+        self._stop.set()
+        try:
+            self._thread.join()
+            self._usage()
+        except KeyboardInterrupt:
+            # 中断恰好在提取结束之后才到达
+            interrupted = True
+        finally:
+            if self.trace_python:
+                self.peak_traced = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if self._previous_handler is not None:
+                signal.signal(signal.SIGINT, self._previous_handler)
+                self._previous_handler = None
+        if self.exceeded and interrupted:
+            raise MemoryLimitExceeded(f"内存增长超过上限 {self.limit / MB:g} MB") from None
+        return False
+    
+    def to_dict(self) -> Dict[str, float]:
+        """峰值内存（MB）"""
+        return {
+            "peak_rss_mb": round(self.peak_rss / MB, 1),
+            "rss_growth_mb": round(max(0, self.peak_rss - self.baseline_rss) / MB, 1),
+            "peak_traced_mb": round(self.peak_traced / MB, 1) if self.trace_python else None
+        }
+
+
+def extract_document(pdf_path: str, mode: str = "all", max_document_mb: Optional[float] = None,
+                     trace_python: bool = True, sample_interval: float = 0.02,
+                     low_memory: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    提取单个PDF并测量峰值内存
+    
+    Args:
+        pdf_path: PDF文件路径
+        mode: 提取模式（见 EXTRACT_MODES）
+        max_document_mb: 单个文档的内存上限（MB）
+        trace_python: 是否使用tracemalloc
+        sample_interval: RSS采样间隔（秒）
+        low_memory: 是否使用低内存模式（默认按文件大小决定，见 PDFExtractor）
+    
+    Returns:
+        {"file", "status"（ok/memory_limit/error）, "content", "error", "seconds", 峰值内存...}
+    """
+    result = {"file": pdf_path, "status": "ok", "content": None, "error": None}
+    monitor = MemoryMonitor(max_document_mb, sample_interval, trace_python)
+    start = time.perf_counter()
+    try:
+        with monitor:
+            extractor = PDFExtractor(pdf_path, low_memory=low_memory)
+            result["content"] = EXTRACT_MODES[mode](extractor)
+            result["pages"] = len(extractor.reader.pages)
+            # 及时释放 PdfReader 及其页面缓存，不在进程中累积
+            extractor.close()
+            del extractor
+    except MemoryLimitExceeded as e:
+        result.update(status="memory_limit", error=str(e))
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    gc.collect()
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result.update(monitor.to_dict())
+    return result
+
+
+def init_worker():
+    """工作进程初始化：忽略终端的Ctrl+C（由主进程负责停止工作进程），内存上限由 MemoryMonitor 单独处理"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _worker_loop(conn, options: Dict[str, Any], recycle_after_documents: Optional[int],
+                 recycle_after_mb: Optional[float]):
+    """工作进程：逐个接收文件路径并返回结果，达到重启条件时退出"""
+    init_worker()
+    documents = 0
+    try:
+        while True:
+            pdf_path = conn.recv()
+            if pdf_path is None:
+                break
+            result = extract_document(pdf_path, **options)
+            documents += 1
+            rss = current_rss()
+            # 超过上限的文档可能留下碎片化的堆，处理完后同样重启
+            recycle = (result["status"] == "memory_limit"
+                       or (recycle_after_documents and documents >= recycle_after_documents)
+                       or (recycle_after_mb and rss > recycle_after_mb * MB))
+            result.update(worker_pid=os.getpid(), worker_rss_mb=round(rss / MB, 1), recycled=bool(recycle))
+            conn.send(result)
+            if recycle:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        conn.close()
+
+
+class BatchExtractor:
+    """用工作进程池批量提取PDF，每个工作进程同一时间只处理一个文档，崩溃时可以定位到具体文件"""
+    
+    def __init__(self, workers: int = 2, mode: str = "all", max_document_mb: Optional[float] = 1024,
+                 recycle_after_documents: Optional[int] = 50, recycle_after_mb: Optional[float] = 1536,
+                 trace_python: bool = True, sample_interval: float = 0.02, low_memory: Optional[bool] = None):
+        """
+        初始化批量提取器
+        
+        Args:
+            workers: 工作进程数（0表示在当前进程中逐个提取，不重启）
+            mode: 提取模式（见 EXTRACT_MODES）
+            max_document_mb: 单个文档的内存上限（MB），超过时中止该文档并标记为 memory_limit
+            recycle_after_documents: 工作进程处理多少个文档后重启
+            recycle_after_mb: 工作进程RSS超过多少MB后重启
+            trace_python: 是否使用tracemalloc统计Python堆
+            sample_interval: RSS采样间隔（秒）
+            low_memory: 是否使用低内存模式（默认按文件大小决定）
+        """
+        if mode not in EXTRACT_MODES:
+            raise ValueError(f"不支持的提取模式: {mode}")
+        self.workers = workers
+        self.recycle_after_documents = recycle_after_documents
+        self.recycle_after_mb = recycle_after_mb
+        self.options = {
+            "mode": mode,
+            "max_document_mb": max_document_mb,
+            "trace_python": trace_python,
+            "sample_interval": sample_interval,
+            "low_memory": low_memory
+        }
+        self.stats = {"documents": 0, "workers_started": 0, "recycled": 0, "crashed": 0}
+    
+    def _start_worker(self, context) -> Dict[str, Any]:
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_loop,
+            args=(child_conn, self.options, self.recycle_after_documents, self.recycle_after_mb),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self.stats["workers_started"] += 1
+        return {"process": process, "conn": parent_conn, "task": None}
+    
+    @staticmethod
+    def _stop_worker(worker: Dict[str, Any]):
+        try:
+            worker["conn"].send(None)
+        except (OSError, ValueError):
+            pass
+        worker["process"].join(timeout=5)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+        worker["conn"].close()
+    
+    def run(self, pdf_paths: List[str], on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+            keep_results: bool = True) -> List[Dict[str, Any]]:
+        """
+        批量提取
+        
+        Args:
+            pdf_paths: PDF文件路径列表
+            on_result: 每个文档完成时的回调（按完成顺序）
+            keep_results: 是否保留所有结果并返回（为False时只通过 on_result 逐个传出，内存占用不随文档数增长）
+        
+        Returns:
+            结果列表（与输入顺序一致，keep_results 为False时为空列表）；
+            工作进程异常退出（例如被OOM终止）时，对应文档的 status 为 crashed
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(pdf_paths) if keep_results else []
+        
+        def finish(index, result):
+            if keep_results:
+                results[index] = result
+            self.stats["documents"] += 1
+            if on_result:
+                on_result(result)
+        
+        if self.workers <= 0:
+            for index, pdf_path in enumerate(pdf_paths):
+                finish(index, extract_document(pdf_path, **self.options))
+            return results
+        
+        context = multiprocessing.get_context()
+        pending = deque(enumerate(pdf_paths))
+        workers: List[Dict[str, Any]] = []
+        try:
+            while pending or any(worker["task"] for worker in workers):
+                # 给空闲的工作进程分配文档，不足时启动新的工作进程
+                for worker in workers:
+                    if worker["task"] is None and pending:
+                        worker["task"] = pending.popleft()
+                        worker["conn"].send(worker["task"][1])
+                while pending and len(workers) < self.workers:
+                    worker = self._start_worker(context)
+                    worker["task"] = pending.popleft()
+                    worker["conn"].send(worker["task"][1])
+                    workers.append(worker)
+                
+                busy = [worker for worker in workers if worker["task"]]
+                ready = wait_connections([w["conn"] for w in busy] + [w["process"].sentinel for w in busy])
+                for worker in busy:
+                    if worker["conn"] not in ready and worker["process"].sentinel not in ready:
+                        continue
+                    index, pdf_path = worker["task"]
+                    worker["task"] = None
+                    try:
+                        result = worker["conn"].recv()
+                    except (EOFError, OSError):
+                        worker["process"].join()
+                        exitcode = worker["process"].exitcode
+                        self.stats["crashed"] += 1
+                        result = {
+                            "file": pdf_path,
+                            "status": "crashed",
+                            "content": None,
+                            "error": f"工作进程异常退出（退出码 {exitcode}，可能被OOM终止）",
+                            "worker_pid": worker["process"].pid
+                        }
+                        workers.remove(worker)
+                        worker["conn"].close()
+                    else:
+                        if result.get("recycled"):
+                            self.stats["recycled"] += 1
+                            workers.remove(worker)
+                            self._stop_worker(worker)
+                    finish(index, result)
+        finally:
+            for worker in workers:
+                self._stop_worker(worker)
+        return results
+
+
+def create_batch_extractor(config: Dict[str, Any], mode: str = "all", **overrides) -> BatchExtractor:
+    """
+    从配置创建批量提取器
+    
+    Args:
+        config: config.json 的 batch 部分
+        mode: 提取模式
+        **overrides: 覆盖配置的参数（值为None时忽略）
+    
+    Returns:
+        批量提取器
+    """
+    options = dict(DEFAULT_BATCH_CONFIG)
+    options.update(config or {})
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return BatchExtractor(mode=mode, **options)
+
+
+def print_summary(results: List[Dict[str, Any]], top: int = 5):
+    """打印状态统计、内存占用最高的文档和被标记的文件"""
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print("\n状态: " + "，".join(f"{status}={count}" for status, count in sorted(counts.items())))
+    
+    measured = [r for r in results if r.get("rss_growth_mb") is not None]
+    if measured:
+        print(f"\n内存占用最高的 {min(top, len(measured))} 个文档:")
+        key = lambda r: max(r["rss_growth_mb"], r.get("peak_traced_mb") or 0)
+        for result in sorted(measured, key=key, reverse=True)[:top]:
+            traced = result.get("peak_traced_mb")
+            traced_text = f"，Python堆峰值 {traced} MB" if traced is not None else ""
+            print(f"  {result['file']}: RSS增长 {result['rss_growth_mb']} MB{traced_text}，耗时 {result['seconds']}s")
+    
+    flagged = [r for r in results if r["status"] != "ok"]
+    if flagged:
+        print("\n✗ 需要关注的文件:")
+        for result in flagged:
+            print(f"  [{result['status']}] {result['file']}: {result['error']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数，有文档失败时返回1"""
+    parser = argparse.ArgumentParser(description="批量PDF提取（记录峰值内存）")
+    parser.add_argument("pdf_files", nargs="+", help="PDF文件或通配符")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSONL，每个文档一行）")
+    parser.add_argument("-c", "--config", default="config.json", help="配置文件路径（读取 batch 部分）")
+    parser.add_argument("--mode", choices=list(EXTRACT_MODES), default="all", help="提取模式（默认all）")
+    parser.add_argument("-j", "--workers", type=int, help="工作进程数（0表示在当前进程中提取）")
+    parser.add_argument("--max-doc-mb", type=float, dest="max_document_mb", help="单个文档的内存上限（MB）")
+    parser.add_argument("--recycle-docs", type=int, dest="recycle_after_documents", help="工作进程处理多少个文档后重启")
+    parser.add_argument("--recycle-mb", type=float, dest="recycle_after_mb", help="工作进程RSS超过多少MB后重启")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="只采样RSS，不使用tracemalloc（更快）")
+    parser.add_argument("--low-memory", action="store_true", help="所有文档都使用低内存模式（默认只对大文件启用）")
+    args = parser.parse_args(argv)
+    
+    pdf_paths = []
+    for pattern in args.pdf_files:
+        pdf_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f).get("batch", {})
+    
+    try:
+        extractor = create_batch_extractor(
+            config, args.mode,
+            workers=args.workers,
+            max_document_mb=args.max_document_mb,
+            recycle_after_documents=args.recycle_after_documents,
+            recycle_after_mb=args.recycle_after_mb,
+            trace_python=False if args.no_tracemalloc else None,
+            low_memory=True if args.low_memory else None
+        )
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    
+    def on_result(result):
+        mark = "✓" if result["status"] == "ok" else "✗"
+        print(f"{mark} {result['file']} [{result['status']}] RSS增长 {result.get('rss_growth_mb')} MB，"
+              f"耗时 {result.get('seconds')}s", flush=True)
+        if output:
+            output.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+    
+    try:
+        results = extractor.run(pdf_paths, on_result)
+    finally:
+        if output:
+            output.close()
+    
+    print_summary(results)
+    stats = extractor.stats
+    print(f"\n工作进程: 启动 {stats['workers_started']} 个，重启 {stats['recycled']} 次，异常退出 {stats['crashed']} 次")
+    if args.output:
+        print(f"✓ 结果已保存到: {args.output}")
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+PDF提取基准测试
+对示例PDF（以及额外指定的大文档或按预设生成的合成文档）反复执行PDFExtractor的各项操作，统计耗时（mean/p50/p95）和峰值内存，
+结果保存为JSON，并可与保存的基线比较，超过回归阈值时以非零状态退出
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import platform
+import argparse
+import statistics
+import tracemalloc
+from typing import Dict, Any, List, Optional, Callable
+from pdf_extractor import PDFExtractor
+from pdf_generator import PRESETS, generate_preset
+
+
+# 默认参与测试的示例PDF
+DEFAULT_PDFS = [
+    "New Client Risk Review.pdf",
+    "Business_Information_Form.pdf",
+    "Business_Expense_Reimbursement_Form.pdf",
+    "Enhanced EPLI Questionnaire.pdf",
+    "pdf-form.pdf"
+]
+
+# 默认的基线文件
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# 测试的操作：名称 -> 对新建的提取器执行的函数（open 只测打开文件）
+OPERATIONS: Dict[str, Callable[[PDFExtractor], Any]] = {
+    "open": lambda extractor: None,
+    "text": lambda extractor: extractor.extract_text(),
+    "fields": lambda extractor: extractor.extract_form_fields(),
+    "formatted": lambda extractor: extractor.get_formatted_content(),
+    "structured": lambda extractor: extractor.get_structured_data()
+}
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """计算百分位数（线性插值）"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = p * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _run_once(pdf_path: str, operation: Callable[[PDFExtractor], Any]) -> float:
+    """执行一次操作（包括打开文件），返回耗时（秒）"""
+    start = time.perf_counter()
+    operation(PDFExtractor(pdf_path))
+    return time.perf_counter() - start
+
+
+def _measure_peak_memory(pdf_path: str, operation: Callable[[PDFExtractor], Any]) -> int:
+    """单独执行一次操作并测量Python堆的峰值内存（字节），与计时分开以免影响耗时"""
+    tracemalloc.start()
+    try:
+        operation(PDFExtractor(pdf_path))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_file(pdf_path: str, operations: Optional[List[str]] = None, repeat: int = 5,
+                   warmup: int = 1) -> Dict[str, Dict[str, float]]:
+    """
+    对一个PDF执行基准测试
+    
+    Args:
+        pdf_path: PDF文件路径
+        operations: 要测试的操作名称（默认全部）
+        repeat: 每项操作计时的次数
+        warmup: 计时前的预热次数
+    
+    Returns:
+        操作名称 -> {mean, p50, p95, min, max, peak_memory_kb, runs}
+    """
+    results = {}
+    for name in operations or list(OPERATIONS):
+        operation = OPERATIONS[name]
+        for _ in range(warmup):
+            _run_once(pdf_path, operation)
+        times = [_run_once(pdf_path, operation) for _ in range(repeat)]
+        results[name] = {
+            "mean": statistics.mean(times),
+            "p50": _percentile(times, 0.5),
+            "p95": _percentile(times, 0.95),
+            "min": min(times),
+            "max": max(times),
+            "peak_memory_kb": _measure_peak_memory(pdf_path, operation) / 1024,
+            "runs": repeat
+        }
+    return results
+
+
+def run_benchmarks(pdf_paths: List[str], operations: Optional[List[str]] = None, repeat: int = 5,
+                   warmup: int = 1, verbose: bool = True) -> Dict[str, Any]:
+    """
+    对多个PDF执行基准测试
+    
+    Args:
+        pdf_paths: PDF文件路径列表
+        operations: 要测试的操作名称（默认全部）
+        repeat: 每项操作计时的次数
+        warmup: 计时前的预热次数
+        verbose: 是否打印进度
+    
+    Returns:
+        {"meta": 环境信息, "results": {文件名: {操作: 统计}}}
+    """
+    import pypdf
+    
+    results = {}
+    for pdf_path in pdf_paths:
+        if verbose:
+            print(f"测试: {pdf_path} ...", flush=True)
+        results[os.path.basename(pdf_path)] = benchmark_file(pdf_path, operations, repeat, warmup)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pypdf": pypdf.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "warmup": warmup
+        },
+        "results": results
+    }
+
+
+def compare_with_baseline(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2,
+                          metric: str = "p50", min_delta: float = 0.001) -> List[Dict[str, Any]]:
+    """
+    与基线比较
+    
+    Args:
+        current: 本次结果（run_benchmarks 的返回值）
+        baseline: 基线结果
+        threshold: 回归阈值（0.2 表示比基线慢20%以上视为回归）
+        metric: 比较的统计量（p50 对偶发抖动不敏感）
+        min_delta: 绝对差值小于该秒数时不算回归（避免把亚毫秒级的抖动当作回归）
+    
+    Returns:
+        每个 (文件, 操作) 的比较结果列表，包含 baseline、current、change、regression
+    """
+    comparisons = []
+    for file_name, operations in current["results"].items():
+        for operation, stats in operations.items():
+            base = baseline.get("results", {}).get(file_name, {}).get(operation)
+            if not base or not base.get(metric):
+                continue
+            change = stats[metric] / base[metric] - 1
+            comparisons.append({
+                "file": file_name,
+                "operation": operation,
+                "baseline": base[metric],
+                "current": stats[metric],
+                "change": change,
+                "regression": change > threshold and stats[metric] - base[metric] > min_delta
+            })
+    return comparisons
+
+
+def print_results(report: Dict[str, Any]):
+    """打印结果表格"""
+    print(f"\n{'文件':<34}{'操作':<12}{'mean(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'峰值内存(KB)':>14}")
+    for file_name, operations in report["results"].items():
+        for operation, stats in operations.items():
+            print(f"{file_name[:34]:<36}{operation:<12}{stats['mean'] * 1000:>10.2f}"
+                  f"{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}{stats['peak_memory_kb']:>16.1f}")
+
+
+def print_comparison(comparisons: List[Dict[str, Any]], threshold: float):
+    """打印与基线的比较"""
+    print(f"\n与基线比较（回归阈值 {threshold:.0%}）:")
+    for item in comparisons:
+        mark = "✗ 回归" if item["regression"] else "✓"
+        print(f"  {mark} {item['file']} / {item['operation']}: "
+              f"{item['baseline'] * 1000:.2f}ms -> {item['current'] * 1000:.2f}ms ({item['change']:+.1%})")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数，返回退出状态（有回归时为1）"""
+    parser = argparse.ArgumentParser(description="PDF提取基准测试")
+    parser.add_argument("pdf_files", nargs="*", help="PDF文件或通配符（默认使用示例PDF）")
+    parser.add_argument("--generate", help=f"逗号分隔的合成文档预设，生成后一并测试（可选: {','.join(PRESETS)}）")
+    parser.add_argument("--generated-dir", default="generated_pdfs", help="合成文档的保存目录（已生成的文件会复用）")
+    parser.add_argument("--ops", help=f"逗号分隔的操作（默认全部: {','.join(OPERATIONS)}）")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每项操作计时的次数（默认5）")
+    parser.add_argument("--warmup", type=int, default=1, help="计时前的预热次数（默认1）")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="结果输出文件")
+    parser.add_argument("--baseline", help="基线结果文件，存在时与之比较，不存在时保存本次结果为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="回归阈值（默认0.2，即慢20%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="绝对差值小于该毫秒数时不算回归（默认1）")
+    parser.add_argument("--update-baseline", action="store_true", help=f"把本次结果保存为基线（默认 {DEFAULT_BASELINE}）")
+    args = parser.parse_args(argv)
+    
+    pdf_paths = []
+    for pattern in args.pdf_files or ([] if args.generate else DEFAULT_PDFS):
+        pdf_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    if args.generate:
+        presets = args.generate.split(",")
+        unknown = [name for name in presets if name not in PRESETS]
+        if unknown:
+            print(f"错误: 未知的预设 {', '.join(unknown)}")
+            return 2
+        for name in presets:
+            print(f"生成合成文档: {name} ...", flush=True)
+            pdf_paths.append(generate_preset(name, args.generated_dir))
+    missing = [path for path in pdf_paths if not os.path.exists(path)]
+    if missing:
+        print(f"错误: 找不到文件 {', '.join(missing)}")
+        return 2
+    
+    operations = args.ops.split(",") if args.ops else None
+    unknown = [name for name in operations or [] if name not in OPERATIONS]
+    if unknown:
+        print(f"错误: 不支持的操作 {', '.join(unknown)}")
+        return 2
+    
+    report = run_benchmarks(pdf_paths, operations, args.repeat, args.warmup)
+    print_results(report)
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 结果已保存到: {args.output}")
+    
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparisons = compare_with_baseline(report, baseline, args.threshold,
+                                            min_delta=args.min_delta_ms / 1000)
+        print_comparison(comparisons, args.threshold)
+        regressions = [item for item in comparisons if item["regression"]]
+        if regressions:
+            print(f"\n✗ 发现 {len(regressions)} 项性能回归")
+            status = 1
+        else:
+            print("\n✓ 没有性能回归")
+    elif args.baseline or args.update_baseline:
+        # 基线不存在或要求更新时，把本次结果保存为基线
+        baseline_path = args.baseline or DEFAULT_BASELINE
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ 基线已保存到: {baseline_path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+多轮对话会话
+保存问答历史，在token预算内裁剪或摘要较早的轮次，文档前缀保持不变以便提示词缓存继续命中
+"""
+
+import re
+from typing import Dict, Any, Optional, List, Callable
+
+
+# CJK字符大致每个字符1个token，其他文本大致每4个字符1个token
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数（不依赖分词器）
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ConversationSession:
+    """多轮对话会话，历史长度受token预算约束"""
+    
+    def __init__(self, prefix: Optional[List[Dict[str, Any]]] = None, max_history_tokens: int = 4000,
+                 max_summary_tokens: Optional[int] = None,
+                 summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None):
+        """
+        初始化对话会话
+        
+        Args:
+            prefix: 文档上下文前缀（PDFQASystem.context_prefix），每轮原样放在最前面
+            max_history_tokens: 历史轮次（含摘要）的token预算
+            max_summary_tokens: 较早轮次摘要的token上限（默认为预算的四分之一）
+            summarizer: 摘要函数 (已有摘要, 被移出的消息) -> 新摘要；为None时使用本地截断摘要
+        """
+        self.prefix = list(prefix) if prefix else []
+        self.max_history_tokens = max_history_tokens
+        self.max_summary_tokens = max_summary_tokens or max_history_tokens // 4
+        self.summarizer = summarizer
+        self.history: List[Dict[str, str]] = []
+        self.summary = ""
+        self.turns = 0
+    
+    def history_tokens(self) -> int:
+        """当前历史（含摘要）的估算token数"""
+        return estimate_tokens(self.summary) + sum(estimate_tokens(m["content"]) for m in self.history)
+    
+    def build_messages(self, question: str) -> List[Dict[str, Any]]:
+        """
+        组装本轮请求的消息：文档前缀 + 较早对话摘要 + 最近历史 + 当前问题
+        
+        Args:
+            question: 当前问题
+        
+        Returns:
+            消息列表
+        """
+        messages = list(self.prefix)
+        if self.summary:
+            # 摘要放在前缀之后，以用户/助手消息对的形式出现，不改动文档前缀
+            messages.append({"role": "user", "content": f"（此前对话摘要）\n{self.summary}"})
+            messages.append({"role": "assistant", "content": "好的，我会结合之前的对话继续回答。"})
+        messages.extend(self.history)
+        messages.append({"role": "user", "content": question})
+        return messages
+    
+    def add_turn(self, question: str, answer: str):
+        """
+        记录一轮问答，并在超出预算时裁剪较早的轮次
+        
+        Args:
+            question: 用户问题
+            answer: 回答
+        """
+        self.history.append({"role": "user", "content": question})
+        self.history.append({"role": "assistant", "content": answer})
+        self.turns += 1
+        self._trim()
+    
+    def _trim(self):
+        """把超出预算的最早轮次移入摘要，至少保留最近一轮"""
+        while True:
+            dropped = []
+            while len(self.history) > 2 and self.history_tokens() > self.max_history_tokens:
+                dropped.extend(self.history[:2])
+                del self.history[:2]
+            
+            if not dropped:
+                break
+            
+            if self.summarizer:
+                self.summary = self.summarizer(self.summary, dropped)
+            else:
+                self.summary = self._condense(self.summary, dropped)
+            # 摘要变长后可能再次超出预算，继续裁剪
+            self.summary = self._truncate_summary(self.summary)
+    
+    @staticmethod
+    def _condense(summary: str, dropped: List[Dict[str, str]], max_chars: int = 120) -> str:
+        """本地截断摘要：每轮只保留问题和回答的开头"""
+        lines = [summary] if summary else []
+        for message in dropped:
+            label = "问" if message["role"] == "user" else "答"
+            content = " ".join(message["content"].split())
+            if len(content) > max_chars:
+                content = content[:max_chars] + "…"
+            lines.append(f"{label}: {content}")
+        return "\n".join(lines)
+    
+    def _truncate_summary(self, summary: str) -> str:
+        """摘要超出上限时丢弃最早的行"""
+        lines = summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.max_summary_tokens:
+            lines.pop(0)
+        summary = "\n".join(lines)
+        if estimate_tokens(summary) > self.max_summary_tokens:
+            # 单行仍然过长时只保留结尾（每个字符最多约1个token）
+            summary = "…" + summary[-(self.max_summary_tokens - 1):]
+        return summary
+    
+    def reset(self):
+        """清空对话历史"""
+        self.history = []
+        self.summary = ""
+        self.turns = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取会话统计信息
+        
+        Returns:
+            包含轮数、保留的消息数、历史token数的字典
+        """
+        return {
+            "turns": self.turns,
+            "messages": len(self.history),
+            "history_tokens": self.history_tokens(),
+            "has_summary": bool(self.summary)
+        }
+
+
+def make_llm_summarizer(llm_client) -> Callable[[str, List[Dict[str, str]]], str]:
+    """
+    创建使用LLM生成摘要的摘要函数（不携带文档内容，请求很小）
+    
+    Args:
+        llm_client: LLM客户端
+    
+    Returns:
+        摘要函数
+    """
+    def summarize(summary: str, dropped: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(
+            f"{'用户' if m['role'] == 'user' else '助手'}: {m['content']}" for m in dropped
+        )
+        prompt = "请把下面的对话压缩成简短的要点摘要，保留后续提问可能引用的事实、字段名和编号。\n\n"
+        if summary:
+            prompt += f"已有摘要：\n{summary}\n\n"
+        prompt += f"新的对话：\n{transcript}"
+        return llm_client.chat([{"role": "user", "content": prompt}])
+    
+    return summarize
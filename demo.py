@@ -87,7 +87,8 @@ def demo_step_3_setup_llm():
             config = json.load(f)
         
         api_key = config.get('llm', {}).get('api_key')
-        if not api_key or api_key == "YOUR_API_KEY_HERE":
+        offline = config.get('llm', {}).get('provider') in ("stub", "replay")
+        if not offline and (not api_key or api_key == "YOUR_API_KEY_HERE"):
             print("\n✗ 请在 config.json 中配置有效的API密钥")
             print("\n提示：你可以使用以下服务：")
             print("  - OpenAI: https://platform.openai.com/")
@@ -98,7 +99,7 @@ def demo_step_3_setup_llm():
         llm_client = LLMClientFactory.create_from_file(config_path)
         print(f"\n✓ LLM客户端创建成功")
         print(f"  提供商: {config['llm']['provider']}")
-        print(f"  模型: {config['llm']['model']}")
+        print(f"  模型: {llm_client.model}")
         
         return llm_client
         
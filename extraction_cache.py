@@ -0,0 +1,178 @@
+"""
+提取结果缓存
+基于SQLite的持久化缓存，按文档内容哈希保存问答所需的提取结果（格式化内容、表单字段、字段标签），
+已提取过的文档再次加载时不必重新解析PDF
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# 提取结果的格式版本，提取逻辑变化导致结果不兼容时递增，旧条目视为未命中
+FORMAT_VERSION = 2
+
+# 保存的内容（PDFExtractor.get_qa_content 的结果）
+CONTENT_KEYS = ("formatted", "fields", "labels", "metadata", "field_count")
+
+
+class ExtractionCache:
+    """SQLite提取结果缓存，支持条目数上限"""
+    
+    def __init__(self, db_path: str = ".extraction_cache.sqlite", max_entries: int = 1000):
+        """
+        初始化提取结果缓存
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            max_entries: 最多保留的文档数，超出时淘汰最久未使用的条目
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS extractions (
+                    doc_hash TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    path TEXT,
+                    pages INTEGER,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_accessed ON extractions (accessed_at)")
+    
+    @contextmanager
+    def _connect(self):
+        """打开数据库连接并在结束时提交、关闭（每次操作单独连接，可在多线程中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def get(self, doc_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        读取文档的提取结果
+        
+        Args:
+            doc_hash: 文档内容哈希（answer_cache.hash_file）
+        
+        Returns:
+            {"formatted", "fields", "labels", "metadata", "field_count", "pages"}，未命中时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content, pages FROM extractions WHERE doc_hash = ? AND version = ?",
+                (doc_hash, FORMAT_VERSION)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE extractions SET accessed_at = ? WHERE doc_hash = ?", (time.time(), doc_hash))
+        
+        self.hits += 1
+        content = json.loads(row[0])
+        content["pages"] = row[1]
+        return content
+    
+    def contains(self, doc_hash: str) -> bool:
+        """文档是否已有当前版本的提取结果（不更新访问时间和命中统计）"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM extractions WHERE doc_hash = ? AND version = ?", (doc_hash, FORMAT_VERSION)
+            ).fetchone()
+        return row is not None
+    
+    def set(self, doc_hash: str, content: Dict[str, Any], pages: Optional[int] = None, path: str = ""):
+        """
+        写入提取结果
+        
+        Args:
+            doc_hash: 文档内容哈希
+            content: PDFExtractor.get_qa_content() 的结果（batch_extract 的 qa 模式结果）
+            pages: 页数
+            path: 文件路径（便于排查）
+        """
+        now = time.time()
+        data = {key: content[key] for key in CONTENT_KEYS}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions "
+                "(doc_hash, version, path, pages, content, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_hash, FORMAT_VERSION, path, pages,
+                 json.dumps(data, ensure_ascii=False, default=str), now, now)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM extractions WHERE doc_hash IN "
+                    "(SELECT doc_hash FROM extractions ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+    
+    def clear(self):
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM extractions")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            包含条目数、命中数、未命中数的字典
+        """
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_path": self.db_path
+        }
+
+
+def create_extraction_cache(config: Dict[str, Any]) -> Optional[ExtractionCache]:
+    """
+    从配置创建提取结果缓存
+    
+    Args:
+        config: 配置字典（config.json 中的 "extraction_cache" 部分）
+    
+    Returns:
+        提取结果缓存实例，配置中禁用时返回None
+    """
+    if not config.get("enabled", True):
+        return None
+    return ExtractionCache(
+        db_path=config.get("path", ".extraction_cache.sqlite"),
+        max_entries=config.get("max_entries", 1000)
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    
+    db_path = sys.argv[1] if len(sys.argv) > 1 else ".extraction_cache.sqlite"
+    cache = ExtractionCache(db_path)
+    
+    if len(sys.argv) > 2 and sys.argv[2] == "clear":
+        cache.clear()
+        print(f"✓ 已清空缓存: {db_path}")
+    else:
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,244 @@
+"""
+表单字段匹配器
+在本地把问题与表单字段名/标签做模糊匹配，命中时直接用提取的字段值回答，无需调用LLM
+"""
+
+import re
+import difflib
+from typing import Dict, Any, Optional, List, Set
+
+
+# 问句中的常见虚词，匹配时忽略
+STOP_WORDS = {
+    "what", "whats", "which", "who", "is", "are", "was", "were", "the", "a", "an",
+    "of", "for", "in", "on", "to", "this", "that", "does", "do", "did", "has", "have",
+    "please", "tell", "me", "show", "give", "value", "field", "form", "document",
+    "pdf", "checked", "check", "selected", "ticked", "marked", "box", "option",
+    "it", "its", "there", "any",
+}
+
+# 否定或选择的说法：字段值只能回答肯定的问题，出现这些词时交给LLM
+NEGATION_WORDS = {
+    "not", "no", "never", "none", "neither", "nor", "either", "or", "without",
+    "isnt", "arent", "wasnt", "werent", "doesnt", "dont", "didnt", "hasnt", "havent", "cannot", "cant",
+}
+
+# 中文的否定或选择（"是否"、"有没有" 等在去除虚词短语后才检查）
+CHINESE_NEGATIONS = ["不", "没", "未", "非", "无", "或", "还是"]
+
+# 中文问句中的常见虚词短语
+CHINESE_STOP_PHRASES = [
+    "是什么", "是多少", "是否", "有没有", "请问", "字段", "的值", "被勾选", "勾选",
+    "选中", "填写", "是", "吗", "呢", "了", "的",
+]
+
+# 表示"是否勾选"类问题的关键词
+CHECK_KEYWORDS = [
+    "checked", "selected", "ticked", "marked", "勾选", "选中", "是否",
+]
+
+# 引号包裹的字段名
+QUOTED_PATTERN = re.compile(r"['\"“”‘’「」『』](.+?)['\"“”‘’「」『』]")
+
+
+class FieldMatcher:
+    """表单字段匹配器，用于问题到字段值的确定性查找"""
+    
+    def __init__(self, fields: Dict[str, Dict[str, Any]],
+                 labels: Optional[Dict[str, str]] = None,
+                 threshold: float = 0.85, margin: float = 0.1):
+        """
+        初始化字段匹配器
+        
+        Args:
+            fields: 解释后的字段字典（PDFExtractor.get_interpreted_fields() 的结果）
+            labels: 字段显示标签字典（可选）
+            threshold: 置信度阈值（0-1），低于该值不直接回答
+            margin: 最佳匹配与次佳匹配（不同字段）之间要求的最小分差，避免歧义
+        """
+        self.fields = fields
+        self.labels = labels or {}
+        self.threshold = threshold
+        self.margin = margin
+        
+        # 预先计算每个字段的候选名称及其词集合
+        self._candidates = []
+        for field_name in fields:
+            # 详情字段（以0结尾）随其主字段一起回答，不单独参与匹配
+            if field_name.endswith("0") and field_name[:-1] in fields:
+                continue
+            names = [field_name]
+            if field_name in self.labels:
+                names.append(self.labels[field_name])
+            for name in names:
+                normalized = self._normalize(name)
+                if normalized:
+                    self._candidates.append((field_name, normalized, self._tokens(normalized)))
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """统一大小写、分隔符和标点"""
+        # 拆分驼峰命名
+        text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+        text = text.lower().replace("'s", "")
+        text = re.sub(r"[_\-./:()\[\],;?!？！，。：、]", " ", text)
+        text = re.sub(r"['\"“”‘’「」『』]", "", text)
+        return re.sub(r"\s+", " ", text).strip()
+    
+    @staticmethod
+    def _tokens(normalized: str) -> Set[str]:
+        """分词并去除虚词"""
+        return {t for t in normalized.split() if t not in STOP_WORDS}
+    
+    @staticmethod
+    def _strip_chinese(text: str) -> str:
+        """去除中文虚词短语"""
+        for phrase in CHINESE_STOP_PHRASES:
+            text = text.replace(phrase, " ")
+        return text
+    
+    @staticmethod
+    def _token_similarity(question_tokens: Set[str], field_tokens: Set[str]) -> float:
+        """
+        计算词集合相似度（允许单词拼写轻微不同）
+        
+        Returns:
+            0-1之间的相似度
+        """
+        if not question_tokens or not field_tokens:
+            return 0.0
+        
+        matched = 0
+        remaining = list(question_tokens)
+        for token in field_tokens:
+            if token in remaining:
+                remaining.remove(token)
+                matched += 1
+                continue
+            close = difflib.get_close_matches(token, remaining, n=1, cutoff=0.85)
+            if close:
+                remaining.remove(close[0])
+                matched += 1
+        
+        union = len(field_tokens) + len(question_tokens) - matched
+        return matched / union if union else 0.0
+    
+    def _score(self, query: str, query_tokens: Set[str], normalized: str, tokens: Set[str]) -> float:
+        """计算查询与某个字段名的匹配分数"""
+        if query == normalized:
+            return 1.0
+        ratio = difflib.SequenceMatcher(None, query, normalized).ratio()
+        return max(ratio, self._token_similarity(query_tokens, tokens))
+    
+    @classmethod
+    def has_negation(cls, question: str) -> bool:
+        """判断问题（引号中的字段名除外）是否包含否定或选择"""
+        text = cls._strip_chinese(QUOTED_PATTERN.sub(" ", question))
+        if any(word in text for word in CHINESE_NEGATIONS):
+            return True
+        return bool(set(cls._normalize(text).split()) & NEGATION_WORDS)
+    
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        把问题匹配到最可能的字段
+        
+        Args:
+            question: 用户问题
+        
+        Returns:
+            匹配结果 {field, score}，不够确信时返回None
+        """
+        if not self._candidates or not question.strip():
+            return None
+        # "没有勾选吗"、"A还是B" 这类问题与字段值的含义相反或不止一个字段，不直接回答
+        if self.has_negation(question):
+            return None
+        
+        # 引号中的内容通常就是字段名，优先使用
+        quoted = QUOTED_PATTERN.findall(question)
+        queries: List[str] = [self._normalize(q) for q in quoted if q.strip()]
+        queries.append(self._normalize(self._strip_chinese(question)))
+        
+        best_by_field: Dict[str, float] = {}
+        for query in queries:
+            query_tokens = self._tokens(query)
+            query = " ".join(t for t in query.split() if t in query_tokens)
+            if not query:
+                continue
+            for field_name, normalized, tokens in self._candidates:
+                score = self._score(query, query_tokens, normalized, tokens)
+                if score > best_by_field.get(field_name, 0.0):
+                    best_by_field[field_name] = score
+        
+        if not best_by_field:
+            return None
+        
+        ranked = sorted(best_by_field.items(), key=lambda item: item[1], reverse=True)
+        best_field, best_score = ranked[0]
+        if best_score < self.threshold:
+            return None
+        
+        # 多个字段得分接近时视为歧义，交给LLM处理
+        if len(ranked) > 1 and best_score - ranked[1][1] < self.margin:
+            return None
+        
+        return {"field": best_field, "score": round(best_score, 3)}
+    
+    @staticmethod
+    def is_check_question(question: str) -> bool:
+        """判断问题是否在问"是否勾选" """
+        lowered = question.lower()
+        return any(keyword in lowered for keyword in CHECK_KEYWORDS)
+    
+    def answer(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        尝试直接从字段值回答问题
+        
+        Args:
+            question: 用户问题
+        
+        Returns:
+            {answer, field, score}，无法确信回答时返回None
+        """
+        result = self.match(question)
+        if not result:
+            return None
+        
+        field_name = result["field"]
+        info = self.fields[field_name]
+        value = info["interpreted_value"]
+        
+        if info["is_checked"] or info["is_unchecked"] or self.is_check_question(question):
+            if info["is_checked"]:
+                answer = "Yes"
+                detail = self.fields.get(field_name + "0", {}).get("interpreted_value")
+                if detail:
+                    answer = f"Yes (详情: {detail})"
+            elif info["is_unchecked"]:
+                answer = "No"
+            else:
+                # 非勾选字段被当作勾选问题问到时，如实给出字段值
+                answer = str(value)
+        else:
+            answer = str(value)
+        
+        result["answer"] = answer
+        return result
+
+
+if __name__ == "__main__":
+    import sys
+    from pdf_extractor import PDFExtractor
+    
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else "New Client Risk Review.pdf"
+    questions = sys.argv[2:] or ["Is 'Company has drivers' checked?"]
+    
+    extractor = PDFExtractor(pdf_path)
+    matcher = FieldMatcher(extractor.get_interpreted_fields(), extractor.get_field_labels())
+    
+    for question in questions:
+        result = matcher.answer(question)
+        if result:
+            print(f"{question} -> {result['answer']} (字段: {result['field']}, 置信度: {result['score']})")
+        else:
+            print(f"{question} -> 未能确定匹配字段，需要LLM回答")
@@ -0,0 +1,375 @@
+"""
+表单字段库
+把大量PDF的表单字段（名称、类型、页码、原始值和解释后的值）和元数据写入带索引的SQLite表，
+可以按字段值跨文档查询（例如某个复选框被勾选的所有文档），不必逐个读取PDF或JSON文件
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import sqlite3
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterable, Callable
+
+
+# 默认配置（config.json 的 field_store 部分）
+DEFAULT_FIELD_STORE_CONFIG = {
+    "path": ".field_store.sqlite",
+    "workers": 2,
+    "batch_size": 200
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        doc_hash TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        pages INTEGER,
+        title TEXT,
+        author TEXT,
+        metadata TEXT,
+        field_count INTEGER NOT NULL DEFAULT 0,
+        indexed_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fields (
+        document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        type TEXT,
+        page INTEGER,
+        raw_value TEXT,
+        value TEXT,
+        is_checked INTEGER NOT NULL DEFAULT 0,
+        label TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fields_name_value ON fields (name, value)",
+    "CREATE INDEX IF NOT EXISTS idx_fields_name_checked ON fields (name, is_checked)",
+    "CREATE INDEX IF NOT EXISTS idx_fields_document ON fields (document_id)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (doc_hash)"
+]
+
+
+class FieldStore:
+    """SQLite表单字段库"""
+    
+    def __init__(self, db_path: str = ".field_store.sqlite"):
+        """
+        打开（不存在时创建）字段库
+        
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+    
+    @contextmanager
+    def _connect(self):
+        """打开数据库连接，整个 with 块是一个事务，结束时提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL模式下 NORMAL 不会损坏数据库，只可能丢失断电前最后的事务，批量写入快很多
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        在一个事务中写入多个文档（同一路径的旧记录被替换）
+        
+        Args:
+            documents: [{"path", "fields"（get_field_records 的结果）, 可选 "metadata"、"pages"、
+                "doc_hash"、"size"、"mtime_ns"}, ...]
+        
+        Returns:
+            写入的文档数
+        """
+        count = 0
+        now = time.time()
+        with self._connect() as conn:
+            for document in documents:
+                # 与查询一致使用绝对路径
+                path = os.path.abspath(document["path"])
+                metadata = document.get("metadata") or {}
+                fields = document.get("fields") or []
+                conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+                cursor = conn.execute(
+                    "INSERT INTO documents (path, doc_hash, size, mtime_ns, pages, title, author, metadata, "
+                    "field_count, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, document.get("doc_hash"), document.get("size"), document.get("mtime_ns"),
+                     document.get("pages"), metadata.get("Title"), metadata.get("Author"),
+                     json.dumps(metadata, ensure_ascii=False, default=str), len(fields), now)
+                )
+                conn.executemany(
+                    "INSERT INTO fields (document_id, name, type, page, raw_value, value, is_checked, label) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, field["name"], field.get("type"), field.get("page"),
+                      field.get("raw_value"), field.get("value"), int(bool(field.get("is_checked"))),
+                      field.get("label")) for field in fields]
+                )
+                count += 1
+        return count
+    
+    def _indexed_signatures(self) -> Dict[str, tuple]:
+        """已入库文档的 (大小, 修改时间)"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT path, size, mtime_ns FROM documents").fetchall()
+        return {row["path"]: (row["size"], row["mtime_ns"]) for row in rows}
+    
+    def index_files(self, pdf_paths: List[str], workers: int = 2, batch_size: int = 200, force: bool = False,
+                    on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, int]:
+        """
+        提取PDF并写入字段库，大小和修改时间未变化的文件跳过
+        
+        提取在 batch_extract 的工作进程中进行，结果每 batch_size 个文档写入一次
+        
+        Args:
+            pdf_paths: PDF文件路径列表
+            workers: 工作进程数（0表示在当前进程中提取）
+            batch_size: 每个事务写入的文档数
+            force: 是否重新提取未变化的文件
+            on_result: 每个文档提取完成时的回调（batch_extract 的结果）
+        
+        Returns:
+            {"indexed", "unchanged", "errors"}
+        """
+        from batch_extract import BatchExtractor
+        
+        counts = {"indexed": 0, "unchanged": 0, "errors": 0}
+        indexed = {} if force else self._indexed_signatures()
+        pending = []
+        signatures = {}
+        for pdf_path in pdf_paths:
+            path = os.path.abspath(pdf_path)
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                # 与提取失败一样按文件报告，不影响其他文件入库
+                counts["errors"] += 1
+                if on_result:
+                    on_result({"file": path, "status": "error", "content": None, "error": str(e)})
+                continue
+            signatures[path] = (stat.st_size, stat.st_mtime_ns)
+            if indexed.get(path) == signatures[path]:
+                counts["unchanged"] += 1
+            else:
+                pending.append(path)
+        
+        buffer = []
+        
+        def flush():
+            counts["indexed"] += self.add_documents(buffer)
+            buffer.clear()
+        
+        def collect(result):
+            if on_result:
+                on_result(result)
+            if result["status"] != "ok":
+                counts["errors"] += 1
+                return
+            path = result["file"]
+            buffer.append(dict(result["content"], path=path, pages=result.get("pages"),
+                               size=signatures[path][0], mtime_ns=signatures[path][1]))
+            if len(buffer) >= batch_size:
+                flush()
+        
+        if pending:
+            extractor = BatchExtractor(workers=workers, mode="records", trace_python=False)
+            extractor.run(pending, collect, keep_results=False)
+            flush()
+        return counts
+    
+    def query(self, field: Optional[str] = None, value: Optional[str] = None, like: Optional[str] = None,
+              checked: Optional[bool] = None, path: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询字段值
+        
+        Args:
+            field: 字段名（精确匹配）
+            value: 解释后的值（精确匹配）
+            like: 值的SQL LIKE模式（例如 "%Inc%"，ASCII字母不区分大小写）
+            checked: 只返回已勾选（True）或未勾选（False）的字段
+            path: 只查询该文档
+            limit: 最多返回的行数
+        
+        Returns:
+            [{"path", "name", "type", "page", "value", "raw_value", "is_checked", "label"}, ...]，按路径和字段名排序
+        """
+        filters = {
+            "f.name = ?": field,
+            "f.value = ?": value,
+            "f.value LIKE ?": like,
+            "f.is_checked = ?": None if checked is None else int(checked),
+            "d.path = ?": os.path.abspath(path) if path else None
+        }
+        conditions = [condition for condition, argument in filters.items() if argument is not None]
+        params = [argument for argument in filters.values() if argument is not None]
+        
+        sql = ("SELECT d.path, f.name, f.type, f.page, f.value, f.raw_value, f.is_checked, f.label "
+               "FROM fields f JOIN documents d ON d.id = f.document_id")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY d.path, f.name"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(row, is_checked=bool(row["is_checked"])) for row in rows]
+    
+    def find_documents(self, field: str, value: Optional[str] = None, like: Optional[str] = None,
+                       checked: Optional[bool] = None) -> List[str]:
+        """
+        查询字段满足条件的文档
+        
+        Args:
+            field, value, like, checked: 同 query()
+        
+        Returns:
+            文档路径列表
+        """
+        rows = self.query(field, value=value, like=like, checked=checked)
+        return list(dict.fromkeys(row["path"] for row in rows))
+    
+    def get_document(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取一个文档的元数据和全部字段
+        
+        Returns:
+            文档信息（包括 "fields" 列表），未入库时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        document = dict(row, metadata=json.loads(row["metadata"] or "{}"))
+        document["fields"] = self.query(path=path)
+        return document
+    
+    def remove(self, path: str) -> bool:
+        """删除一个文档及其字段，返回是否存在"""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM documents WHERE path = ?", (os.path.abspath(path),))
+        return cursor.rowcount > 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取字段库统计信息
+        
+        Returns:
+            包含文档数、字段数和不同字段名数量的字典
+        """
+        with self._connect() as conn:
+            documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            fields, names = conn.execute("SELECT COUNT(*), COUNT(DISTINCT name) FROM fields").fetchone()
+        return {
+            "documents": documents,
+            "fields": fields,
+            "field_names": names,
+            "db_path": self.db_path
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description="表单字段库（SQLite）")
+    parser.add_argument("--db", help="字段库路径（默认读取配置 field_store.path）")
+    parser.add_argument("-c", "--config", default="config.json", help="配置文件路径（读取 field_store 部分）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    index = commands.add_parser("index", help="提取PDF并写入字段库")
+    index.add_argument("pdf_files", nargs="+", help="PDF文件、通配符或目录")
+    index.add_argument("-j", "--workers", type=int, help="工作进程数（0表示在当前进程中提取）")
+    index.add_argument("--force", action="store_true", help="重新提取未变化的文件")
+    
+    query = commands.add_parser("query", help="按字段查询")
+    query.add_argument("field", nargs="?", help="字段名")
+    query.add_argument("--value", help="字段值（精确匹配）")
+    query.add_argument("--like", help="字段值的LIKE模式，例如 %%Inc%%")
+    query.add_argument("--checked", action="store_true", help="只返回已勾选的字段")
+    query.add_argument("--unchecked", action="store_true", help="只返回未勾选的字段")
+    query.add_argument("--documents", action="store_true", help="只输出文档路径")
+    query.add_argument("--limit", type=int, help="最多返回的行数")
+    query.add_argument("--json", action="store_true", help="输出JSON")
+    
+    show = commands.add_parser("show", help="显示一个文档的全部字段")
+    show.add_argument("pdf_file", help="PDF文件路径")
+    
+    commands.add_parser("stats", help="显示统计信息")
+    args = parser.parse_args(argv)
+    
+    options = dict(DEFAULT_FIELD_STORE_CONFIG)
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            options.update(json.load(f).get("field_store", {}))
+    store = FieldStore(args.db or options["path"])
+    
+    if args.command == "index":
+        pdf_paths = []
+        for pattern in args.pdf_files:
+            if os.path.isdir(pattern):
+                pattern = os.path.join(pattern, "**", "*.pdf")
+            pdf_paths.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+        start = time.perf_counter()
+        
+        def on_result(result):
+            if result["status"] != "ok":
+                print(f"✗ {result['file']} [{result['status']}] {result.get('error')}", flush=True)
+        
+        counts = store.index_files(pdf_paths, workers=options["workers"] if args.workers is None else args.workers,
+                                   batch_size=options["batch_size"], force=args.force, on_result=on_result)
+        print(f"✓ 已入库 {counts['indexed']} 个文档，未变化 {counts['unchanged']} 个，失败 {counts['errors']} 个"
+              f"（耗时 {time.perf_counter() - start:.2f}s）")
+        return 1 if counts["errors"] else 0
+    
+    if args.command == "query":
+        if args.checked and args.unchecked:
+            print("错误: --checked 和 --unchecked 不能同时使用")
+            return 2
+        checked = True if args.checked else (False if args.unchecked else None)
+        if args.documents:
+            if not args.field:
+                print("错误: --documents 需要指定字段名")
+                return 2
+            paths = store.find_documents(args.field, value=args.value, like=args.like, checked=checked)
+            print(json.dumps(paths, ensure_ascii=False, indent=2) if args.json else "\n".join(paths))
+            return 0
+        rows = store.query(args.field, value=args.value, like=args.like, checked=checked, limit=args.limit)
+        if args.json:
+            print(json.dumps(rows, ensure_ascii=False, indent=2))
+        else:
+            for row in rows:
+                print(f"{row['path']}\t{row['name']}\t{row['value']}")
+        return 0
+    
+    if args.command == "show":
+        document = store.get_document(args.pdf_file)
+        if document is None:
+            print(f"错误: 文档未入库 {args.pdf_file}")
+            return 1
+        print(json.dumps(document, ensure_ascii=False, indent=2))
+        return 0
+    
+    print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+表单差异比较
+比较同一表单两个填写版本的字段值（可选比较每页文本）：每个字段和每页文本先计算哈希，只有哈希不同的才逐项比较。
+提取结果缓存（extraction_cache.py）命中时不解析PDF，只读取缓存和计算哈希；
+差异可以作为上下文交给 PDFQASystem.ask()，不必把两个版本的完整内容都发送给LLM
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import difflib
+import hashlib
+import argparse
+from typing import Dict, Any, Optional, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from extraction_cache import ExtractionCache
+
+
+# 格式化内容（PDFExtractor.get_formatted_content）中文本部分和字段部分的标题，以及每页文本的标题
+TEXT_SECTION = "【文档文本内容】\n"
+FIELDS_SECTION = "\n\n【表单字段内容】\n"
+PAGE_HEADER = re.compile(r"^=== 第 (\d+) 页 ===$", re.MULTILINE)
+
+
+def _digest(text: str) -> str:
+    """内容哈希（只用于比较，不需要抗碰撞强度）"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def split_pages(formatted: str) -> Dict[int, str]:
+    """
+    从格式化内容中拆出每页的文本
+    
+    Args:
+        formatted: get_formatted_content 的结果（或提取结果缓存中的 formatted）
+    
+    Returns:
+        页码到文本的字典（没有文本的页面不包含在内）
+    """
+    start = formatted.find(TEXT_SECTION)
+    if start < 0:
+        return {}
+    start += len(TEXT_SECTION)
+    end = formatted.find(FIELDS_SECTION, start)
+    section = formatted[start:end if end >= 0 else len(formatted)]
+    
+    headers = list(PAGE_HEADER.finditer(section))
+    pages = {}
+    for index, header in enumerate(headers):
+        stop = headers[index + 1].start() if index + 1 < len(headers) else len(section)
+        pages[int(header.group(1))] = section[header.end() + 1:stop].rstrip("\n")
+    return pages
+
+
+def make_snapshot(pdf_path: str, document_hash: str, content: Dict[str, Any],
+                  pages: Optional[int] = None, include_text: bool = False) -> Dict[str, Any]:
+    """
+    从提取结果构建用于比较的快照
+    
+    Args:
+        pdf_path: PDF文件路径
+        document_hash: 文件内容哈希
+        content: {"formatted", "fields", "labels"}（提取结果缓存的内容）
+        pages: 页数
+        include_text: 是否计算每页文本的哈希
+    
+    Returns:
+        {"path", "hash", "pages", "fields", "labels", "field_hashes", "page_texts", "page_hashes"}
+    """
+    fields = {name: info["interpreted_value"] for name, info in content["fields"].items()}
+    snapshot = {
+        "path": pdf_path,
+        "hash": document_hash,
+        "pages": pages,
+        "fields": fields,
+        "labels": content.get("labels") or {},
+        "field_hashes": {name: _digest(str(value)) for name, value in fields.items()},
+        "page_texts": None,
+        "page_hashes": None
+    }
+    if include_text:
+        page_texts = split_pages(content["formatted"])
+        snapshot["page_texts"] = page_texts
+        snapshot["page_hashes"] = {page: _digest(text) for page, text in page_texts.items()}
+    return snapshot
+
+
+def load_snapshot(pdf_path: str, extraction_cache: Optional["ExtractionCache"] = None,
+                  include_text: bool = False, low_memory: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    读取PDF的快照，提取结果缓存命中时不解析PDF，未命中时提取并写入缓存
+    
+    Args:
+        pdf_path: PDF文件路径
+        extraction_cache: 提取结果缓存（可选）
+        include_text: 是否比较页面文本
+        low_memory: 未命中缓存时是否以低内存模式提取（默认按文件大小决定）
+    
+    Returns:
+        快照（见 make_snapshot），另有 "cached" 表示是否命中缓存
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+    from answer_cache import hash_file
+    
+    document_hash = hash_file(pdf_path)
+    content = extraction_cache.get(document_hash) if extraction_cache else None
+    cached = content is not None
+    if cached:
+        pages = content["pages"]
+    else:
+        from pdf_extractor import PDFExtractor
+        with PDFExtractor(pdf_path, low_memory=low_memory) as extractor:
+            content = extractor.get_qa_content()
+            pages = len(extractor.reader.pages)
+        if extraction_cache:
+            extraction_cache.set(document_hash, content, pages, pdf_path)
+    snapshot = make_snapshot(pdf_path, document_hash, content, pages, include_text)
+    snapshot["cached"] = cached
+    return snapshot
+
+
+def _text_changes(old_text: str, new_text: str) -> List[str]:
+    """一页文本的逐行差异（只保留删除和新增的行，以 - 和 + 开头）"""
+    lines = difflib.unified_diff(old_text.splitlines(), new_text.splitlines(), lineterm="", n=0)
+    # 前两行是文件头，@@ 行是位置信息
+    return [line for line in list(lines)[2:] if not line.startswith("@@")]
+
+
+def diff_hash(old_hash: str, new_hash: str, include_text: bool = False) -> str:
+    """差异上下文的哈希（由两个版本的内容哈希和是否比较页面文本决定，用于答案缓存）"""
+    return hashlib.sha256(f"diff:{old_hash}:{new_hash}:{int(include_text)}".encode("utf-8")).hexdigest()
+
+
+def diff_snapshots(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    比较两个快照
+    
+    字段没有值时视为不存在：填写了原来空着的字段记为新增，清空的字段记为删除
+    
+    Args:
+        old: 旧版本快照
+        new: 新版本快照
+    
+    Returns:
+        {"old", "new", "hash"（差异上下文的哈希）, "identical", "added", "removed", "changed", "unchanged", "labels",
+         "pages"（比较了页面文本时为 {"added", "removed", "changed"}，否则为None）, "text_changes"}
+    """
+    old_hashes, new_hashes = old["field_hashes"], new["field_hashes"]
+    added = {name: new["fields"][name] for name in new_hashes if name not in old_hashes}
+    removed = {name: old["fields"][name] for name in old_hashes if name not in new_hashes}
+    changed = {
+        name: {"old": old["fields"][name], "new": new["fields"][name]}
+        for name, digest in new_hashes.items() if name in old_hashes and old_hashes[name] != digest
+    }
+    unchanged = len(new_hashes) - len(added) - len(changed)
+    labels = dict(old["labels"], **new["labels"])
+    include_text = old["page_hashes"] is not None and new["page_hashes"] is not None
+    result = {
+        "old": old["path"],
+        "new": new["path"],
+        "hash": diff_hash(old["hash"], new["hash"], include_text),
+        "identical": old["hash"] == new["hash"],
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged": unchanged,
+        "labels": {name: labels[name] for name in (*added, *removed, *changed) if name in labels},
+        "pages": None,
+        "text_changes": {}
+    }
+    
+    if include_text:
+        old_pages, new_pages = old["page_hashes"], new["page_hashes"]
+        result["pages"] = {
+            "added": sorted(page for page in new_pages if page not in old_pages),
+            "removed": sorted(page for page in old_pages if page not in new_pages),
+            "changed": sorted(page for page, digest in new_pages.items()
+                              if page in old_pages and old_pages[page] != digest)
+        }
+        for page in sorted(set(result["pages"]["added"] + result["pages"]["removed"] + result["pages"]["changed"])):
+            result["text_changes"][page] = _text_changes(old["page_texts"].get(page, ""),
+                                                         new["page_texts"].get(page, ""))
+    return result
+
+
+def diff_pdfs(old_path: str, new_path: str, extraction_cache: Optional["ExtractionCache"] = None,
+              include_text: bool = False, low_memory: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    比较两个PDF的字段值（和页面文本）
+    
+    Args:
+        old_path: 旧版本PDF路径
+        new_path: 新版本PDF路径
+        extraction_cache: 提取结果缓存（可选）
+        include_text: 是否比较页面文本
+        low_memory: 未命中缓存时是否以低内存模式提取
+    
+    Returns:
+        差异（见 diff_snapshots），另有 "cached"（两个文档是否都命中缓存）和 "seconds"
+    """
+    start = time.perf_counter()
+    old = load_snapshot(old_path, extraction_cache, include_text, low_memory)
+    new = load_snapshot(new_path, extraction_cache, include_text, low_memory)
+    result = diff_snapshots(old, new)
+    result["cached"] = old["cached"] and new["cached"]
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def format_delta(diff: Dict[str, Any]) -> str:
+    """
+    把差异格式化为文本，适合作为LLM的上下文
+    
+    Args:
+        diff: diff_snapshots 或 diff_pdfs 的结果
+    
+    Returns:
+        格式化的差异
+    """
+    labels = diff["labels"]
+    
+    def name_with_label(name: str) -> str:
+        return f"{name}（{labels[name]}）" if name in labels else name
+    
+    lines = ["【表单差异】", f"旧版本: {diff['old']}", f"新版本: {diff['new']}", ""]
+    if diff["changed"]:
+        lines.append("修改的字段:")
+        lines.extend(f"• {name_with_label(name)}: {change['old']} → {change['new']}"
+                     for name, change in diff["changed"].items())
+    if diff["added"]:
+        lines.append("新增的字段:")
+        lines.extend(f"• {name_with_label(name)}: {value}" for name, value in diff["added"].items())
+    if diff["removed"]:
+        lines.append("删除的字段:")
+        lines.extend(f"• {name_with_label(name)}: {value}" for name, value in diff["removed"].items())
+    if not (diff["changed"] or diff["added"] or diff["removed"]):
+        lines.append("表单字段没有变化")
+    lines.append(f"未变化的字段: {diff['unchanged']} 个")
+    
+    if diff["pages"] is not None:
+        lines.append("")
+        lines.append("【页面文本差异】")
+        if not diff["text_changes"]:
+            lines.append("页面文本没有变化")
+        for page, changes in diff["text_changes"].items():
+            lines.append(f"=== 第 {page} 页 ===")
+            lines.extend(changes)
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数，两个版本有差异时返回1（与diff命令一致）"""
+    parser = argparse.ArgumentParser(description="比较同一表单两个版本的字段值")
+    parser.add_argument("old_pdf", help="旧版本PDF")
+    parser.add_argument("new_pdf", help="新版本PDF")
+    parser.add_argument("--text", action="store_true", help="同时比较每页文本")
+    parser.add_argument("--json", action="store_true", help="以JSON输出差异")
+    parser.add_argument("-q", "--question", action="append", help="针对差异提问（只把差异发送给LLM，可多次指定）")
+    parser.add_argument("-c", "--config", default="config.json", help="配置文件路径（读取 extraction_cache 和 llm 部分）")
+    parser.add_argument("--low-memory", action="store_true", help="提取时使用低内存模式")
+    args = parser.parse_args(argv)
+    
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    from extraction_cache import create_extraction_cache
+    extraction_cache = create_extraction_cache(config.get("extraction_cache", {}))
+    low_memory = args.low_memory or None
+    
+    try:
+        if args.question:
+            from llm_client import LLMClientFactory
+            from pdf_qa_system import PDFQASystem
+            qa_system = PDFQASystem(LLMClientFactory.create_from_config(config.get("llm", {})),
+                                    extraction_cache=extraction_cache, low_memory=low_memory)
+            diff = qa_system.load_diff(args.old_pdf, args.new_pdf, include_text=args.text)
+        else:
+            diff = diff_pdfs(args.old_pdf, args.new_pdf, extraction_cache, args.text, low_memory)
+    except FileNotFoundError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    
+    if args.json:
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+    else:
+        print(format_delta(diff), end="")
+        if "seconds" in diff:
+            print(f"\n耗时 {diff['seconds'] * 1000:.1f}ms（{'提取结果缓存命中' if diff['cached'] else '已提取PDF'}）")
+    
+    for question in args.question or []:
+        print(f"\n问题: {question}")
+        qa_system.ask_detailed(question, stream=True)
+    
+    return 1 if diff["added"] or diff["removed"] or diff["changed"] or diff["text_changes"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
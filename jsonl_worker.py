@@ -0,0 +1,202 @@
+"""
+JSONL常驻工作模式
+从标准输入逐行读取JSON请求（load、ask、fields、info），向标准输出逐行写入JSON响应；
+提取器、已加载的文档和LLM客户端在请求之间保持，避免每次调用都重新启动Python、导入模块和解析PDF
+"""
+
+import os
+import sys
+import json
+import time
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from typing import Dict, Any, Optional, TextIO
+from llm_client import LLMClient
+from answer_cache import AnswerCache
+from extraction_cache import ExtractionCache
+from pdf_qa_system import PDFQASystem
+
+
+class JSONLWorker:
+    """
+    按行处理JSON请求的工作进程
+    
+    请求: {"id": 1, "op": "ask", "path": "form.pdf", "question": "..."}
+    响应: {"id": 1, "ok": true, "result": {...}} 或 {"id": 1, "ok": false, "error": "...", "type": "..."}
+    流式提问（"stream": true）在最终响应之前输出 {"id": 1, "event": "token", "text": "..."}
+    """
+    
+    def __init__(self, llm_client: LLMClient, answer_cache: Optional[AnswerCache] = None,
+                 field_lookup: bool = True, use_cache: bool = True, max_documents: int = 8,
+                 extraction_cache: Optional[ExtractionCache] = None, low_memory: Optional[bool] = None):
+        """
+        初始化工作进程
+        
+        Args:
+            llm_client: 所有请求共享的LLM客户端
+            answer_cache: 答案缓存（可选）
+            field_lookup: 是否启用字段直接查找
+            use_cache: 是否读取答案缓存
+            max_documents: 同时保留的已加载文档数（按最近使用淘汰）
+            extraction_cache: 提取结果缓存（可选，例如由 watch_folder.py 预先填充）
+            low_memory: 是否以低内存模式提取（默认按文件大小决定），低内存模式下文档只保留提取的内容
+        """
+        self.llm_client = llm_client
+        self.answer_cache = answer_cache
+        self.field_lookup = field_lookup
+        self.use_cache = use_cache
+        self.max_documents = max_documents
+        self.extraction_cache = extraction_cache
+        self.low_memory = low_memory
+        # 路径 -> (修改时间, 问答系统)，文件修改后重新加载
+        self.documents: "OrderedDict[str, Any]" = OrderedDict()
+        self.current: Optional[str] = None
+        self.handlers = {
+            "load": self.handle_load,
+            "ask": self.handle_ask,
+            "fields": self.handle_fields,
+            "info": self.handle_info
+        }
+        self._output: Optional[TextIO] = None
+    
+    def get_document(self, path: Optional[str], reload: bool = False) -> PDFQASystem:
+        """
+        获取已加载的文档，未加载或文件已修改时加载
+        
+        Args:
+            path: PDF文件路径（为None时使用最近一次加载的文档）
+            reload: 是否强制重新加载
+        """
+        if path is None:
+            if self.current is None:
+                raise ValueError("请先加载PDF文件（load 请求或在请求中指定 path）")
+            path = self.current
+        key = os.path.realpath(path)
+        if not os.path.exists(key):
+            raise FileNotFoundError(f"PDF文件不存在: {path}")
+        mtime = os.path.getmtime(key)
+        
+        cached = self.documents.get(key)
+        if cached and cached[0] == mtime and not reload:
+            self.documents.move_to_end(key)
+            self.current = path
+            return cached[1]
+        
+        qa_system = PDFQASystem(self.llm_client, field_lookup=self.field_lookup,
+                                answer_cache=self.answer_cache, use_cache=self.use_cache,
+                                extraction_cache=self.extraction_cache, low_memory=self.low_memory)
+        qa_system.load_pdf(path)
+        self.documents[key] = (mtime, qa_system)
+        self.documents.move_to_end(key)
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+        self.current = path
+        return qa_system
+    
+    def handle_load(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """加载文档：{"op": "load", "path", 可选 "reload"}"""
+        if not request.get("path"):
+            raise ValueError("缺少 path 参数")
+        start = time.perf_counter()
+        qa_system = self.get_document(request["path"], reload=bool(request.get("reload")))
+        return {
+            "path": request["path"],
+            "pages": qa_system.total_pages,
+            "characters": len(qa_system.pdf_content),
+            "elapsed": time.perf_counter() - start
+        }
+    
+    def handle_ask(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """提问：{"op": "ask", "question", 可选 "path"、"stream"、"use_cache"、"use_field_lookup"、"temperature"、"max_tokens"}"""
+        question = request.get("question")
+        if not question:
+            raise ValueError("缺少 question 参数")
+        qa_system = self.get_document(request.get("path"))
+        options = {key: request[key] for key in ("use_cache", "use_field_lookup", "temperature", "max_tokens")
+                   if key in request}
+        if request.get("stream"):
+            options["stream"] = True
+            options["on_token"] = lambda text: self._emit({"id": request.get("id"), "event": "token", "text": text})
+        result = qa_system.ask_detailed(question, verbose=False, **options)
+        return dict(result, question=question)
+    
+    def handle_fields(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """表单字段：{"op": "fields", 可选 "path"}"""
+        qa_system = self.get_document(request.get("path"))
+        # 使用加载时提取的内容，不再重新打开和解析PDF
+        return {
+            "fields": qa_system.field_matcher.fields,
+            "labels": qa_system.field_matcher.labels
+        }
+    
+    def handle_info(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """文档信息：{"op": "info", 可选 "path"}"""
+        qa_system = self.get_document(request.get("path"))
+        # 元数据和字段数在加载时与内容一起提取（或来自提取结果缓存）
+        return {
+            "path": qa_system.pdf_path,
+            "metadata": qa_system.metadata,
+            "pages": qa_system.total_pages,
+            "fields": qa_system.field_count,
+            "characters": len(qa_system.pdf_content)
+        }
+    
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一个请求，返回响应（出错时 ok 为 false）"""
+        request_id = request.get("id")
+        handler = self.handlers.get(request.get("op"))
+        try:
+            if handler is None:
+                raise ValueError(f"不支持的操作: {request.get('op')}（可用: {', '.join(self.handlers)}）")
+            return {"id": request_id, "ok": True, "result": handler(request)}
+        except Exception as e:
+            return {"id": request_id, "ok": False, "error": str(e), "type": type(e).__name__}
+    
+    def _emit(self, message: Dict[str, Any]):
+        """写出一行JSON并立即刷新"""
+        self._output.write(json.dumps(message, ensure_ascii=False, default=str) + "\n")
+        self._output.flush()
+    
+    def run(self, input_stream: TextIO = None, output_stream: TextIO = None, preload: Optional[str] = None) -> int:
+        """
+        逐行处理请求直到输入结束
+        
+        处理期间的 print 输出被重定向到标准错误，标准输出只包含JSON响应
+        
+        Args:
+            input_stream: 请求输入（默认标准输入）
+            output_stream: 响应输出（默认标准输出）
+            preload: 启动时预先加载的PDF（输出一条 id 为 null 的 load 响应）
+        
+        Returns:
+            处理的请求数
+        """
+        input_stream = input_stream or sys.stdin
+        self._output = output_stream or sys.stdout
+        count = 0
+        with redirect_stdout(sys.stderr):
+            if preload:
+                self._emit(self.handle({"op": "load", "path": preload}))
+            for line in input_stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("请求必须是JSON对象")
+                except ValueError as e:
+                    self._emit({"id": None, "ok": False, "error": f"无效的请求: {e}", "type": "ValueError"})
+                    continue
+                self._emit(self.handle(request))
+                count += 1
+        return count
+
+
+if __name__ == "__main__":
+    from llm_offline import StubClient
+    
+    print("JSONL工作模式示例（使用离线stub客户端），每行输入一个请求，例如:", file=sys.stderr)
+    print('  {"id": 1, "op": "load", "path": "Business_Information_Form.pdf"}', file=sys.stderr)
+    print('  {"id": 2, "op": "ask", "question": "What is the company name?"}', file=sys.stderr)
+    JSONLWorker(StubClient(), field_lookup=True).run()
@@ -5,13 +5,396 @@ LLM客户端
 
 import os
 import json
-from typing import Dict, Any, Optional, List
+import time
+import asyncio
+import hashlib
+import inspect
+import functools
+import weakref
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterator, Callable
 from abc import ABC, abstractmethod
+from llm_resilience import (
+    RetryPolicy, AIMDLimiter, RATE_LIMIT_STATUS_CODES, classify_error, call_with_retry, acall_with_retry,
+    create_retry_policy, create_limiter
+)
+from llm_metrics import MetricsRegistry, REGISTRY, record_llm_call
+
+
+# 文档问答的系统提示词，文档内容紧跟其后，整体作为稳定的消息前缀
+DOCUMENT_SYSTEM_PROMPT = "你是一个专业的PDF文档分析助手。请根据以下文档内容回答用户的问题。\n\n文档内容：\n"
+
+# HTTP连接池默认配置（对应配置文件中 llm 的 "http" 部分）
+DEFAULT_HTTP_OPTIONS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "timeout": 60.0,
+    "connect_timeout": 5.0
+}
+
+# 进程内共享的同步SDK客户端，键为 (提供商, base_url, API密钥哈希, 连接池配置)
+_shared_sdk_clients: Dict[tuple, Any] = {}
+_shared_sdk_lock = threading.Lock()
+# 已经预热过连接的SDK客户端（按id记录）
+_warmed_sdk_clients = set()
+
+# 当前正在计量的LLM调用（线程和异步任务各自独立）
+_current_call = contextvars.ContextVar("llm_current_call", default=None)
+# 延迟创建用量统计时使用的锁
+_usage_init_lock = threading.Lock()
+
+
+def metered(method):
+    """
+    记录LLM调用指标的装饰器：耗时、首个token耗时（流式）、token用量和重试次数
+    
+    支持同步方法、异步方法和流式（生成器）方法
+    """
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            with self._metered():
+                return await method(self, *args, **kwargs)
+        return async_wrapper
+    
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def stream_wrapper(self, *args, **kwargs):
+            with self._metered() as call:
+                chunks = method(self, *args, **kwargs)
+                try:
+                    for text in chunks:
+                        if call["ttft"] is None:
+                            call["ttft"] = time.perf_counter() - call["start"]
+                        yield text
+                finally:
+                    chunks.close()
+        return stream_wrapper
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._metered():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _build_http_kwargs(sdk, http_options: Optional[Dict[str, Any]] = None,
+                       use_async: bool = False) -> Dict[str, Any]:
+    """
+    根据连接池配置构建SDK客户端的 timeout 和 http_client 参数
+    
+    Args:
+        sdk: openai 或 anthropic 模块
+        http_options: 连接池配置，缺省项使用 DEFAULT_HTTP_OPTIONS
+        use_async: 是否为异步客户端
+    
+    Returns:
+        传给SDK客户端构造函数的关键字参数
+    """
+    options = dict(DEFAULT_HTTP_OPTIONS)
+    options.update({k: v for k, v in (http_options or {}).items() if k in DEFAULT_HTTP_OPTIONS})
+    # 通过SDK导出的默认值取得它所使用的HTTP库的 Limits 类
+    limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=options["max_connections"],
+        max_keepalive_connections=options["max_keepalive_connections"],
+        keepalive_expiry=options["keepalive_expiry"]
+    )
+    timeout = sdk.Timeout(options["timeout"], connect=options["connect_timeout"])
+    http_client_class = sdk.DefaultAsyncHttpxClient if use_async else sdk.DefaultHttpxClient
+    return {
+        "timeout": timeout,
+        "http_client": http_client_class(limits=limits, timeout=timeout)
+    }
+
+
+def get_shared_sdk_client(provider: str, api_key: Optional[str], base_url: Optional[str] = None,
+                          http_options: Optional[Dict[str, Any]] = None):
+    """
+    获取共享的同步SDK客户端，相同 (提供商, base_url, API密钥, 连接池配置) 复用同一个连接池
+    
+    Args:
+        provider: "openai" 或 "anthropic"
+        api_key: API密钥
+        base_url: API基础URL
+        http_options: 连接池配置
+    
+    Returns:
+        OpenAI 或 Anthropic SDK客户端
+    """
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    cache_key = (provider, base_url, key_hash, tuple(sorted((http_options or {}).items())))
+    with _shared_sdk_lock:
+        client = _shared_sdk_clients.get(cache_key)
+        if client is None:
+            client = _create_sdk_client(provider, api_key, base_url, http_options)
+            _shared_sdk_clients[cache_key] = client
+        return client
+
+
+def _create_sdk_client(provider: str, api_key: Optional[str], base_url: Optional[str] = None,
+                       http_options: Optional[Dict[str, Any]] = None, use_async: bool = False):
+    """创建SDK客户端（SDK自带的重试关闭，由 llm_resilience 统一重试）"""
+    if provider == "openai":
+        import openai as sdk
+        client_class = sdk.AsyncOpenAI if use_async else sdk.OpenAI
+    else:
+        import anthropic as sdk
+        client_class = sdk.AsyncAnthropic if use_async else sdk.Anthropic
+    
+    kwargs = _build_http_kwargs(sdk, http_options, use_async)
+    if base_url:
+        kwargs["base_url"] = base_url
+    return client_class(api_key=api_key, max_retries=0, **kwargs)
+
+
+def _loop_client(clients: "weakref.WeakKeyDictionary", create: Callable[[], Any]):
+    """
+    返回当前事件循环对应的异步SDK客户端，没有时创建
+    
+    异步连接池绑定第一次使用它的事件循环，换一个循环（例如再次 asyncio.run）使用会出错，
+    因此按循环缓存；循环被回收后对应的客户端随之释放。不在事件循环中调用时创建的客户端不缓存。
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return create()
+    client = clients.get(loop)
+    if client is None:
+        client = clients[loop] = create()
+    return client
 
 
 class LLMClient(ABC):
     """LLM客户端抽象基类"""
     
+    # 提供商名称，用于缓存键等场景
+    provider = "unknown"
+    model = ""
+    # 不调用 super().__init__() 的子类使用这些默认值：不重试、不限流、不记录指标
+    retry_policy: Optional[RetryPolicy] = None
+    limiter: Optional[AIMDLimiter] = None
+    metrics: Optional[MetricsRegistry] = None
+    
+    def __init__(self):
+        """初始化用量统计和重试策略"""
+        self._init_usage()
+        self._prefix_cache = None
+        # SDK自带的重试被关闭，统一由这里的策略重试，限流器默认不启用
+        self.retry_policy = RetryPolicy()
+        self.limiter = None
+        # 每次调用的耗时和用量记录到指标注册表（默认为进程内共享的注册表）
+        self.metrics = REGISTRY
+    
+    def _init_usage(self):
+        """创建用量统计及其锁"""
+        self._local = threading.local()
+        self.usage_stats = {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "cache_creation_tokens": 0,
+            "retries": 0,
+            "rate_limited": 0
+        }
+        self._usage_lock = threading.Lock()
+    
+    def _usage(self) -> threading.Lock:
+        """
+        用量统计的锁（第一次使用时创建用量统计，不调用 super().__init__() 的子类也可以使用）
+        
+        Returns:
+            保护 usage_stats 的锁
+        """
+        lock = getattr(self, "_usage_lock", None)
+        if lock is None:
+            with _usage_init_lock:
+                lock = getattr(self, "_usage_lock", None)
+                if lock is None:
+                    self._init_usage()
+                    lock = self._usage_lock
+        return lock
+    
+    @property
+    def last_usage(self) -> Optional[Dict[str, int]]:
+        """当前线程最近一次请求的token用量"""
+        local = getattr(self, "_local", None)
+        return getattr(local, "usage", None) if local else None
+    
+    def _record_usage(self, usage: Dict[str, int]):
+        """
+        记录一次请求的token用量
+        
+        Args:
+            usage: 包含 input_tokens、output_tokens、cached_tokens、cache_creation_tokens 的字典
+        """
+        lock = self._usage()
+        self._local.usage = usage
+        call = _current_call.get()
+        if call is not None:
+            call["usage"] = usage
+        with lock:
+            self.usage_stats["requests"] += 1
+            for key, value in usage.items():
+                self.usage_stats[key] = self.usage_stats.get(key, 0) + (value or 0)
+    
+    def _on_retry(self, attempt: int, error: Exception, delay: float):
+        """重试前记录次数"""
+        rate_limited = getattr(error, "status_code", None) in RATE_LIMIT_STATUS_CODES
+        call = _current_call.get()
+        if call is not None:
+            call["retries"] += 1
+        with self._usage():
+            self.usage_stats["retries"] += 1
+            if rate_limited:
+                self.usage_stats["rate_limited"] += 1
+    
+    @contextmanager
+    def _metered(self):
+        """计量一次调用，结束时把耗时、用量和重试次数写入指标注册表"""
+        call = {"start": time.perf_counter(), "ttft": None, "usage": None, "retries": 0}
+        token = _current_call.set(call)
+        status = "ok"
+        try:
+            yield call
+        except Exception:
+            status = "error"
+            raise
+        except BaseException:
+            # 流被提前关闭或异步任务被取消（如对冲请求中较慢的一方）
+            status = "cancelled"
+            raise
+        finally:
+            try:
+                _current_call.reset(token)
+            except ValueError:
+                # 生成器在另一个上下文中被关闭
+                pass
+            if self.metrics is not None:
+                record_llm_call(self.metrics, self.provider, self.model, time.perf_counter() - call["start"],
+                                ttft=call["ttft"], usage=call["usage"], retries=call["retries"], status=status)
+    
+    def _call(self, func: Callable[[], Any]) -> Any:
+        """按重试策略和并发限流调用SDK"""
+        return call_with_retry(func, self.retry_policy, self.limiter, self._on_retry)
+    
+    async def _acall(self, func: Callable[[], Any]) -> Any:
+        """异步版本的 _call，func 返回可等待对象"""
+        return await acall_with_retry(func, self.retry_policy, self.limiter, self._on_retry)
+    
+    @contextmanager
+    def _stream(self, open_stream: Callable[[], Any]):
+        """
+        建立流式响应，流读完或关闭前一直占用并发名额
+        
+        只重试建立流之前的失败，已经输出的文本不会重复
+        """
+        stream = call_with_retry(open_stream, self.retry_policy, self.limiter, self._on_retry, hold=True)
+        success, rate_limited = False, False
+        try:
+            yield stream
+            success = True
+        except Exception as e:
+            rate_limited = classify_error(e)["rate_limited"]
+            raise
+        finally:
+            if self.limiter:
+                self.limiter.release(success=success, rate_limited=rate_limited)
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """
+        获取累计用量统计，包括提示词缓存命中率
+        
+        Returns:
+            用量统计字典
+        """
+        with self._usage():
+            stats = dict(self.usage_stats)
+        input_tokens = stats["input_tokens"]
+        stats["cache_hit_rate"] = stats["cached_tokens"] / input_tokens if input_tokens else 0.0
+        return stats
+    
+    def build_context_prefix(self, context: str) -> List[Dict[str, Any]]:
+        """
+        构建文档上下文的消息前缀
+        
+        同一文档的所有提问共享这一前缀，内容保持逐字节不变，以便提供商的提示词缓存生效
+        
+        Args:
+            context: 文档内容
+            
+        Returns:
+            放在用户问题之前的消息列表
+        """
+        return [{"role": "system", "content": DOCUMENT_SYSTEM_PROMPT + context}]
+    
+    def _get_context_prefix(self, context: str) -> List[Dict[str, Any]]:
+        """获取上下文前缀，同一上下文只构建一次"""
+        cached = getattr(self, "_prefix_cache", None)
+        if cached is not None and (cached[0] is context or cached[0] == context):
+            return cached[1]
+        prefix = self.build_context_prefix(context)
+        self._prefix_cache = (context, prefix)
+        return prefix
+    
+    def _build_messages(self, question: str, context: Optional[str] = None,
+                        prefix: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        组装问答消息：稳定的文档前缀在前，用户问题在后
+        
+        Args:
+            question: 用户问题
+            context: 上下文信息
+            prefix: 预先构建的上下文前缀（优先于context）
+            
+        Returns:
+            消息列表
+        """
+        if prefix is None and context:
+            prefix = self._get_context_prefix(context)
+        messages = list(prefix) if prefix else []
+        messages.append({
+            "role": "user",
+            "content": question
+        })
+        return messages
+    
+    def warm_up(self, background: bool = True) -> bool:
+        """
+        预热到LLM服务的连接（建立TCP/TLS连接并放入连接池），让第一次提问不必等待握手
+        
+        基类没有网络连接，不做任何事；同一个共享SDK客户端只预热一次
+        
+        Args:
+            background: 是否在后台线程中预热（不阻塞调用方）
+        
+        Returns:
+            是否发起了预热
+        """
+        client = getattr(self, "client", None)
+        if client is None or not hasattr(client, "models"):
+            return False
+        with _shared_sdk_lock:
+            if id(client) in _warmed_sdk_clients:
+                return False
+            _warmed_sdk_clients.add(id(client))
+        
+        def ping():
+            try:
+                # 列出模型不消耗token，只为建立连接
+                client.models.list()
+            except Exception:
+                pass
+        
+        if background:
+            threading.Thread(target=ping, daemon=True).start()
+        else:
+            ping()
+        return True
+    
     @abstractmethod
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """
@@ -26,6 +409,66 @@ class LLMClient(ABC):
         """
         pass
     
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """
+        流式发送聊天请求，按到达顺序逐段返回回复文本
+        
+        默认一次性返回完整回复，子类可基于SDK的流式接口覆盖
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 其他参数
+            
+        Yields:
+            回复文本片段
+        """
+        yield self.chat(messages, **kwargs)
+    
+    def ask_stream(self, question: str, context: Optional[str] = None, **kwargs) -> Iterator[str]:
+        """
+        流式问答接口
+        
+        Args:
+            question: 用户问题
+            context: 上下文信息
+            **kwargs: 其他参数（prefix: 预先构建的上下文前缀）
+            
+        Yields:
+            回复文本片段
+        """
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
+        yield from self.chat_stream(messages, **kwargs)
+    
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """
+        异步发送聊天请求
+        
+        默认在线程中执行同步的chat()，子类可基于异步SDK覆盖
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 其他参数
+            
+        Returns:
+            LLM的回复
+        """
+        return await asyncio.to_thread(self.chat, messages, **kwargs)
+    
+    async def aask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
+        """
+        异步问答接口
+        
+        Args:
+            question: 用户问题
+            context: 上下文信息
+            **kwargs: 其他参数（prefix: 预先构建的上下文前缀）
+            
+        Returns:
+            LLM的回复
+        """
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
+        return await self.achat(messages, **kwargs)
+    
     @abstractmethod
     def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
         """
@@ -34,7 +477,7 @@ class LLMClient(ABC):
         Args:
             question: 用户问题
             context: 上下文信息
-            **kwargs: 其他参数
+            **kwargs: 其他参数（prefix: 预先构建的上下文前缀）
             
         Returns:
             LLM的回复
@@ -45,7 +488,10 @@ class LLMClient(ABC):
 class OpenAIClient(LLMClient):
     """OpenAI客户端"""
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", base_url: Optional[str] = None):
+    provider = "openai"
+    
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", base_url: Optional[str] = None,
+                 http_options: Optional[Dict[str, Any]] = None, shared: bool = True):
         """
         初始化OpenAI客户端
         
@@ -53,66 +499,179 @@ class OpenAIClient(LLMClient):
             api_key: API密钥
             model: 模型名称
             base_url: API基础URL（可选，用于兼容其他OpenAI格式的API）
+            http_options: 连接池配置（连接数、keep-alive、超时），见 DEFAULT_HTTP_OPTIONS
+            shared: 是否与其他相同配置的客户端共享SDK客户端和连接池
         """
         try:
-            from openai import OpenAI
+            import openai  # noqa: F401
         except ImportError:
             raise ImportError("请安装openai库: pip install openai")
         
+        super().__init__()
         self.model = model
-        if base_url:
-            self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self._api_key = api_key
+        self._base_url = base_url
+        self._http_options = http_options
+        self._async_clients = weakref.WeakKeyDictionary()
+        if shared:
+            self.client = get_shared_sdk_client(self.provider, api_key, base_url, http_options)
         else:
-            self.client = OpenAI(api_key=api_key)
+            self.client = _create_sdk_client(self.provider, api_key, base_url, http_options)
+    
+    def _create_async_client(self):
+        """创建异步SDK客户端"""
+        return _create_sdk_client(self.provider, self._api_key, self._base_url, self._http_options, use_async=True)
     
+    @property
+    def async_client(self):
+        """异步SDK客户端（按事件循环创建和缓存；异步连接池绑定事件循环，因此不跨实例共享）"""
+        return _loop_client(self._async_clients, self._create_async_client)
+    
+    @metered
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """发送聊天请求"""
-        response = self.client.chat.completions.create(
+        response = self._call(lambda: self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **kwargs
+        ))
+        return self._handle_response(response)
+    
+    @metered
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """流式发送聊天请求"""
+        if not self._base_url:
+            # 官方API支持在最后一个数据块中返回用量，兼容API不一定支持
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        with self._stream(lambda: self.client.chat.completions.create(
             model=self.model,
             messages=messages,
+            stream=True,
             **kwargs
-        )
+        )) as stream:
+            for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+                if getattr(chunk, "usage", None):
+                    self._record_usage(self._parse_usage(chunk))
+    
+    @metered
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """异步发送聊天请求"""
+        response = await self._acall(lambda: self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **kwargs
+        ))
+        return self._handle_response(response)
+    
+    def _handle_response(self, response) -> str:
+        """记录用量并取出回复文本"""
+        self._record_usage(self._parse_usage(response))
         return response.choices[0].message.content
     
+    @staticmethod
+    def _parse_usage(response) -> Dict[str, int]:
+        """从响应中提取token用量（OpenAI会自动缓存1024 token以上的相同前缀）"""
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return {}
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": usage.prompt_tokens or 0,
+            "output_tokens": usage.completion_tokens or 0,
+            "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+            "cache_creation_tokens": 0
+        }
+    
     def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
         """简单问答接口"""
-        messages = []
-        
-        if context:
-            messages.append({
-                "role": "system",
-                "content": f"你是一个专业的PDF文档分析助手。请根据以下文档内容回答用户的问题。\n\n文档内容：\n{context}"
-            })
-        
-        messages.append({
-            "role": "user",
-            "content": question
-        })
-        
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
         return self.chat(messages, **kwargs)
 
 
 class AnthropicClient(LLMClient):
     """Anthropic Claude客户端"""
     
-    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229"):
+    provider = "anthropic"
+    
+    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229",
+                 http_options: Optional[Dict[str, Any]] = None, shared: bool = True):
         """
         初始化Anthropic客户端
         
         Args:
             api_key: API密钥
             model: 模型名称
+            http_options: 连接池配置（连接数、keep-alive、超时），见 DEFAULT_HTTP_OPTIONS
+            shared: 是否与其他相同配置的客户端共享SDK客户端和连接池
         """
         try:
-            from anthropic import Anthropic
+            import anthropic  # noqa: F401
         except ImportError:
             raise ImportError("请安装anthropic库: pip install anthropic")
         
+        super().__init__()
         self.model = model
-        self.client = Anthropic(api_key=api_key)
+        self._api_key = api_key
+        self._http_options = http_options
+        self._async_clients = weakref.WeakKeyDictionary()
+        if shared:
+            self.client = get_shared_sdk_client(self.provider, api_key, http_options=http_options)
+        else:
+            self.client = _create_sdk_client(self.provider, api_key, http_options=http_options)
     
+    def _create_async_client(self):
+        """创建异步SDK客户端"""
+        return _create_sdk_client(self.provider, self._api_key, http_options=self._http_options, use_async=True)
+    
+    @property
+    def async_client(self):
+        """异步SDK客户端（按事件循环创建和缓存；异步连接池绑定事件循环，因此不跨实例共享）"""
+        return _loop_client(self._async_clients, self._create_async_client)
+    
+    @metered
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """发送聊天请求"""
+        params = self._build_params(messages, **kwargs)
+        response = self._call(lambda: self.client.messages.create(**params))
+        return self._handle_response(response)
+    
+    @metered
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """流式发送聊天请求"""
+        params = self._build_params(messages, **kwargs)
+        # 每次尝试创建新的流管理器，只重试建立流之前的失败
+        managers = []
+        
+        def open_stream():
+            managers.append(self.client.messages.stream(**params))
+            return managers[-1].__enter__()
+        
+        with self._stream(open_stream) as stream:
+            try:
+                for text in stream.text_stream:
+                    yield text
+                self._record_usage(self._parse_usage(stream.get_final_message()))
+            finally:
+                managers[-1].__exit__(None, None, None)
+    
+    @metered
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """异步发送聊天请求"""
+        params = self._build_params(messages, **kwargs)
+        response = await self._acall(lambda: self.async_client.messages.create(**params))
+        return self._handle_response(response)
+    
+    def _handle_response(self, response) -> str:
+        """记录用量并取出回复文本"""
+        self._record_usage(self._parse_usage(response))
+        return response.content[0].text
+    
+    def _build_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """构建请求参数"""
         # Claude需要分离system消息
         system_message = None
         user_messages = []
@@ -130,26 +689,40 @@ class AnthropicClient(LLMClient):
         }
         
         if system_message:
+            # system 可以是字符串，也可以是带 cache_control 的内容块列表
             params["system"] = system_message
         
-        response = self.client.messages.create(**params)
-        return response.content[0].text
+        return params
+    
+    @staticmethod
+    def _parse_usage(response) -> Dict[str, int]:
+        """从响应中提取token用量（input_tokens 为包括缓存读写在内的全部输入）"""
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return {}
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        created = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return {
+            "input_tokens": (usage.input_tokens or 0) + cached + created,
+            "output_tokens": usage.output_tokens or 0,
+            "cached_tokens": cached,
+            "cache_creation_tokens": created
+        }
+    
+    def build_context_prefix(self, context: str) -> List[Dict[str, Any]]:
+        """构建文档上下文前缀，并用 cache_control 标记为可缓存"""
+        return [{
+            "role": "system",
+            "content": [{
+                "type": "text",
+                "text": DOCUMENT_SYSTEM_PROMPT + context,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        }]
     
     def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
         """简单问答接口"""
-        messages = []
-        
-        if context:
-            messages.append({
-                "role": "system",
-                "content": f"你是一个专业的PDF文档分析助手。请根据以下文档内容回答用户的问题。\n\n文档内容：\n{context}"
-            })
-        
-        messages.append({
-            "role": "user",
-            "content": question
-        })
-        
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
         return self.chat(messages, **kwargs)
 
 
@@ -161,6 +734,12 @@ class LLMClientFactory:
         """
         从配置创建LLM客户端
         
+        返回的客户端同时支持同步（chat/ask）和异步（achat/aask）接口，
+        失败时按 "retry" 配置退避重试，配置了 "concurrency" 时按限流反馈自动调整并发数。
+        相同提供商、base_url和API密钥的客户端共享同一个SDK客户端和连接池（按 "http" 配置）。
+        provider 为 "hedged" 时创建对冲请求客户端，见 llm_hedge.py；
+        "stub"（模拟回答）和 "replay"（录制/回放）为离线客户端，见 llm_offline.py
+        
         Args:
             config: 配置字典
             
@@ -169,19 +748,42 @@ class LLMClientFactory:
         """
         provider = config.get("provider", "openai").lower()
         
+        if provider == "hedged":
+            # 组合客户端：主、备用客户端各自按自己的配置创建（各自重试和限流）
+            from llm_hedge import create_hedged_client
+            return create_hedged_client(config, LLMClientFactory.create_from_config)
+        
+        if provider == "replay":
+            # 录制/回放客户端：录制时实际调用的客户端按 "record" 配置创建
+            from llm_offline import create_replay_client
+            return create_replay_client(config, LLMClientFactory.create_from_config)
+        
+        # 连接池配置；warm_up 由 PDFQASystem 使用，不属于连接池参数
+        http_options = {k: v for k, v in config.get("http", {}).items() if k != "warm_up"} or None
+        
         if provider == "openai":
-            return OpenAIClient(
+            client = OpenAIClient(
                 api_key=config.get("api_key") or os.getenv("OPENAI_API_KEY"),
                 model=config.get("model", "gpt-3.5-turbo"),
-                base_url=config.get("base_url")
+                base_url=config.get("base_url"),
+                http_options=http_options
             )
         elif provider == "anthropic":
-            return AnthropicClient(
+            client = AnthropicClient(
                 api_key=config.get("api_key") or os.getenv("ANTHROPIC_API_KEY"),
-                model=config.get("model", "claude-3-sonnet-20240229")
+                model=config.get("model", "claude-3-sonnet-20240229"),
+                http_options=http_options
             )
+        elif provider == "stub":
+            # 模拟客户端：不需要网络和API密钥
+            from llm_offline import create_stub_client
+            client = create_stub_client(config)
         else:
             raise ValueError(f"不支持的LLM提供商: {provider}")
+        
+        client.retry_policy = create_retry_policy(config.get("retry", {}))
+        client.limiter = create_limiter(config.get("concurrency"))
+        return client
     
     @staticmethod
     def create_from_file(config_path: str) -> LLMClient:
@@ -202,8 +804,10 @@ class LLMClientFactory:
 if __name__ == "__main__":
     # 测试代码
     print("LLM客户端模块")
-    print("支持的提供商: OpenAI, Anthropic")
+    print("支持的提供商: OpenAI, Anthropic, 以及离线的 stub/replay")
     print("\n使用示例:")
     print("1. 从配置文件创建: client = LLMClientFactory.create_from_file('config.json')")
     print("2. 直接创建: client = OpenAIClient(api_key='your-key', model='gpt-3.5-turbo')")
     print("3. 问答: answer = client.ask('问题', context='上下文')")
+    print("4. 异步问答: answer = await client.aask('问题', context='上下文')")
+    print("5. 流式问答: for text in client.ask_stream('问题', context='上下文'): print(text, end='')")
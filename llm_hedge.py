@@ -0,0 +1,383 @@
+"""
+对冲请求与提供商回退
+先把请求发给主客户端，超过基于历史延迟（默认p95）的等待时间仍未返回时，再向备用客户端发出对冲请求，
+采用先完成的回答并取消较慢的一方；主客户端出错时立即改用备用客户端。
+指标和用量只由主、备用客户端记录（每个实际发出的请求记录一次），对冲客户端只统计对冲次数
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from queue import Queue, Empty
+from typing import Dict, Any, Optional, List, Iterator, Callable
+from llm_client import LLMClient
+
+
+class LatencyTracker:
+    """记录最近若干次请求的延迟，用于计算对冲等待时间"""
+    
+    def __init__(self, window: int = 200):
+        """
+        初始化延迟记录
+        
+        Args:
+            window: 保留最近多少次请求的延迟
+        """
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency: float):
+        """记录一次请求延迟（秒）"""
+        with self._lock:
+            self._samples.append(latency)
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        计算延迟的百分位数
+        
+        Args:
+            p: 百分位（0-1）
+        
+        Returns:
+            延迟秒数，没有样本时返回None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p * (len(samples) - 1)))))
+        return samples[index]
+
+
+def _run_in_thread(func: Callable[[], Any]) -> Future:
+    """在守护线程中执行函数（停滞的请求不会阻止进程退出）"""
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class HedgedClient(LLMClient):
+    """对冲请求客户端：主客户端较慢或出错时，由备用客户端补发请求"""
+    
+    provider = "hedged"
+    
+    def __init__(self, primary: LLMClient, secondary: LLMClient, delay: Optional[float] = None,
+                 percentile: float = 0.95, min_delay: float = 0.5, max_delay: float = 10.0,
+                 min_samples: int = 20):
+        """
+        初始化对冲请求客户端
+        
+        Args:
+            primary: 主客户端
+            secondary: 备用客户端（另一个模型或另一家提供商）
+            delay: 固定的对冲等待秒数（为None时根据主客户端的历史延迟计算）
+            percentile: 用主客户端延迟的哪个百分位作为等待时间
+            min_delay: 等待时间下限（秒）
+            max_delay: 等待时间上限（秒），样本不足时使用
+            min_samples: 至少积累多少个样本后才使用百分位
+        """
+        super().__init__()
+        self.primary = primary
+        self.secondary = secondary
+        self.model = primary.model
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        # 完整回答的延迟和流式请求的首个token延迟分别记录
+        self.latency = LatencyTracker()
+        self.ttft = LatencyTracker()
+        # 重试由主、备用客户端各自负责
+        self.retry_policy = None
+        self.usage_stats.update({"hedges": 0, "hedge_wins": 0, "fallbacks": 0})
+    
+    def hedge_delay(self, stream: bool = False) -> float:
+        """
+        当前的对冲等待时间（秒）
+        
+        Args:
+            stream: 是否为流式请求（按首个token延迟计算）
+        """
+        if self.delay is not None:
+            return self.delay
+        tracker = self.ttft if stream else self.latency
+        if len(tracker) < self.min_samples:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, tracker.percentile(self.percentile)))
+    
+    def _use_usage(self, usage: Optional[Dict[str, int]]):
+        """把胜出一方的用量作为本客户端的 last_usage（已计入该客户端自己的统计，这里不再累加）"""
+        self._usage()
+        self._local.usage = usage or {}
+    
+    def _count(self, key: str):
+        """累加对冲统计"""
+        with self._usage_lock:
+            self.usage_stats[key] += 1
+    
+    def _track_primary(self, future, start: float):
+        """主请求完成后记录其延迟（即使对冲请求先返回，也记录主请求的真实延迟）"""
+        def done(f):
+            if not f.cancelled() and f.exception() is None:
+                self.latency.record(time.perf_counter() - start)
+        future.add_done_callback(done)
+    
+    def _hedge(self, call: Callable[[LLMClient], str]) -> str:
+        """按对冲策略执行同步请求"""
+        def run(client):
+            answer = call(client)
+            return answer, client.last_usage
+        
+        start = time.perf_counter()
+        primary = _run_in_thread(lambda: run(self.primary))
+        self._track_primary(primary, start)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            answer, usage = primary.result()
+            self._use_usage(usage)
+            return answer
+        
+        self._count("fallbacks" if done else "hedges")
+        secondary = _run_in_thread(lambda: run(self.secondary))
+        pending = {secondary} if done else {primary, secondary}
+        error = primary.exception() if done else None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                # 同步请求无法中途中断，较慢的一方在后台结束后被丢弃
+                for other in pending:
+                    other.cancel()
+                if future is secondary:
+                    self._count("hedge_wins")
+                answer, usage = future.result()
+                self._use_usage(usage)
+                return answer
+        raise error
+    
+    async def _ahedge(self, call: Callable[[LLMClient], Any]) -> str:
+        """按对冲策略执行异步请求，较慢的一方被取消"""
+        async def run(client):
+            answer = await call(client)
+            return answer, client.last_usage
+        
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(run(self.primary))
+        self._track_primary(primary, start)
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            answer, usage = primary.result()
+            self._use_usage(usage)
+            return answer
+        
+        self._count("fallbacks" if done else "hedges")
+        secondary = asyncio.ensure_future(run(self.secondary))
+        pending = {secondary} if done else {primary, secondary}
+        error = primary.exception() if done else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                for other in pending:
+                    other.cancel()
+                if task is secondary:
+                    self._count("hedge_wins")
+                answer, usage = task.result()
+                self._use_usage(usage)
+                return answer
+        raise error
+    
+    def _hedge_stream(self, call: Callable[[LLMClient], Iterator[str]]) -> Iterator[str]:
+        """按对冲策略执行流式请求：先输出第一段文本的一方胜出，另一方的流被关闭"""
+        events = Queue()
+        cancelled = [threading.Event(), threading.Event()]
+        clients = [self.primary, self.secondary]
+        
+        def pump(index):
+            client = clients[index]
+            try:
+                chunks = call(client)
+                try:
+                    for text in chunks:
+                        if cancelled[index].is_set():
+                            break
+                        events.put((index, "chunk", text))
+                finally:
+                    close = getattr(chunks, "close", None)
+                    if close:
+                        close()
+                events.put((index, "done", client.last_usage))
+            except Exception as e:
+                events.put((index, "error", e))
+        
+        def start(index):
+            threading.Thread(target=pump, args=(index,), daemon=True).start()
+        
+        start_time = time.perf_counter()
+        start(0)
+        started = 1
+        winner = None
+        error = None
+        finished = set()
+        deadline = start_time + self.hedge_delay(stream=True)
+        primary_started = [False]
+        
+        def track_ttft(index, kind):
+            """记录主请求第一段文本的延迟（即使另一方已经胜出）"""
+            if index == 0 and kind == "chunk" and not primary_started[0]:
+                primary_started[0] = True
+                self.ttft.record(time.perf_counter() - start_time)
+        
+        while winner is None:
+            timeout = max(0.0, deadline - time.perf_counter()) if started == 1 else None
+            try:
+                index, kind, payload = events.get(timeout=timeout)
+            except Empty:
+                # 主请求在等待时间内没有输出，发出对冲请求
+                self._count("hedges")
+                start(1)
+                started = 2
+                continue
+            
+            track_ttft(index, kind)
+            if kind == "error":
+                error = error or payload
+                finished.add(index)
+                if started == 1:
+                    self._count("fallbacks")
+                    start(1)
+                    started = 2
+                elif len(finished) == 2:
+                    raise error
+                continue
+            
+            winner = index
+            cancelled[1 - index].set()
+            if index == 1:
+                self._count("hedge_wins")
+            if kind == "chunk":
+                yield payload
+            else:
+                self._use_usage(payload)
+                return
+        
+        while True:
+            index, kind, payload = events.get()
+            track_ttft(index, kind)
+            if index != winner:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "done":
+                self._use_usage(payload)
+                return
+            else:
+                raise payload
+    
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """发送聊天请求"""
+        return self._hedge(lambda client: client.chat(messages, **kwargs))
+    
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """流式发送聊天请求"""
+        return self._hedge_stream(lambda client: client.chat_stream(messages, **kwargs))
+    
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """异步发送聊天请求"""
+        return await self._ahedge(lambda client: client.achat(messages, **kwargs))
+    
+    @staticmethod
+    def _own_prefix_kwargs(context: Optional[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """有上下文时由各客户端自行构建前缀（如Anthropic的cache_control），不使用统一前缀"""
+        kwargs = dict(kwargs)
+        if context:
+            kwargs.pop("prefix", None)
+        return kwargs
+    
+    def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
+        """简单问答接口"""
+        kwargs = self._own_prefix_kwargs(context, kwargs)
+        return self._hedge(lambda client: client.ask(question, context=context, **kwargs))
+    
+    def ask_stream(self, question: str, context: Optional[str] = None, **kwargs) -> Iterator[str]:
+        """流式问答接口"""
+        kwargs = self._own_prefix_kwargs(context, kwargs)
+        return self._hedge_stream(lambda client: client.ask_stream(question, context=context, **kwargs))
+    
+    async def aask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
+        """异步问答接口"""
+        kwargs = self._own_prefix_kwargs(context, kwargs)
+        return await self._ahedge(lambda client: client.aask(question, context=context, **kwargs))
+    
+    def warm_up(self, background: bool = True) -> bool:
+        """同时预热主、备用客户端的连接"""
+        primary = self.primary.warm_up(background)
+        secondary = self.secondary.warm_up(background)
+        return primary or secondary
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """获取累计用量统计：主、备用客户端的用量之和，加上对冲次数和当前对冲等待时间"""
+        stats = super().get_usage_stats()
+        for client in (self.primary, self.secondary):
+            for key, value in client.get_usage_stats().items():
+                if key in ("requests", "input_tokens", "output_tokens", "cached_tokens",
+                           "cache_creation_tokens", "retries", "rate_limited"):
+                    stats[key] += value
+        input_tokens = stats["input_tokens"]
+        stats["cache_hit_rate"] = stats["cached_tokens"] / input_tokens if input_tokens else 0.0
+        stats["hedge_delay"] = self.hedge_delay()
+        stats["stream_hedge_delay"] = self.hedge_delay(stream=True)
+        return stats
+
+
+def create_hedged_client(config: Dict[str, Any], create_client: Callable[[Dict[str, Any]], LLMClient]) -> HedgedClient:
+    """
+    从配置创建对冲请求客户端
+    
+    Args:
+        config: llm 配置，包含 "primary"、"secondary" 和可选的 "hedge" 部分
+        create_client: 根据单个提供商配置创建客户端的函数
+    
+    Returns:
+        对冲请求客户端
+    """
+    if "primary" not in config or "secondary" not in config:
+        raise ValueError("hedged 提供商需要同时配置 primary 和 secondary")
+    hedge = config.get("hedge", {})
+    return HedgedClient(
+        create_client(config["primary"]),
+        create_client(config["secondary"]),
+        delay=hedge.get("delay"),
+        percentile=hedge.get("percentile", 0.95),
+        min_delay=hedge.get("min_delay", 0.5),
+        max_delay=hedge.get("max_delay", 10.0),
+        min_samples=hedge.get("min_samples", 20)
+    )
+
+
+if __name__ == "__main__":
+    print("对冲请求客户端")
+    print("\n配置示例（config.json 的 llm 部分）:")
+    print('  {"provider": "hedged",')
+    print('   "primary": {"provider": "openai", "model": "gpt-4o-mini"},')
+    print('   "secondary": {"provider": "anthropic", "model": "claude-3-5-haiku-latest"},')
+    print('   "hedge": {"percentile": 0.95, "min_delay": 0.5, "max_delay": 10.0}}')
@@ -0,0 +1,273 @@
+"""
+LLM调用指标
+进程内的指标注册表：计数器和直方图（延迟、首个token耗时、token用量、重试次数），
+可导出为JSON或Prometheus文本格式
+"""
+
+import json
+import threading
+from typing import Dict, Any, Optional, Tuple, List
+
+
+# 延迟直方图的桶边界（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# token数直方图的桶边界
+TOKEN_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+def _format_value(value: float) -> str:
+    """格式化指标值（整数不带小数点）"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """累积桶直方图（与Prometheus的histogram语义一致）"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        初始化直方图
+        
+        Args:
+            buckets: 递增的桶上界（自动追加 +Inf）
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        """记录一个观测值"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        按桶估算百分位数（返回所在桶的上界）
+        
+        落在 +Inf 桶时返回最大的有限桶边界（实际值不小于它），导出的JSON中不会出现 Infinity
+        
+        Args:
+            p: 百分位（0-1）
+        
+        Returns:
+            估算值，没有观测值（或没有有限的桶边界）时返回None
+        """
+        if not self.count:
+            return None
+        target = p * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count and i < len(self.buckets):
+                return self.buckets[i]
+        return self.buckets[-1] if self.buckets else None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": buckets
+        }
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表，指标按 (名称, 标签) 区分"""
+    
+    def __init__(self):
+        """初始化空的注册表"""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+    
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+    
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels):
+        """
+        累加计数器
+        
+        Args:
+            name: 指标名称
+            value: 增加的值
+            help_text: 指标说明（导出Prometheus格式时使用）
+            **labels: 标签
+        """
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help_text:
+                self._help.setdefault(name, help_text)
+    
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+                help_text: str = "", **labels):
+        """
+        记录直方图观测值
+        
+        Args:
+            name: 指标名称
+            value: 观测值
+            buckets: 首次创建时使用的桶边界
+            help_text: 指标说明
+            **labels: 标签
+        """
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+            if help_text:
+                self._help.setdefault(name, help_text)
+    
+    def get_counter(self, name: str, **labels) -> float:
+        """读取计数器的值（不带标签时为所有标签之和）"""
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(self._label_key(labels), 0)
+            return sum(series.values())
+    
+    def get_histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """读取直方图"""
+        with self._lock:
+            return self._histograms.get(name, {}).get(self._label_key(labels))
+    
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        导出为字典
+        
+        Returns:
+            {"counters": {名称: [{labels, value}]}, "histograms": {名称: [{labels, ...}]}}
+        """
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [dict(histogram.to_dict(), labels=dict(key)) for key, histogram in series.items()]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+    
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """导出为JSON字符串"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent, default=str)
+    
+    @staticmethod
+    def _format_labels(key: tuple, extra: Optional[List[Tuple[str, str]]] = None) -> str:
+        pairs = list(key) + (extra or [])
+        if not pairs:
+            return ""
+        escaped = []
+        for k, v in pairs:
+            v = v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            escaped.append(f'{k}="{v}"')
+        return "{" + ",".join(escaped) + "}"
+    
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else f"{bound:g}"
+                        lines.append(f"{name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+    
+    def write(self, path: str):
+        """
+        写入文件：.json 结尾时为JSON，否则为Prometheus文本格式
+        
+        Args:
+            path: 输出文件路径
+        """
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+# 进程内默认的指标注册表，所有LLM客户端默认记录到这里
+REGISTRY = MetricsRegistry()
+
+
+def record_llm_call(registry: MetricsRegistry, provider: str, model: str, latency: float,
+                    ttft: Optional[float] = None, usage: Optional[Dict[str, int]] = None,
+                    retries: int = 0, status: str = "ok"):
+    """
+    记录一次LLM调用
+    
+    Args:
+        registry: 指标注册表
+        provider: 提供商
+        model: 模型名称
+        latency: 调用耗时（秒）
+        ttft: 首个token耗时（秒，仅流式）
+        usage: token用量
+        retries: 重试次数
+        status: 调用结果（"ok"、"error" 或 "cancelled"）
+    """
+    labels = {"provider": provider, "model": model}
+    registry.inc("llm_requests_total", help_text="LLM请求次数", status=status, **labels)
+    registry.observe("llm_request_latency_seconds", latency, help_text="LLM请求耗时（秒）", **labels)
+    if ttft is not None:
+        registry.observe("llm_time_to_first_token_seconds", ttft, help_text="首个token耗时（秒）", **labels)
+    if retries:
+        registry.inc("llm_retries_total", retries, help_text="LLM请求重试次数", **labels)
+    if usage:
+        input_tokens = usage.get("input_tokens") or 0
+        registry.inc("llm_input_tokens_total", input_tokens, help_text="输入token数", **labels)
+        registry.inc("llm_output_tokens_total", usage.get("output_tokens") or 0, help_text="输出token数", **labels)
+        registry.inc("llm_cached_tokens_total", usage.get("cached_tokens") or 0,
+                     help_text="命中提示词缓存的输入token数", **labels)
+        registry.observe("llm_prompt_tokens", input_tokens, buckets=TOKEN_BUCKETS,
+                         help_text="每次请求的输入token数", **labels)
+
+
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    record_llm_call(registry, "openai", "gpt-4o-mini", 1.2, ttft=0.3,
+                    usage={"input_tokens": 1500, "output_tokens": 40, "cached_tokens": 1024})
+    record_llm_call(registry, "openai", "gpt-4o-mini", 0.8, retries=1,
+                    usage={"input_tokens": 1500, "output_tokens": 35, "cached_tokens": 1024})
+    print(registry.to_prometheus())
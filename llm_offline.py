@@ -0,0 +1,365 @@
+"""
+离线LLM客户端
+stub：按可配置的延迟、吞吐和token模型生成模拟回答，不需要网络和API密钥
+replay：把真实请求和回答录制到cassette文件，之后按请求哈希回放，结果可重复
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Dict, Any, Optional, List, Iterator
+from llm_client import LLMClient, metered
+from conversation import estimate_tokens
+
+
+# 打包提问中的问题行（见 question_packer.build_packed_prompt）
+PACKED_QUESTION_PATTERN = re.compile(r"^(q\d+): (.+)$", re.MULTILINE)
+
+
+class StubRateLimitError(Exception):
+    """stub客户端模拟的限流错误（可被 llm_resilience 识别并重试）"""
+    
+    status_code = 429
+    
+    def __init__(self):
+        super().__init__("模拟限流 (429)")
+        self.response = None
+
+
+class ReplayMissError(LookupError):
+    """回放模式下cassette中没有对应的请求"""
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """取出消息的文本内容（兼容内容块列表）"""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+class StubClient(LLMClient):
+    """模拟LLM客户端：回答内容可预测，耗时和token用量按配置的模型计算"""
+    
+    provider = "stub"
+    
+    def __init__(self, model: str = "stub", latency: float = 0.05, tokens_per_second: float = 200.0,
+                 output_tokens: int = 32, jitter: float = 0.0, error_rate: float = 0.0,
+                 response: Optional[str] = None, seed: Optional[int] = None):
+        """
+        初始化模拟客户端
+        
+        Args:
+            model: 模型名称（只用于缓存键和统计）
+            latency: 首个token前的固定延迟（秒）
+            tokens_per_second: 输出速度（每秒token数），为0时不模拟输出耗时
+            output_tokens: 每个回答按多少输出token计费和计时
+            jitter: 延迟的随机波动比例（0.1 表示 ±10%）
+            error_rate: 模拟限流错误的概率（0-1）
+            response: 固定的回答文本（为None时根据问题生成）
+            seed: 随机数种子（用于可重复的抖动和错误）
+        """
+        super().__init__()
+        self.model = model
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.response = response
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._seen_prefixes = set()
+    
+    def _plan(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """计算一次请求的回答、耗时和用量"""
+        with self._random_lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter) if self.jitter else 1.0
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+        if fail:
+            raise StubRateLimitError()
+        
+        # 与提供商的提示词缓存一致：相同的system前缀第二次出现时计为缓存命中
+        system = "".join(_message_text(m) for m in messages if m["role"] == "system")
+        input_tokens = sum(estimate_tokens(_message_text(m)) for m in messages)
+        prefix_key = hashlib.sha256(system.encode("utf-8")).hexdigest() if system else None
+        with self._random_lock:
+            cached = prefix_key in self._seen_prefixes
+            if prefix_key:
+                self._seen_prefixes.add(prefix_key)
+        
+        generate = self.tokens_per_second and self.output_tokens / self.tokens_per_second
+        return {
+            "answer": self._answer(_message_text(messages[-1]) if messages else ""),
+            "ttft": self.latency * factor,
+            "generate": (generate or 0.0) * factor,
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": self.output_tokens,
+                "cached_tokens": estimate_tokens(system) if cached else 0,
+                "cache_creation_tokens": 0
+            }
+        }
+    
+    def _answer(self, prompt: str) -> str:
+        """生成回答文本；打包提问时按编号返回JSON"""
+        if self.response is not None:
+            return self.response
+        packed = PACKED_QUESTION_PATTERN.findall(prompt)
+        if packed:
+            return json.dumps({qid: f"模拟回答: {question}" for qid, question in packed}, ensure_ascii=False)
+        return f"模拟回答: {prompt[:80]}"
+    
+    @metered
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """发送聊天请求"""
+        def request():
+            # 模拟的耗时放在 _call 之内，与真实请求一样在等待期间占用限流名额
+            plan = self._plan(messages)
+            time.sleep(plan["ttft"] + plan["generate"])
+            return plan
+        
+        plan = self._call(request)
+        self._record_usage(plan["usage"])
+        return plan["answer"]
+    
+    @metered
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """流式发送聊天请求，按吞吐模型逐段输出"""
+        def request():
+            plan = self._plan(messages)
+            time.sleep(plan["ttft"])
+            return plan
+        
+        with self._stream(request) as plan:
+            pieces = re.findall(r".{1,8}", plan["answer"], re.DOTALL) or [""]
+            for piece in pieces:
+                yield piece
+                time.sleep(plan["generate"] / len(pieces))
+            self._record_usage(plan["usage"])
+    
+    @metered
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """异步发送聊天请求"""
+        async def request():
+            plan = self._plan(messages)
+            await asyncio.sleep(plan["ttft"] + plan["generate"])
+            return plan
+        
+        plan = await self._acall(request)
+        self._record_usage(plan["usage"])
+        return plan["answer"]
+    
+    def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
+        """简单问答接口"""
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
+        return self.chat(messages, **kwargs)
+
+
+class ReplayClient(LLMClient):
+    """录制/回放客户端：按请求哈希把回答保存到cassette文件（JSON Lines），之后离线回放"""
+    
+    provider = "replay"
+    
+    def __init__(self, cassette: str, inner: Optional[LLMClient] = None, mode: str = "auto",
+                 model: Optional[str] = None, replay_latency: bool = False):
+        """
+        初始化录制/回放客户端
+        
+        Args:
+            cassette: cassette文件路径
+            inner: 录制时实际调用的客户端（回放模式可以为None）
+            mode: "replay" 只回放；"record" 总是调用并录制；"auto" 有记录时回放，没有时调用并录制
+            model: 模型名称（默认使用 inner 的模型），参与请求哈希
+            replay_latency: 回放时是否按录制时的耗时等待
+        """
+        if mode not in ("replay", "record", "auto"):
+            raise ValueError(f"不支持的回放模式: {mode}")
+        if mode != "replay" and inner is None:
+            raise ValueError(f"{mode} 模式需要提供实际调用的客户端")
+        
+        super().__init__()
+        self.cassette = cassette
+        self.inner = inner
+        self.mode = mode
+        self.model = model or (inner.model if inner else "replay")
+        self.replay_latency = replay_latency
+        # 重试由实际调用的客户端负责
+        self.retry_policy = None
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._file_lock = threading.Lock()
+        self.usage_stats.update({"replayed": 0, "recorded": 0})
+        self._load()
+    
+    def _load(self):
+        """读取cassette文件（不存在时为空）"""
+        try:
+            with open(self.cassette, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._records[record["key"]] = record
+        except FileNotFoundError:
+            pass
+    
+    def request_key(self, messages: List[Dict[str, Any]], **kwargs) -> str:
+        """
+        计算请求哈希：模型、消息和生成参数完全相同的请求得到相同的键
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 生成参数
+        
+        Returns:
+            十六进制哈希
+        """
+        payload = json.dumps({"model": self.model, "messages": messages, "params": kwargs},
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """按模式查找录制的回答"""
+        if self.mode == "record":
+            return None
+        record = self._records.get(key)
+        if record is None and self.mode == "replay":
+            raise ReplayMissError(f"cassette 中没有该请求的记录: {key[:12]}（{self.cassette}）")
+        return record
+    
+    def _replay(self, record: Dict[str, Any]) -> str:
+        """回放一条记录"""
+        if self.replay_latency:
+            time.sleep(record.get("latency", 0.0))
+        self._record_usage(record.get("usage") or {})
+        with self._usage_lock:
+            self.usage_stats["replayed"] += 1
+        return record["response"]
+    
+    def _save(self, key: str, messages: List[Dict[str, Any]], response: str, latency: float,
+              usage: Optional[Dict[str, int]]):
+        """追加一条记录到cassette文件"""
+        record = {
+            "key": key,
+            "model": self.model,
+            "question": _message_text(messages[-1]) if messages else "",
+            "response": response,
+            "latency": round(latency, 4),
+            "usage": usage or {}
+        }
+        with self._file_lock:
+            self._records[key] = record
+            with open(self.cassette, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._record_usage(usage or {})
+        with self._usage_lock:
+            self.usage_stats["recorded"] += 1
+    
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """发送聊天请求"""
+        key = self.request_key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            # 只计量回放的请求；录制时由实际调用的客户端计量，同一请求不重复计数
+            with self._metered():
+                return self._replay(record)
+        
+        start = time.perf_counter()
+        response = self.inner.chat(messages, **kwargs)
+        self._save(key, messages, response, time.perf_counter() - start, self.inner.last_usage)
+        return response
+    
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """流式发送聊天请求（回放时一次性返回录制的回答）"""
+        key = self.request_key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            with self._metered() as call:
+                text = self._replay(record)
+                call["ttft"] = time.perf_counter() - call["start"]
+            yield text
+            return
+        
+        start = time.perf_counter()
+        parts = []
+        for text in self.inner.chat_stream(messages, **kwargs):
+            parts.append(text)
+            yield text
+        self._save(key, messages, "".join(parts), time.perf_counter() - start, self.inner.last_usage)
+    
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """异步发送聊天请求"""
+        key = self.request_key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            with self._metered():
+                if self.replay_latency:
+                    await asyncio.sleep(record.get("latency", 0.0))
+                self._record_usage(record.get("usage") or {})
+                with self._usage_lock:
+                    self.usage_stats["replayed"] += 1
+                return record["response"]
+        
+        start = time.perf_counter()
+        response = await self.inner.achat(messages, **kwargs)
+        self._save(key, messages, response, time.perf_counter() - start, self.inner.last_usage)
+        return response
+    
+    def ask(self, question: str, context: Optional[str] = None, **kwargs) -> str:
+        """简单问答接口"""
+        messages = self._build_messages(question, context, kwargs.pop("prefix", None))
+        return self.chat(messages, **kwargs)
+
+
+def create_stub_client(config: Dict[str, Any]) -> StubClient:
+    """
+    从配置创建模拟客户端
+    
+    Args:
+        config: llm 配置
+    
+    Returns:
+        模拟客户端
+    """
+    return StubClient(
+        model=config.get("model", "stub"),
+        latency=config.get("latency", 0.05),
+        tokens_per_second=config.get("tokens_per_second", 200.0),
+        output_tokens=config.get("output_tokens", 32),
+        jitter=config.get("jitter", 0.0),
+        error_rate=config.get("error_rate", 0.0),
+        response=config.get("response"),
+        seed=config.get("seed")
+    )
+
+
+def create_replay_client(config: Dict[str, Any], create_client) -> ReplayClient:
+    """
+    从配置创建录制/回放客户端
+    
+    Args:
+        config: llm 配置，"record" 部分为录制时实际调用的客户端配置
+        create_client: 根据提供商配置创建客户端的函数
+    
+    Returns:
+        录制/回放客户端
+    """
+    inner = create_client(config["record"]) if config.get("record") else None
+    return ReplayClient(
+        config.get("cassette", "llm_cassette.jsonl"),
+        inner=inner,
+        mode=config.get("mode", "auto" if inner else "replay"),
+        model=config.get("model"),
+        replay_latency=config.get("replay_latency", False)
+    )
+
+
+if __name__ == "__main__":
+    client = StubClient(latency=0.01, tokens_per_second=1000, output_tokens=20)
+    prefix = client.build_context_prefix("示例文档内容" * 100)
+    print(client.ask("公司名称是什么？", prefix=prefix))
+    print(client.ask("公司有多少员工？", prefix=prefix))
+    print(f"用量: {client.get_usage_stats()}")
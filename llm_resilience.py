@@ -0,0 +1,369 @@
+"""
+LLM调用的容错与并发控制
+指数退避重试（带抖动，遵守Retry-After），以及根据限流反馈自动调整并发数的AIMD限流器
+"""
+
+import time
+import random
+import asyncio
+import threading
+import collections
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+
+# 可以重试的HTTP状态码（529为Anthropic的过载状态）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# 表示限流/过载的状态码，会让限流器收缩并发数
+RATE_LIMIT_STATUS_CODES = {429, 529}
+
+# 网络层错误（openai 和 anthropic SDK 使用相同的类名）
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """从响应头解析重试等待秒数，支持 retry-after-ms、秒数和HTTP日期格式"""
+    if not headers:
+        return None
+    
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error: Exception) -> Dict[str, Any]:
+    """
+    判断错误是否可以重试
+    
+    Args:
+        error: 调用LLM时抛出的异常
+    
+    Returns:
+        {retryable, rate_limited, retry_after, status_code}
+    """
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    retry_after = _parse_retry_after(getattr(response, "headers", None))
+    
+    if status_code is not None:
+        return {
+            "retryable": status_code in RETRYABLE_STATUS_CODES,
+            "rate_limited": status_code in RATE_LIMIT_STATUS_CODES,
+            "retry_after": retry_after,
+            "status_code": status_code
+        }
+    
+    return {
+        "retryable": type(error).__name__ in RETRYABLE_ERROR_NAMES,
+        "rate_limited": False,
+        "retry_after": retry_after,
+        "status_code": None
+    }
+
+
+class RetryPolicy:
+    """指数退避重试策略"""
+    
+    def __init__(self, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 jitter: bool = True):
+        """
+        初始化重试策略
+        
+        Args:
+            max_retries: 最大重试次数（0表示不重试）
+            base_delay: 第一次重试的基础等待秒数
+            max_delay: 单次等待的最大秒数
+            jitter: 是否使用随机抖动（避免大量请求同时重试）
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+    
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算第 attempt 次重试前的等待时间
+        
+        Args:
+            attempt: 重试序号（从0开始）
+            retry_after: 服务端要求的等待秒数（有则优先遵守）
+        
+        Returns:
+            等待秒数
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+def _resolve_waiter(future):
+    """在等待者所在的事件循环中唤醒它（等待已取消时忽略）"""
+    if not future.done():
+        future.set_result(None)
+
+
+class AIMDLimiter:
+    """
+    加性增、乘性减（AIMD）的并发限流器
+    
+    每次成功后并发上限缓慢增加，遇到限流时成倍减小，从而在不触发限流的前提下维持最大吞吐
+    """
+    
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease_factor: float = 0.5, decrease_cooldown: float = 1.0):
+        """
+        初始化限流器
+        
+        Args:
+            initial: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            increase: 每完成"当前上限"个成功请求后增加的并发数
+            decrease_factor: 遇到限流时并发上限乘以的系数
+            decrease_cooldown: 两次收缩之间的最短间隔（秒），避免同一波限流被重复计算
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        # 等待名额的调用方（先到先得）：同步调用为 threading.Event，异步调用为 (事件循环, Future)
+        self._waiters = collections.deque()
+    
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+    
+    @property
+    def in_flight(self) -> int:
+        """当前正在进行的请求数"""
+        return self._in_flight
+    
+    def _take_free_slot(self) -> bool:
+        """没有排队者且有空闲名额时占用一个名额（调用方持有锁）"""
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+    
+    def _wake_waiters(self):
+        """按排队顺序把空闲名额直接交给等待者（调用方持有锁）"""
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(_resolve_waiter, future)
+    
+    def try_acquire(self) -> bool:
+        """不等待地尝试占用一个并发名额"""
+        with self._lock:
+            return self._take_free_slot()
+    
+    def acquire(self):
+        """占用一个并发名额（没有空闲名额时阻塞等待）"""
+        with self._lock:
+            if self._take_free_slot():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+    
+    async def acquire_async(self):
+        """异步占用一个并发名额（排队等待 release() 唤醒，不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._take_free_slot():
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # 名额已经分给了这个等待者，转交给下一个
+                    self._in_flight -= 1
+                    self._wake_waiters()
+            raise
+    
+    def release(self, success: bool = True, rate_limited: bool = False):
+        """
+        释放名额并根据结果调整并发上限
+        
+        Args:
+            success: 请求是否成功
+            rate_limited: 请求是否被限流
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if rate_limited:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif success:
+                self._limit = min(self.max_limit, self._limit + self.increase / max(self._limit, 1.0))
+            self._wake_waiters()
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取限流器状态"""
+        return {"limit": self.limit, "in_flight": self._in_flight}
+
+
+def call_with_retry(func: Callable[[], Any], policy: Optional[RetryPolicy] = None,
+                    limiter: Optional[AIMDLimiter] = None,
+                    on_retry: Optional[Callable[[int, Exception, float], None]] = None,
+                    hold: bool = False) -> Any:
+    """
+    调用函数，失败时按策略重试
+    
+    Args:
+        func: 无参数的调用函数
+        policy: 重试策略（None表示不重试）
+        limiter: 并发限流器（可选），每次尝试都占用一个名额
+        on_retry: 每次重试前的回调 (重试序号, 异常, 等待秒数)
+        hold: 成功时不归还名额，由调用方用完结果（如读完流）后调用 limiter.release()
+    
+    Returns:
+        func的返回值
+    """
+    max_retries = policy.max_retries if policy else 0
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        success, error, info = False, None, None
+        try:
+            result = func()
+            success = True
+        except Exception as e:
+            error, info = e, classify_error(e)
+        finally:
+            # 取消（CancelledError）、KeyboardInterrupt 等也要归还名额，否则名额永久泄漏
+            if limiter and not (hold and success):
+                limiter.release(success=success, rate_limited=bool(info and info["rate_limited"]))
+        if success:
+            return result
+        if not info["retryable"] or attempt >= max_retries:
+            raise error
+        delay = policy.compute_delay(attempt, info["retry_after"])
+        if on_retry:
+            on_retry(attempt, error, delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_retry(func: Callable[[], Any], policy: Optional[RetryPolicy] = None,
+                           limiter: Optional[AIMDLimiter] = None,
+                           on_retry: Optional[Callable[[int, Exception, float], None]] = None) -> Any:
+    """
+    异步版本的 call_with_retry，func 返回可等待对象
+    
+    Returns:
+        func的返回值（已await）
+    """
+    max_retries = policy.max_retries if policy else 0
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.acquire_async()
+        success, error, info = False, None, None
+        try:
+            result = await func()
+            success = True
+        except Exception as e:
+            error, info = e, classify_error(e)
+        finally:
+            # 取消（CancelledError）、KeyboardInterrupt 等也要归还名额，否则名额永久泄漏
+            if limiter:
+                limiter.release(success=success, rate_limited=bool(info and info["rate_limited"]))
+        if success:
+            return result
+        if not info["retryable"] or attempt >= max_retries:
+            raise error
+        delay = policy.compute_delay(attempt, info["retry_after"])
+        if on_retry:
+            on_retry(attempt, error, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def create_retry_policy(config: Dict[str, Any]) -> RetryPolicy:
+    """
+    从配置创建重试策略
+    
+    Args:
+        config: 配置字典（llm 配置中的 "retry" 部分）
+    
+    Returns:
+        重试策略
+    """
+    return RetryPolicy(
+        max_retries=config.get("max_retries", 4),
+        base_delay=config.get("base_delay", 1.0),
+        max_delay=config.get("max_delay", 30.0)
+    )
+
+
+def create_limiter(config: Optional[Dict[str, Any]]) -> Optional[AIMDLimiter]:
+    """
+    从配置创建AIMD限流器
+    
+    Args:
+        config: 配置字典（llm 配置中的 "concurrency" 部分），为空时不限流
+    
+    Returns:
+        限流器实例或None
+    """
+    if not config:
+        return None
+    return AIMDLimiter(
+        initial=config.get("initial", 4),
+        min_limit=config.get("min", 1),
+        max_limit=config.get("max", 32)
+    )
+
+
+if __name__ == "__main__":
+    policy = RetryPolicy(max_retries=3, base_delay=0.01)
+    attempts = []
+    
+    class FakeRateLimitError(Exception):
+        status_code = 429
+    
+    def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) < 3:
+            raise FakeRateLimitError("rate limited")
+        return "ok"
+    
+    limiter = AIMDLimiter(initial=8, decrease_cooldown=0)
+    print(f"结果: {call_with_retry(flaky, policy, limiter)}, 尝试 {len(attempts)} 次")
+    print(f"限流后的并发上限: {limiter.limit}")
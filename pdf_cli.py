@@ -0,0 +1,115 @@
+"""
+只做提取的命令行
+info、fields、text、json 命令只导入PDF提取器（延迟导入），不读取配置、不导入也不创建LLM客户端，
+适合被脚本大量重复调用
+"""
+
+import sys
+import json
+import argparse
+from typing import Optional, List
+
+
+# 支持的命令
+COMMANDS = ("info", "fields", "text", "json")
+
+
+def _open(pdf_path: str, low_memory: Optional[bool] = None):
+    """延迟导入提取器（pypdf是启动时间的主要部分，--help 等不需要它）"""
+    from pdf_extractor import PDFExtractor
+    return PDFExtractor(pdf_path, low_memory=low_memory)
+
+
+def get_info(pdf_path: str, low_memory: Optional[bool] = None) -> dict:
+    """
+    读取文档信息（元数据、页数、表单字段数），不提取文本
+    
+    Args:
+        pdf_path: PDF文件路径
+        low_memory: 是否使用低内存模式（默认按文件大小决定）
+    
+    Returns:
+        {"file", "metadata", "pages", "fields"}
+    """
+    extractor = _open(pdf_path, low_memory)
+    return {
+        "file": pdf_path,
+        "metadata": extractor._extract_metadata(),
+        "pages": len(extractor.reader.pages),
+        "fields": len(extractor.extract_form_fields())
+    }
+
+
+def print_info(info: dict):
+    """按 pdf_qa_system.py --info 的格式打印文档信息"""
+    print("\n" + "=" * 60)
+    print("PDF文档信息")
+    print("=" * 60)
+    for key, value in info["metadata"].items():
+        if value:
+            print(f"{key}: {value}")
+    print(f"\n总页数: {info['pages']}")
+    if info["fields"]:
+        print(f"表单字段数: {info['fields']}")
+    print("=" * 60)
+
+
+def run_command(command: str, pdf_path: str, as_json: bool = False, low_memory: Optional[bool] = None) -> int:
+    """
+    执行提取命令并输出结果
+    
+    Args:
+        command: info、fields、text 或 json
+        pdf_path: PDF文件路径
+        as_json: info 和 fields 是否输出JSON
+        low_memory: 是否使用低内存模式（默认按文件大小决定）
+    
+    Returns:
+        退出状态（文件不存在或提取失败时为1）
+    """
+    try:
+        if command == "info":
+            info = get_info(pdf_path, low_memory)
+            if as_json:
+                print(json.dumps(info, ensure_ascii=False, indent=2, default=str))
+            else:
+                print_info(info)
+        elif command == "fields":
+            fields = _open(pdf_path, low_memory).get_interpreted_fields()
+            if as_json:
+                values = {name: field["interpreted_value"] for name, field in fields.items()}
+                print(json.dumps(values, ensure_ascii=False, indent=2, default=str))
+            else:
+                for name, field in fields.items():
+                    print(f"{name}: {field['interpreted_value']}")
+        elif command == "text":
+            # 逐页输出，文本不在内存中组装
+            _open(pdf_path, low_memory).write_text(sys.stdout)
+            print()
+        elif command == "json":
+            print(_open(pdf_path, low_memory).to_json())
+        else:
+            print(f"错误: 不支持的命令 {command}", file=sys.stderr)
+            return 2
+    except FileNotFoundError:
+        print(f"错误: 找不到文件 {pdf_path}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description="PDF提取命令行（不使用LLM）")
+    parser.add_argument("command", choices=COMMANDS, help="info: 文档信息；fields: 表单字段；text: 文本；json: 全部内容")
+    parser.add_argument("pdf_file", help="PDF文件路径")
+    parser.add_argument("--json", action="store_true", dest="as_json", help="info 和 fields 输出JSON")
+    parser.add_argument("--low-memory", action="store_true", help="低内存模式（默认只对大文件启用）")
+    args = parser.parse_args(argv)
+    return run_command(args.command, args.pdf_file, args.as_json, args.low_memory or None)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
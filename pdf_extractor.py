@@ -4,23 +4,194 @@ PDF内容提取器
 """
 
 from pypdf import PdfReader
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple, TextIO
+from contextlib import contextmanager
+import functools
 import json
+import time
+import os
+
+
+# 不小于这个大小（MB）的文件默认使用低内存模式
+LOW_MEMORY_THRESHOLD_MB = 256
+
+
+class ExtractionStats:
+    """
+    提取过程的分阶段耗时和计数
+    
+    阶段可以嵌套，报告中同时给出包含子阶段的总耗时和扣除子阶段后的自身耗时
+    """
+    
+    def __init__(self):
+        """初始化空的统计"""
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._stack: List[List[float]] = []
+    
+    @contextmanager
+    def stage(self, name: str):
+        """
+        计时一个阶段
+        
+        Args:
+            name: 阶段名称
+        """
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            data = self.stages.setdefault(name, {"calls": 0, "total": 0.0, "self": 0.0})
+            data["calls"] += 1
+            data["total"] += elapsed
+            data["self"] += elapsed - frame[1]
+    
+    def count(self, name: str, value: int = 1):
+        """累加计数器"""
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def reset(self):
+        """清空统计"""
+        self.stages.clear()
+        self.counters.clear()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        return {
+            "stages": {name: dict(data) for name, data in self.stages.items()},
+            "counters": dict(self.counters),
+            "total_seconds": sum(data["self"] for data in self.stages.values())
+        }
+    
+    def format_report(self) -> str:
+        """
+        格式化为耗时分解报告
+        
+        Returns:
+            多行文本
+        """
+        total = sum(data["self"] for data in self.stages.values())
+        # 表头的中文字符显示宽度为2，宽度按显示效果对齐
+        lines = [f"{'阶段':<20}{'调用':>4}{'总耗时(ms)':>11}{'自身耗时(ms)':>12}{'占比':>7}"]
+        for name, data in sorted(self.stages.items(), key=lambda item: -item[1]["self"]):
+            share = data["self"] / total if total else 0.0
+            lines.append(f"{name:<22}{data['calls']:>6}{data['total'] * 1000:>14.2f}"
+                         f"{data['self'] * 1000:>16.2f}{share:>9.1%}")
+        lines.append(f"{'合计':<20}{'':>6}{total * 1000:>14.2f}")
+        if self.counters:
+            lines.append("计数: " + ", ".join(f"{k}={v}" for k, v in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+
+def _timed(stage_name: str):
+    """把整个方法作为一个提取阶段计时的装饰器"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.stage(stage_name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_call(func: Callable[[], Any], output_path: Optional[str] = None, top: int = 15) -> Any:
+    """
+    用cProfile运行函数，打印耗时最多的函数，并可保存原始分析数据
+    
+    Args:
+        func: 无参数的函数
+        output_path: cProfile数据的保存路径（可用 snakeviz 等工具查看）
+        top: 打印前多少个函数（按累计耗时）
+    
+    Returns:
+        func的返回值
+    """
+    import cProfile
+    import pstats
+    
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        if output_path:
+            profiler.dump_stats(output_path)
+            print(f"cProfile数据已保存到: {output_path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
 
 
 class PDFExtractor:
-    """PDF内容提取器，支持文本和表单字段提取"""
+    """
+    PDF内容提取器，支持文本和表单字段提取
     
-    def __init__(self, pdf_path: str):
+    低内存模式用于很大的PDF：按需从文件读取而不是把整个文件读入内存，每处理完一页就释放该页解析出的对象
+    （内容流、字体、注释等），解析占用的内存不随页数增长，提取完成后可以用 close() 释放 PdfReader。
+    页面树中的页面字典（reader.pages，每页约1-2KB）和返回的文本仍与文档大小成正比；
+    不需要整个文本时用 write_text() 逐页写出
+    """
+    
+    def __init__(self, pdf_path: str, low_memory: Optional[bool] = None):
         """
         初始化PDF提取器
         
         Args:
             pdf_path: PDF文件路径
+            low_memory: 是否使用低内存模式（默认文件不小于 LOW_MEMORY_THRESHOLD_MB 时使用）
         """
         self.pdf_path = pdf_path
-        self.reader = PdfReader(pdf_path)
-        
+        if low_memory is None:
+            low_memory = os.path.getsize(pdf_path) >= LOW_MEMORY_THRESHOLD_MB * 1024 * 1024
+        self.low_memory = low_memory
+        # 分阶段耗时和计数，用于定位加载慢的文档和阶段
+        self.stats = ExtractionStats()
+        self._reader = None
+        self._stream = None
+        self.reader
+    
+    @property
+    def reader(self) -> PdfReader:
+        """PdfReader（close() 之后再次访问时重新打开文件）"""
+        if self._reader is None:
+            with self.stats.stage("open"):
+                if self.low_memory:
+                    # 传入文件对象时pypdf按需读取对象，传入路径时会把整个文件读入内存
+                    self._stream = open(self.pdf_path, "rb")
+                    self._reader = PdfReader(self._stream)
+                else:
+                    self._reader = PdfReader(self.pdf_path)
+        return self._reader
+    
+    def close(self):
+        """释放PdfReader及其缓存的页面和对象，关闭文件"""
+        self._reader = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def _release_objects(self):
+        """低内存模式下清空PdfReader的对象缓存（内容流、字体、注释等需要时从文件重新读取）"""
+        if self.low_memory and self._reader is not None:
+            self._reader.resolved_objects.clear()
+    
+    def _iter_pages(self) -> Iterator[Tuple[int, Any]]:
+        """逐页遍历 (页序号, 页面)，低内存模式下每页处理完后释放该页解析出的对象"""
+        for i, page in enumerate(self.reader.pages):
+            yield i, page
+            self._release_objects()
+    
     def extract_all_content(self) -> Dict[str, Any]:
         """
         提取PDF的所有内容，包括文本和表单字段
@@ -36,6 +207,7 @@ class PDFExtractor:
             "total_pages": len(self.reader.pages)
         }
     
+    @_timed("metadata")
     def _extract_metadata(self) -> Dict[str, Any]:
         """提取PDF元数据"""
         metadata = {}
@@ -46,6 +218,21 @@ class PDFExtractor:
                 metadata[clean_key] = str(value) if value else None
         return metadata
     
+    def _iter_page_texts(self) -> Iterator[str]:
+        """逐页产生有文本的页面（带页码标题），不保留已产生的文本"""
+        for i, page in self._iter_pages():
+            text = page.extract_text()
+            self.stats.count("pages")
+            if text and text.strip():
+                self.stats.count("characters", len(text))
+                yield f"=== 第 {i+1} 页 ===\n{text}"
+    
+    def _iter_text(self) -> Iterator[str]:
+        """按 extract_text 的格式（页面之间空一行）逐块产生文本"""
+        with self.stats.stage("extract_text"):
+            for index, text in enumerate(self._iter_page_texts()):
+                yield text if index == 0 else "\n\n" + text
+    
     def extract_text(self) -> str:
         """
         提取PDF所有页面的文本内容
@@ -53,13 +240,25 @@ class PDFExtractor:
         Returns:
             合并后的文本内容
         """
-        text_content = []
-        for i, page in enumerate(self.reader.pages):
-            text = page.extract_text()
-            if text and text.strip():
-                text_content.append(f"=== 第 {i+1} 页 ===\n{text}")
-        return "\n\n".join(text_content)
+        return "".join(self._iter_text())
+    
+    def write_text(self, output: TextIO) -> int:
+        """
+        把所有页面的文本逐页写入文件（格式同 extract_text），整个文本不在内存中组装
+        
+        Args:
+            output: 文本文件对象（如 sys.stdout）
+        
+        Returns:
+            写入的字符数
+        """
+        characters = 0
+        for chunk in self._iter_text():
+            output.write(chunk)
+            characters += len(chunk)
+        return characters
     
+    @_timed("form_fields")
     def extract_form_fields(self) -> Dict[str, Any]:
         """
         提取PDF表单字段
@@ -74,7 +273,7 @@ class PDFExtractor:
         annot_values = self._extract_from_annotations()
         
         # 然后从字段定义中提取
-        fields = self.reader.get_fields()
+        fields = self._get_fields()
         if not fields:
             return annot_values  # 如果没有字段定义，返回从注释中提取的值
         
@@ -108,6 +307,16 @@ class PDFExtractor:
         
         return result
     
+    def _get_fields(self) -> Optional[Dict[str, Any]]:
+        """读取表单字段定义（reader.get_fields），计入 get_fields 阶段"""
+        with self.stats.stage("get_fields"):
+            fields = self.reader.get_fields()
+        # 字段定义已复制到返回的字典中
+        self._release_objects()
+        self.stats.count("fields", len(fields) if fields else 0)
+        return fields
+    
+    @_timed("annotations")
     def _extract_from_annotations(self) -> Dict[str, Any]:
         """
         从页面注释中提取表单字段值
@@ -120,7 +329,7 @@ class PDFExtractor:
         """
         result = {}
         
-        for page in self.reader.pages:
+        for _, page in self._iter_pages():
             if "/Annots" not in page:
                 continue
             
@@ -131,12 +340,14 @@ class PDFExtractor:
                     # 只处理Widget类型的注释（表单字段）
                     if annot.get("/Subtype") != "/Widget":
                         continue
+                    self.stats.count("widgets")
                     
                     # 获取字段名
                     field_name = annot.get("/T")
                     if not field_name:
                         # 如果没有直接的字段名，可能是子字段，尝试获取父字段名
                         if "/Parent" in annot:
+                            self.stats.count("parent_hops")
                             parent = annot["/Parent"].get_object()
                             field_name = parent.get("/T")
                     
@@ -160,6 +371,7 @@ class PDFExtractor:
         
         return result
     
+    @_timed("pages_content")
     def extract_pages_content(self) -> List[Dict[str, Any]]:
         """
         按页提取内容，包括文本和该页的表单字段
@@ -168,7 +380,7 @@ class PDFExtractor:
             每页内容的列表
         """
         pages = []
-        for i, page in enumerate(self.reader.pages):
+        for i, page in self._iter_pages():
             page_data = {
                 "page_number": i + 1,
                 "text": page.extract_text() or "",
@@ -250,6 +462,7 @@ class PDFExtractor:
             if "/T" in current:
                 names.insert(0, str(current["/T"]))
             if "/Parent" in current:
+                self.stats.count("parent_hops")
                 current = current["/Parent"].get_object()
             else:
                 break
@@ -268,6 +481,7 @@ class PDFExtractor:
         if "/V" in field_obj:
             return field_obj["/V"]
         if "/Parent" in field_obj:
+            self.stats.count("parent_hops")
             return self._get_field_value_recursive(field_obj["/Parent"].get_object())
         return None
     
@@ -281,36 +495,36 @@ class PDFExtractor:
         Returns:
             格式化的文本内容
         """
-        content_parts = []
+        return "".join(self._iter_formatted_content(interpret_boolean))
+    
+    def _iter_formatted_content(self, interpret_boolean=True) -> Iterator[str]:
+        """按 get_formatted_content 的格式逐块产生内容（文档文本逐页产生）"""
+        # 各部分之间空一行
+        separator = ""
         
         # 添加元数据
         metadata = self._extract_metadata()
         if metadata:
-            content_parts.append("【PDF文档信息】")
-            for key, value in metadata.items():
-                if value:
-                    content_parts.append(f"{key}: {value}")
-            content_parts.append("")
+            yield "【PDF文档信息】\n" + "".join(f"{key}: {value}\n" for key, value in metadata.items() if value)
+            separator = "\n"
         
         # 添加文本内容
-        text = self.extract_text()
-        if text.strip():
-            content_parts.append("【文档文本内容】")
-            content_parts.append(text)
-            content_parts.append("")
+        text_chunks = self._iter_text()
+        first = next(text_chunks, None)
+        if first is not None:
+            yield f"{separator}【文档文本内容】\n{first}"
+            yield from text_chunks
+            yield "\n"
+            separator = "\n"
         
         # 添加表单字段 - 改进版
         fields = self.extract_form_fields()
         if fields:
-            content_parts.append("【表单字段内容】")
-            
             # 智能分组和格式化字段
             formatted_fields = self._format_fields_intelligently(fields, interpret_boolean)
-            content_parts.extend(formatted_fields)
-            content_parts.append("")
-        
-        return "\n".join(content_parts)
+            yield f"{separator}【表单字段内容】\n" + "".join(line + "\n" for line in formatted_fields)
     
+    @_timed("format_fields")
     def _format_fields_intelligently(self, fields: Dict[str, Any], interpret_boolean: bool = True) -> list:
         """
         智能格式化表单字段，将相关字段组合在一起
@@ -373,26 +587,11 @@ class PDFExtractor:
         Returns:
             结构化数据字典
         """
-        fields = self.extract_form_fields()
-        
-        # 创建解释后的字段字典
-        interpreted_fields = {}
+        interpreted_fields = self.get_interpreted_fields(interpret_boolean)
         field_groups = {}
         
-        for field_name, raw_value in fields.items():
-            # 解释值
-            value = self._normalize_value(raw_value, interpret_boolean) if interpret_boolean else raw_value
-            
-            # 跳过完全空的值
-            if value is None or value == "":
-                continue
-            
-            interpreted_fields[field_name] = {
-                "raw_value": raw_value,
-                "interpreted_value": value,
-                "is_checked": value in ["Yes", "On", "1"],
-                "is_unchecked": value in ["No", "Off", "0"]
-            }
+        for field_name, info in interpreted_fields.items():
+            value = info["interpreted_value"]
             
             # 尝试分组（基于字段名）
             if field_name.endswith("0"):
@@ -413,6 +612,122 @@ class PDFExtractor:
             "total_pages": len(self.reader.pages)
         }
     
+    def get_interpreted_fields(self, interpret_boolean=True) -> Dict[str, Dict[str, Any]]:
+        """
+        获取解释后的表单字段（跳过空值）
+        
+        Args:
+            interpret_boolean: 是否将/On、/Off等转换为Yes/No
+            
+        Returns:
+            字段名到 {raw_value, interpreted_value, is_checked, is_unchecked} 的字典
+        """
+        fields = self.extract_form_fields()
+        
+        interpreted_fields = {}
+        for field_name, raw_value in fields.items():
+            # 解释值
+            value = self._normalize_value(raw_value, interpret_boolean) if interpret_boolean else raw_value
+            
+            # 跳过完全空的值
+            if value is None or value == "":
+                continue
+            
+            interpreted_fields[field_name] = {
+                "raw_value": raw_value,
+                "interpreted_value": value,
+                "is_checked": value in ["Yes", "On", "1"],
+                "is_unchecked": value in ["No", "Off", "0"]
+            }
+        
+        return interpreted_fields
+    
+    def get_field_labels(self) -> Dict[str, str]:
+        """
+        获取表单字段的显示标签（/TU 替代名称）
+        
+        Returns:
+            字段名和标签的字典（只包含有标签的字段）
+        """
+        labels = {}
+        fields = self._get_fields()
+        if not fields:
+            return labels
+        
+        for field_name, field in fields.items():
+            label = field.get("/TU")
+            if label and str(label) != field_name:
+                labels[field_name] = str(label)
+        return labels
+    
+    def get_qa_content(self) -> Dict[str, Any]:
+        """
+        获取问答所需的内容（提取结果缓存中保存的格式，供 PDFQASystem.load_extracted 使用）
+        
+        Returns:
+            {"formatted", "fields"（解释后的非空字段）, "labels", "metadata", "field_count"（全部字段数）}
+        """
+        return {
+            "formatted": self.get_formatted_content(),
+            "fields": self.get_interpreted_fields(),
+            "labels": self.get_field_labels(),
+            "metadata": self._extract_metadata(),
+            "field_count": len(self.extract_form_fields())
+        }
+    
+    @_timed("field_pages")
+    def _get_field_pages(self) -> Dict[str, int]:
+        """
+        字段所在的页码（从1开始，字段有多个控件时取第一个）
+
+        Returns:
+            字段名（完整名称、注释中的短名称和导出名称）到页码的字典
+        """
+        pages = {}
+        for i, page in self._iter_pages():
+            if "/Annots" not in page:
+                continue
+            for annot_ref in page["/Annots"]:
+                annot = annot_ref.get_object()
+                if annot.get("/Subtype") != "/Widget":
+                    continue
+                name = self._get_field_full_name(annot)
+                if name:
+                    pages.setdefault(name, i + 1)
+                    pages.setdefault(name.rsplit(".", 1)[-1], i + 1)
+                # reader.get_fields 对有 /TM（导出名称）的字段使用该名称
+                if "/TM" in annot:
+                    pages.setdefault(str(annot["/TM"]), i + 1)
+        return pages
+
+    def get_field_records(self) -> List[Dict[str, Any]]:
+        """
+        获取所有表单字段的明细（包括空值），用于写入字段库
+
+        Returns:
+            [{name, type（Tx/Btn/Ch/Sig，未知时为None）, page, raw_value, value, is_checked, label}, ...]
+        """
+        values = self.extract_form_fields()
+        definitions = self._get_fields() or {}
+        labels = self.get_field_labels()
+        pages = self._get_field_pages()
+
+        records = []
+        for name, raw_value in values.items():
+            field_type = definitions.get(name, {}).get("/FT")
+            value = self._normalize_value(raw_value, interpret_boolean=True)
+            records.append({
+                "name": name,
+                "type": str(field_type)[1:] if field_type else None,
+                "page": pages.get(name),
+                "raw_value": None if raw_value is None else str(raw_value),
+                "value": value,
+                # 只有按钮（勾选框、单选按钮）有勾选状态，文本框填写 "Yes" 不算勾选
+                "is_checked": str(field_type) == "/Btn" and value in ["Yes", "On", "1"],
+                "label": labels.get(name)
+            })
+        return records
+
     def to_json(self) -> str:
         """
         将提取的内容转换为JSON格式
@@ -425,23 +740,42 @@ class PDFExtractor:
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="PDF内容提取器")
+    parser.add_argument("pdf_file", nargs="?", help="PDF文件路径")
+    parser.add_argument("--profile", action="store_true", help="打印各阶段耗时分解")
+    parser.add_argument("--profile-out", help="用cProfile分析并把数据保存到该文件")
+    args = parser.parse_args()
     
     # 测试代码
-    if len(sys.argv) > 1:
-        pdf_path = sys.argv[1]
+    if args.pdf_file:
+        pdf_path = args.pdf_file
     else:
         pdf_path = "New Client Risk Review.pdf"
         print(f"使用默认PDF文件: {pdf_path}\n")
     
-    try:
+    def extract():
         extractor = PDFExtractor(pdf_path)
+        return extractor, extractor.get_formatted_content()
+    
+    try:
+        if args.profile_out:
+            extractor, content = profile_call(extract, args.profile_out)
+        else:
+            extractor, content = extract()
         
         # 显示格式化内容
         print("=" * 60)
         print("PDF内容提取结果")
         print("=" * 60)
-        print(extractor.get_formatted_content())
+        print(content)
+        
+        if args.profile or args.profile_out:
+            print("=" * 60)
+            print("各阶段耗时")
+            print("=" * 60)
+            print(extractor.stats.format_report())
         
         # 可选：保存为JSON
         # with open("pdf_content.json", "w", encoding="utf-8") as f:
@@ -0,0 +1,288 @@
+"""
+合成表单PDF生成器
+用pypdf的写入器生成可参数化的大文档（页数、文本密度、每页字段数、字段嵌套深度、
+复选框/单选按钮比例、已填写比例），用于规模测试和基准测试
+"""
+
+import os
+import random
+import argparse
+from typing import Dict, Any, List
+from pypdf import PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    BooleanObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    FloatObject,
+    NameObject,
+    NumberObject,
+    TextStringObject
+)
+
+
+# 页面尺寸（Letter）
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+# 单选按钮组的选项数
+RADIO_OPTIONS = 3
+
+# 单选按钮字段标志（Radio | NoToggleToOff）
+RADIO_FLAGS = (1 << 15) | (1 << 14)
+
+# 生成文本和字段值使用的词表
+WORDS = [
+    "client", "policy", "coverage", "premium", "claim", "employee", "business", "review",
+    "address", "revenue", "liability", "insurance", "contract", "payment", "expense", "date",
+    "limit", "risk", "location", "service", "annual", "total", "number", "signature"
+]
+
+# 预设参数，对应生产中遇到的几类规模问题
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "small": {"pages": 5, "text_lines": 30, "fields_per_page": 10},
+    "long-text": {"pages": 1000, "text_lines": 50, "fields_per_page": 0},
+    "many-widgets": {"pages": 200, "text_lines": 5, "fields_per_page": 100},
+    "deep-tree": {"pages": 50, "text_lines": 10, "fields_per_page": 40, "nesting_depth": 8},
+    "mixed": {"pages": 100, "text_lines": 30, "fields_per_page": 30, "nesting_depth": 3,
+              "checkbox_ratio": 0.3, "radio_ratio": 0.2}
+}
+
+
+def _add(writer: PdfWriter, obj) -> Any:
+    """把对象加入文档并返回间接引用（pypdf没有对应的公开方法，私有接口只在这里使用，版本范围见 requirements.txt）"""
+    return writer._add_object(obj)
+
+
+def _escape_text(text: str) -> str:
+    """转义PDF字符串中的特殊字符"""
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    """生成由随机单词组成的句子"""
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _text_stream(lines: List[str]) -> DecodedStreamObject:
+    """生成一页文本的内容流"""
+    commands = ["BT", "/F1 9 Tf", "11 TL", f"40 {PAGE_HEIGHT - 40} Td"]
+    for line in lines:
+        commands.append(f"({_escape_text(line)}) '")
+    commands.append("ET")
+    stream = DecodedStreamObject()
+    stream.set_data("\n".join(commands).encode("latin-1"))
+    return stream
+
+
+def _appearance(writer: PdfWriter, checked: bool):
+    """按钮控件的外观流（所有控件共享，选中时画一个实心方块）"""
+    stream = DecodedStreamObject()
+    stream.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(10), NumberObject(10)])
+    })
+    stream.set_data(b"0 g 2 2 6 6 re f" if checked else b"")
+    return _add(writer, stream)
+
+
+def _rect(index: int, per_page: int) -> ArrayObject:
+    """字段在页面上的位置（按两列排布，字段多时重叠也不影响提取）"""
+    rows = max(1, (per_page + 1) // 2)
+    row_height = (PAGE_HEIGHT - 80) / rows
+    x = 40 + (index % 2) * 280
+    y = PAGE_HEIGHT - 40 - (index // 2 + 1) * row_height
+    return ArrayObject([FloatObject(x), FloatObject(y), FloatObject(x + 240), FloatObject(y + min(row_height, 14))])
+
+
+def generate_form_pdf(output_path: str, pages: int = 10, text_lines: int = 40, fields_per_page: int = 20,
+                      nesting_depth: int = 1, checkbox_ratio: float = 0.2, radio_ratio: float = 0.1,
+                      filled_fraction: float = 0.5, seed: int = 0) -> Dict[str, int]:
+    """
+    生成合成表单PDF
+    
+    Args:
+        output_path: 输出文件路径
+        pages: 页数
+        text_lines: 每页文本行数（文本密度）
+        fields_per_page: 每页字段数
+        nesting_depth: 字段层级深度（1表示字段直接位于 /Fields 下，更大时每页字段挂在多层 /Kids 之下）
+        checkbox_ratio: 复选框所占比例
+        radio_ratio: 单选按钮组所占比例（每组 RADIO_OPTIONS 个控件）
+        filled_fraction: 已填写字段的比例
+        seed: 随机种子（相同参数和种子生成相同的文档）
+    
+    Returns:
+        统计信息：pages、fields（终端字段数）、widgets（控件数）、filled（已填写字段数）
+    """
+    if checkbox_ratio + radio_ratio > 1:
+        raise ValueError("checkbox_ratio 与 radio_ratio 之和不能超过1")
+    
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    font = _add(writer, DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding")
+    }))
+    on_appearance = _appearance(writer, True)
+    off_appearance = _appearance(writer, False)
+    top_fields = ArrayObject()
+    summary = {"pages": pages, "fields": 0, "widgets": 0, "filled": 0}
+    
+    def button_appearance(on_state: str) -> DictionaryObject:
+        """按钮控件的 /AP 字典（pypdf读取单选按钮时要求子控件带外观）"""
+        return DictionaryObject({NameObject("/N"): DictionaryObject({
+            NameObject(on_state): on_appearance,
+            NameObject("/Off"): off_appearance
+        })})
+    
+    def add_field(field: DictionaryObject, parent) -> Any:
+        """把字段加入文档：挂到父节点的 /Kids 或顶层 /Fields"""
+        if parent is not None:
+            field[NameObject("/Parent")] = parent
+        ref = _add(writer, field)
+        (parent.get_object()["/Kids"] if parent is not None else top_fields).append(ref)
+        return ref
+    
+    for page_number in range(1, pages + 1):
+        page = writer.add_blank_page(PAGE_WIDTH, PAGE_HEIGHT)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        lines = [f"Section {page_number}"] + [_sentence(rng, 10) for _ in range(text_lines)]
+        page[NameObject("/Contents")] = _add(writer, _text_stream(lines))
+        annots = ArrayObject()
+        
+        # 为本页创建 nesting_depth-1 层的中间节点
+        parent = None
+        for level in range(1, nesting_depth):
+            parent = add_field(DictionaryObject({
+                NameObject("/T"): TextStringObject(f"page{page_number}" if level == 1 else f"level{level}"),
+                NameObject("/Kids"): ArrayObject()
+            }), parent)
+        
+        def add_widget(widget: DictionaryObject, index: int, field_parent):
+            widget.update({
+                NameObject("/Type"): NameObject("/Annot"),
+                NameObject("/Subtype"): NameObject("/Widget"),
+                NameObject("/Rect"): _rect(index, fields_per_page),
+                NameObject("/P"): page.indirect_reference,
+                NameObject("/F"): NumberObject(4)
+            })
+            annots.append(add_field(widget, field_parent))
+            summary["widgets"] += 1
+        
+        for index in range(fields_per_page):
+            name = TextStringObject(f"field_{page_number}_{index + 1}")
+            filled = rng.random() < filled_fraction
+            kind = rng.random()
+            summary["fields"] += 1
+            summary["filled"] += int(filled)
+            
+            if kind < checkbox_ratio:
+                state = NameObject("/Yes" if filled else "/Off")
+                add_widget(DictionaryObject({
+                    NameObject("/FT"): NameObject("/Btn"),
+                    NameObject("/T"): name,
+                    NameObject("/V"): state,
+                    NameObject("/AS"): state,
+                    NameObject("/AP"): button_appearance("/Yes")
+                }), index, parent)
+            elif kind < checkbox_ratio + radio_ratio:
+                # 单选按钮组：字段节点不带控件，选项控件通过 /Parent 找到字段名
+                choice = rng.randrange(RADIO_OPTIONS) + 1 if filled else None
+                group = add_field(DictionaryObject({
+                    NameObject("/FT"): NameObject("/Btn"),
+                    NameObject("/Ff"): NumberObject(RADIO_FLAGS),
+                    NameObject("/T"): name,
+                    NameObject("/V"): NameObject(f"/Option{choice}" if choice else "/Off"),
+                    NameObject("/Kids"): ArrayObject()
+                }), parent)
+                for option in range(1, RADIO_OPTIONS + 1):
+                    add_widget(DictionaryObject({
+                        NameObject("/AS"): NameObject(f"/Option{option}" if option == choice else "/Off"),
+                        NameObject("/AP"): button_appearance(f"/Option{option}")
+                    }), index, group)
+            else:
+                field = DictionaryObject({
+                    NameObject("/FT"): NameObject("/Tx"),
+                    NameObject("/T"): name,
+                    NameObject("/DA"): TextStringObject("/F1 9 Tf 0 g")
+                })
+                if filled:
+                    field[NameObject("/V")] = TextStringObject(_sentence(rng, rng.randint(1, 4)))
+                add_widget(field, index, parent)
+        
+        if annots:
+            page[NameObject("/Annots")] = annots
+    
+    if top_fields:
+        writer.root_object[NameObject("/AcroForm")] = _add(writer, DictionaryObject({
+            NameObject("/Fields"): top_fields,
+            NameObject("/NeedAppearances"): BooleanObject(True),
+            NameObject("/DA"): TextStringObject("/F1 9 Tf 0 g"),
+            NameObject("/DR"): DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+            })
+        }))
+    writer.add_metadata({"/Title": f"Synthetic form ({pages} pages, {summary['widgets']} widgets)"})
+    
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return summary
+
+
+def generate_preset(name: str, output_dir: str = "generated_pdfs", seed: int = 0,
+                    overwrite: bool = False) -> str:
+    """
+    按预设生成PDF（文件已存在时直接复用）
+    
+    Args:
+        name: 预设名称（见 PRESETS）
+        output_dir: 输出目录
+        seed: 随机种子
+        overwrite: 是否重新生成已存在的文件
+    
+    Returns:
+        生成的PDF路径
+    """
+    if name not in PRESETS:
+        raise ValueError(f"未知的预设: {name}，可用: {', '.join(PRESETS)}")
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"synthetic-{name}-seed{seed}.pdf")
+    if overwrite or not os.path.exists(path):
+        generate_form_pdf(path, seed=seed, **PRESETS[name])
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成表单PDF")
+    parser.add_argument("output", nargs="?", default="synthetic_form.pdf", help="输出文件路径")
+    parser.add_argument("--preset", choices=list(PRESETS), help="使用预设参数（其他参数可覆盖预设）")
+    parser.add_argument("--pages", type=int, help="页数（默认10）")
+    parser.add_argument("--text-lines", type=int, help="每页文本行数（默认40）")
+    parser.add_argument("--fields-per-page", type=int, help="每页字段数（默认20）")
+    parser.add_argument("--depth", type=int, dest="nesting_depth", help="字段层级深度（默认1）")
+    parser.add_argument("--checkbox-ratio", type=float, help="复选框比例（默认0.2）")
+    parser.add_argument("--radio-ratio", type=float, help="单选按钮组比例（默认0.1）")
+    parser.add_argument("--filled", type=float, dest="filled_fraction", help="已填写字段比例（默认0.5）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认0）")
+    args = parser.parse_args()
+    
+    params = dict(PRESETS[args.preset]) if args.preset else {}
+    for key in ("pages", "text_lines", "fields_per_page", "nesting_depth", "checkbox_ratio",
+                "radio_ratio", "filled_fraction"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    
+    try:
+        summary = generate_form_pdf(args.output, seed=args.seed, **params)
+        size_kb = os.path.getsize(args.output) / 1024
+        print(f"✓ 已生成: {args.output} ({size_kb:.0f} KB)")
+        print(f"  页数: {summary['pages']}，字段: {summary['fields']}，"
+              f"控件: {summary['widgets']}，已填写: {summary['filled']}")
+    except ValueError as e:
+        print(f"错误: {e}")
@@ -4,28 +4,69 @@ PDF问答系统
 """
 
 import os
+import sys
 import json
+import time
 import argparse
-from typing import Optional, Dict, Any
-from pdf_extractor import PDFExtractor
-from llm_client import LLMClientFactory, LLMClient
+from functools import partial
+from contextlib import redirect_stdout, nullcontext
+from typing import Optional, Dict, Any, Callable, TYPE_CHECKING
+
+# 提取器、LLM客户端等在用到时才导入，只做提取的命令（--info 等）不必导入LLM相关模块
+if TYPE_CHECKING:
+    from llm_client import LLMClient
+    from answer_cache import AnswerCache
+    from extraction_cache import ExtractionCache
+    from pdf_extractor import PDFExtractor
+    from conversation import ConversationSession
+
+
+def _silent(*args, **kwargs):
+    """不输出任何内容（用于关闭打印）"""
+    pass
 
 
 class PDFQASystem:
     """PDF问答系统"""
     
-    def __init__(self, llm_client: LLMClient, pdf_path: Optional[str] = None):
+    def __init__(self, llm_client: "LLMClient", pdf_path: Optional[str] = None,
+                 field_lookup: bool = True, field_lookup_threshold: float = 0.85,
+                 answer_cache: Optional["AnswerCache"] = None, use_cache: bool = True,
+                 warm_up: bool = True, extraction_cache: Optional["ExtractionCache"] = None,
+                 low_memory: Optional[bool] = None):
         """
         初始化PDF问答系统
         
         Args:
             llm_client: LLM客户端
             pdf_path: PDF文件路径（可选，可以后续加载）
+            field_lookup: 是否启用字段直接查找（命中时不调用LLM）
+            field_lookup_threshold: 字段匹配的置信度阈值（0-1）
+            answer_cache: 答案缓存（可选），相同文档和问题不再重复调用LLM
+            use_cache: 是否读取答案缓存（为False时绕过缓存，但仍用新回答刷新缓存）
+            warm_up: 加载PDF时是否在后台预热到LLM服务的连接
+            extraction_cache: 提取结果缓存（可选），已提取过的文档加载时不再解析PDF内容
+            low_memory: 是否以低内存模式提取（默认按文件大小决定，见 PDFExtractor），
+                低内存模式下提取完成后释放 PdfReader，只保留提取的内容
         """
         self.llm_client = llm_client
         self.pdf_path = pdf_path
         self.pdf_content = None
-        self.extractor = None
+        self.context_prefix = None
+        self._extractor = None
+        self._extractor_path = None
+        self.total_pages = None
+        self.metadata = None
+        self.field_count = None
+        self.low_memory = low_memory
+        self.field_lookup = field_lookup
+        self.field_lookup_threshold = field_lookup_threshold
+        self.field_matcher = None
+        self.answer_cache = answer_cache
+        self.use_cache = use_cache
+        self.document_hash = None
+        self.warm_up = warm_up
+        self.extraction_cache = extraction_cache
         
         if pdf_path:
             self.load_pdf(pdf_path)
@@ -40,14 +81,96 @@ class PDFQASystem:
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
         
-        self.pdf_path = pdf_path
-        self.extractor = PDFExtractor(pdf_path)
-        self.pdf_content = self.extractor.get_formatted_content()
+        if self.warm_up:
+            # 提取PDF的同时在后台建立连接，第一次提问不必等待TCP/TLS握手
+            self.llm_client.warm_up()
+        
+        from answer_cache import hash_file
+        
+        document_hash = hash_file(pdf_path)
+        # 提取器在第一次访问时创建，缓存命中时完全不打开PDF
+        self._extractor = None
+        self._extractor_path = pdf_path
+        content = self.extraction_cache.get(document_hash) if self.extraction_cache else None
+        if content is None:
+            self.total_pages = len(self.extractor.reader.pages)
+            content = self.extractor.get_qa_content()
+            if self.extraction_cache:
+                self.extraction_cache.set(document_hash, content, self.total_pages, pdf_path)
+            if self.extractor.low_memory:
+                # 问答只需要提取的内容；提取器仍可使用，之后访问时重新打开文件
+                self.extractor.close()
+        else:
+            self.total_pages = content["pages"]
+        self.load_extracted(pdf_path, document_hash, content["formatted"], content["fields"], content["labels"],
+                            content["metadata"], content["field_count"])
         
         print(f"✓ 已加载PDF文件: {pdf_path}")
-        print(f"✓ 文档共 {len(self.extractor.reader.pages)} 页")
+        print(f"✓ 文档共 {self.total_pages} 页")
         print(f"✓ 提取内容长度: {len(self.pdf_content)} 字符\n")
     
+    @property
+    def extractor(self) -> Optional["PDFExtractor"]:
+        """当前文档的PDF提取器（load_pdf 加载的文档在第一次访问时创建，其他方式加载时为None）"""
+        if self._extractor is None and self._extractor_path:
+            from pdf_extractor import PDFExtractor
+            self._extractor = PDFExtractor(self._extractor_path, low_memory=self.low_memory)
+        return self._extractor
+    
+    def load_extracted(self, pdf_path: str, document_hash: str, pdf_content: str,
+                       fields: Dict[str, Dict[str, Any]], field_labels: Dict[str, str],
+                       metadata: Optional[Dict[str, Any]] = None, field_count: Optional[int] = None):
+        """
+        使用已经提取好的内容加载文档（例如在工作进程中提取），不保留提取器
+        
+        Args:
+            pdf_path: PDF文件路径
+            document_hash: 文件内容哈希（用于答案缓存）
+            pdf_content: 格式化内容（get_formatted_content 的结果）
+            fields: 解释后的表单字段（get_interpreted_fields 的结果）
+            field_labels: 字段标签（get_field_labels 的结果）
+            metadata: PDF元数据（可选）
+            field_count: 全部表单字段数，包括空值（可选）
+        """
+        self.pdf_path = pdf_path
+        self.document_hash = document_hash
+        self.pdf_content = pdf_content
+        self.metadata = metadata
+        self.field_count = field_count
+        # 文档上下文前缀只构建一次，所有提问复用，便于命中提供商的提示词缓存
+        self.context_prefix = self.llm_client.build_context_prefix(pdf_content)
+        from field_matcher import FieldMatcher
+        self.field_matcher = FieldMatcher(fields, field_labels, threshold=self.field_lookup_threshold)
+    
+    def load_diff(self, old_path: str, new_path: str, include_text: bool = False) -> Dict[str, Any]:
+        """
+        比较同一表单的两个版本，之后的提问只把差异作为上下文（不发送两个版本的完整内容）
+        
+        Args:
+            old_path: 旧版本PDF路径
+            new_path: 新版本PDF路径
+            include_text: 是否同时比较每页文本
+        
+        Returns:
+            差异（见 form_diff.diff_snapshots）
+        """
+        if self.warm_up:
+            self.llm_client.warm_up()
+        
+        from form_diff import diff_pdfs, format_delta
+        
+        diff = diff_pdfs(old_path, new_path, self.extraction_cache, include_text, self.low_memory)
+        self._extractor = None
+        self._extractor_path = None
+        self.total_pages = None
+        # 差异上下文中只有变化的字段，字段直接查找会把未变化的字段误判为不存在，因此不提供字段
+        self.load_extracted(new_path, diff["hash"], format_delta(diff), {}, {})
+        
+        print(f"✓ 已比较: {old_path} → {new_path}")
+        print(f"✓ 修改 {len(diff['changed'])} 个、新增 {len(diff['added'])} 个、删除 {len(diff['removed'])} 个字段，"
+              f"差异内容长度: {len(self.pdf_content)} 字符\n")
+        return diff
+    
     def ask(self, question: str, include_context: bool = True, **kwargs) -> str:
         """
         向LLM提问关于PDF的问题
@@ -60,30 +183,277 @@ class PDFQASystem:
         Returns:
             LLM的回答
         """
-        if not self.pdf_content and include_context:
+        return self.ask_detailed(question, include_context, **kwargs)["answer"]
+    
+    def ask_detailed(self, question: str, include_context: bool = True,
+                     use_field_lookup: Optional[bool] = None, use_cache: Optional[bool] = None,
+                     verbose: bool = True, stream: bool = False,
+                     on_token: Optional[Callable[[str], None]] = None,
+                     session: Optional["ConversationSession"] = None, **kwargs) -> Dict[str, Any]:
+        """
+        提问并返回回答及其来源
+        
+        先尝试用字段匹配器直接从表单字段值回答，再查答案缓存，都未命中时才调用LLM
+        
+        Args:
+            question: 用户问题
+            include_context: 是否包含PDF内容作为上下文
+            use_field_lookup: 是否尝试字段直接查找（默认使用初始化时的设置）
+            use_cache: 是否读取答案缓存（默认使用初始化时的设置）
+            verbose: 是否打印问题和回答
+            stream: 是否流式接收LLM回答（verbose时边接收边打印）
+            on_token: 流式接收时每收到一段文本调用的回调（可选）
+            session: 对话会话（可选），提供时带上历史对话并记录本轮问答
+            **kwargs: 传递给LLM的其他参数
+            
+        Returns:
+            包含 answer、source（"field_lookup"、"cache" 或 "llm"）、elapsed、
+            ttft（首个token耗时，仅流式）等信息的字典
+        """
+        start = time.perf_counter()
+        log = print if verbose else _silent
+        
+        # 已有历史时，问题可能依赖上文，不能使用按单个问题缓存的答案
+        in_conversation = session is not None and session.turns > 0
+        if in_conversation:
+            use_cache = False
+        
+        result, cache_key = self._answer_locally(question, include_context, use_field_lookup,
+                                                 use_cache, kwargs, start, log)
+        if in_conversation:
+            cache_key = None
+        if result:
+            if session is not None:
+                session.add_turn(question, result["answer"])
+            return result
+        
+        context = self.pdf_content if include_context else None
+        llm_kwargs = self._llm_kwargs(include_context, kwargs)
+        messages = session.build_messages(question) if session is not None else None
+        
+        if not stream:
+            log("正在思考...\n")
+            if messages is not None:
+                answer = self.llm_client.chat(messages, **kwargs)
+            else:
+                answer = self.llm_client.ask(question, context=context, **llm_kwargs)
+            result = self._finish_llm_answer(question, answer, include_context, cache_key, kwargs, start, log)
+            if session is not None:
+                session.add_turn(question, answer)
+            return result
+        
+        if messages is not None:
+            chunks = self.llm_client.chat_stream(messages, **kwargs)
+        else:
+            chunks = self.llm_client.ask_stream(question, context=context, **llm_kwargs)
+        
+        # 流式接收：边到达边输出，并记录首个token耗时
+        ttft = None
+        parts = []
+        log("回答: ", end="", flush=True)
+        for text in chunks:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(text)
+            log(text, end="", flush=True)
+            if on_token:
+                on_token(text)
+        log("")
+        
+        result = self._finish_llm_answer(question, "".join(parts), include_context, cache_key,
+                                         kwargs, start, log, answer_printed=True, ttft=ttft)
+        if session is not None:
+            session.add_turn(question, result["answer"])
+        return result
+    
+    def start_session(self, max_history_tokens: int = 4000, summarize_with_llm: bool = False) -> "ConversationSession":
+        """
+        开始一个多轮对话会话
+        
+        Args:
+            max_history_tokens: 历史对话的token预算，超出时较早的轮次被摘要
+            summarize_with_llm: 是否用LLM摘要较早的轮次（默认本地截断，不额外调用LLM）
+            
+        Returns:
+            对话会话，传给 ask_detailed(session=...) 使用
+        """
+        if not self.context_prefix:
             raise ValueError("请先加载PDF文件")
+        from conversation import ConversationSession, make_llm_summarizer
+        summarizer = make_llm_summarizer(self.llm_client) if summarize_with_llm else None
+        return ConversationSession(self.context_prefix, max_history_tokens=max_history_tokens,
+                                   summarizer=summarizer)
+    
+    async def aask(self, question: str, include_context: bool = True, **kwargs) -> str:
+        """
+        异步向LLM提问关于PDF的问题
+        
+        Args:
+            question: 用户问题
+            include_context: 是否包含PDF内容作为上下文
+            **kwargs: 传递给LLM的其他参数
+            
+        Returns:
+            LLM的回答
+        """
+        result = await self.aask_detailed(question, include_context, **kwargs)
+        return result["answer"]
+    
+    async def aask_detailed(self, question: str, include_context: bool = True,
+                            use_field_lookup: Optional[bool] = None, use_cache: Optional[bool] = None,
+                            verbose: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        异步提问并返回回答及其来源（参数含义同 ask_detailed，默认不打印）
+        
+        LLM调用通过客户端的 aask() 完成，不占用线程
+        
+        Returns:
+            包含 answer、source、elapsed 等信息的字典
+        """
+        start = time.perf_counter()
+        log = print if verbose else _silent
+        import asyncio
+        loop = asyncio.get_running_loop()
+        
+        # 答案缓存的读写是SQLite操作，放到线程池执行，不阻塞事件循环上的其他请求
+        answer_locally = partial(self._answer_locally, question, include_context, use_field_lookup,
+                                 use_cache, kwargs, start, log)
+        result, cache_key = await loop.run_in_executor(None, answer_locally) if self.answer_cache else answer_locally()
+        if result:
+            return result
         
         context = self.pdf_content if include_context else None
+        answer = await self.llm_client.aask(question, context=context, **self._llm_kwargs(include_context, kwargs))
+        result = self._finish_llm_answer(question, answer, include_context, None, kwargs, start, log)
+        if cache_key:
+            await loop.run_in_executor(None, self._store_answer, cache_key, question, answer, include_context, kwargs)
+        return result
+    
+    def _answer_locally(self, question: str, include_context: bool, use_field_lookup: Optional[bool],
+                        use_cache: Optional[bool], kwargs: Dict[str, Any], start: float, log):
+        """
+        尝试不调用LLM直接回答（字段直接查找、答案缓存）
         
-        print(f"问题: {question}")
-        print("正在思考...\n")
+        Returns:
+            (结果字典或None, 缓存键或None)
+        """
+        if not self.pdf_content and include_context:
+            raise ValueError("请先加载PDF文件")
+        
+        if use_field_lookup is None:
+            use_field_lookup = self.field_lookup
+        if use_cache is None:
+            use_cache = self.use_cache
         
-        answer = self.llm_client.ask(question, context=context, **kwargs)
+        log(f"问题: {question}")
         
-        print(f"回答: {answer}\n")
-        return answer
+        if use_field_lookup and include_context and self.field_matcher:
+            match = self.field_matcher.answer(question)
+            if match:
+                result = {
+                    "answer": match["answer"],
+                    "source": "field_lookup",
+                    "field": match["field"],
+                    "score": match["score"],
+                    "elapsed": time.perf_counter() - start
+                }
+                log(f"回答: {result['answer']}")
+                log(f"(来源: 字段直接查找 - {match['field']}, 置信度 {match['score']})\n")
+                return result, None
+        
+        cache_key = None
+        if self.answer_cache:
+            cache_key = self._cache_key(question, include_context, kwargs)
+            cached = self.answer_cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                result = {
+                    "answer": cached,
+                    "source": "cache",
+                    "elapsed": time.perf_counter() - start
+                }
+                log(f"回答: {cached}")
+                log("(来源: 答案缓存)\n")
+                return result, cache_key
+        
+        return None, cache_key
+    
+    def _llm_kwargs(self, include_context: bool, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """构建LLM调用参数，带上预先构建的文档前缀"""
+        llm_kwargs = dict(kwargs)
+        if include_context and self.context_prefix:
+            llm_kwargs["prefix"] = self.context_prefix
+        return llm_kwargs
     
-    def interactive_mode(self):
-        """交互式问答模式"""
+    def _finish_llm_answer(self, question: str, answer: str, include_context: bool,
+                           cache_key: Optional[str], kwargs: Dict[str, Any], start: float, log,
+                           answer_printed: bool = False, ttft: Optional[float] = None) -> Dict[str, Any]:
+        """整理LLM回答：写入缓存并输出"""
+        result = {
+            "answer": answer,
+            "source": "llm",
+            "elapsed": time.perf_counter() - start,
+            "usage": self.llm_client.last_usage
+        }
+        if answer_printed:
+            result["ttft"] = ttft
+        
+        self._store_answer(cache_key, question, answer, include_context, kwargs)
+        
+        if not answer_printed:
+            log(f"回答: {answer}")
+        details = f"来源: LLM, 耗时 {result['elapsed']:.2f}s"
+        if ttft is not None:
+            details += f", 首token {ttft:.2f}s"
+        usage = result["usage"]
+        if usage and usage.get("input_tokens"):
+            details += f", 输入 {usage['input_tokens']} tokens, 缓存命中 {usage.get('cached_tokens', 0)} tokens"
+        log(f"({details})\n")
+        return result
+    
+    def _store_answer(self, cache_key: Optional[str], question: str, answer: str,
+                      include_context: bool, kwargs: Dict[str, Any]):
+        """把LLM回答写入答案缓存（未启用缓存时忽略）"""
+        if not cache_key:
+            return
+        self.answer_cache.set(
+            cache_key, answer,
+            doc_hash=self.document_hash if include_context else "",
+            question=question,
+            provider=self.llm_client.provider,
+            model=self.llm_client.model,
+            params=kwargs
+        )
+    
+    def _cache_key(self, question: str, include_context: bool, params: Dict[str, Any]) -> str:
+        """生成当前文档、问题和LLM配置对应的缓存键"""
+        from answer_cache import AnswerCache
+        return AnswerCache.make_key(
+            self.document_hash if include_context else "",
+            question,
+            self.llm_client.provider,
+            self.llm_client.model,
+            params
+        )
+    
+    def interactive_mode(self, max_history_tokens: int = 4000):
+        """
+        交互式问答模式（多轮对话，可以追问）
+        
+        Args:
+            max_history_tokens: 对话历史的token预算
+        """
         if not self.pdf_content:
             raise ValueError("请先加载PDF文件")
         
+        session = self.start_session(max_history_tokens=max_history_tokens)
+        
         print("=" * 60)
         print("PDF问答系统 - 交互模式")
         print("=" * 60)
         print("输入问题开始对话，输入 'quit' 或 'exit' 退出")
         print("输入 'reload' 重新加载PDF文件")
         print("输入 'info' 查看PDF信息")
+        print("输入 'clear' 清空对话历史")
         print("-" * 60)
         
         while True:
@@ -100,6 +470,7 @@ class PDFQASystem:
                 if question.lower() == 'reload':
                     if self.pdf_path:
                         self.load_pdf(self.pdf_path)
+                        session = self.start_session(max_history_tokens=max_history_tokens)
                     else:
                         print("错误: 没有PDF文件路径")
                     continue
@@ -108,7 +479,12 @@ class PDFQASystem:
                     self.show_pdf_info()
                     continue
                 
-                answer = self.ask(question)
+                if question.lower() == 'clear':
+                    session.reset()
+                    print("✓ 已清空对话历史")
+                    continue
+                
+                self.ask_detailed(question, stream=True, session=session)
                 
             except KeyboardInterrupt:
                 print("\n\n再见！")
@@ -132,7 +508,7 @@ class PDFQASystem:
                 if value:
                     print(f"{key}: {value}")
         
-        print(f"\n总页数: {len(self.extractor.reader.pages)}")
+        print(f"\n总页数: {self.total_pages}")
         
         fields = self.extractor.extract_form_fields()
         if fields:
@@ -141,38 +517,287 @@ class PDFQASystem:
         print(f"内容长度: {len(self.pdf_content)} 字符")
         print("=" * 60)
     
-    def batch_ask(self, questions: list) -> Dict[str, str]:
+    def batch_ask(self, questions: list, max_workers: int = 1, pack_size: int = 1,
+                  **kwargs) -> Dict[str, Optional[str]]:
         """
         批量提问
         
         Args:
             questions: 问题列表
+            max_workers: 最大并发请求数（1表示逐个提问）
+            pack_size: 每次请求打包的问题数（大于1时启用打包模式）
+            **kwargs: 传递给ask()的其他参数（如 use_cache）
+            
+        Returns:
+            问题和答案的字典（按问题顺序，出错的问题答案为None）
+        """
+        report = self.batch_ask_detailed(questions, max_workers=max_workers, pack_size=pack_size, **kwargs)
+        return {item["question"]: item["answer"] for item in report["results"]}
+    
+    def batch_ask_detailed(self, questions: list, max_workers: int = 1, pack_size: int = 1,
+                           max_retries: int = 2, **kwargs) -> Dict[str, Any]:
+        """
+        批量提问并返回详细结果
+        
+        max_workers 大于1时使用线程池并发提问，结果仍按问题顺序返回；
+        单个问题出错不会中断整个批次，错误信息记录在该问题的结果中。
+        pack_size 大于1时每次请求打包多个问题，文档上下文只发送一次
+        
+        Args:
+            questions: 问题列表
+            max_workers: 最大并发请求数（1表示逐个提问）
+            pack_size: 每次请求打包的问题数（大于1时启用打包模式）
+            max_retries: 打包模式下回答解析失败的问题最多重试次数
+            **kwargs: 传递给ask_detailed()的其他参数
             
         Returns:
-            问题和答案的字典
-        """
-        results = {}
-        for i, question in enumerate(questions, 1):
-            print(f"\n[{i}/{len(questions)}] ", end="")
-            answer = self.ask(question)
-            results[question] = answer
-        return results
+            包含 results（每个问题的结果列表）、wall_time（总耗时）、
+            total_latency（各请求耗时之和）和 errors（出错数）的字典
+        """
+        total = len(questions)
+        start = time.perf_counter()
+        
+        if pack_size > 1:
+            results, total_latency = self._batch_ask_packed(questions, pack_size, max_workers,
+                                                            max_retries, kwargs)
+            return self._batch_report(results, start, total_latency)
+        
+        results = [None] * total
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        def run(question: str, verbose: bool) -> Dict[str, Any]:
+            question_start = time.perf_counter()
+            try:
+                result = self.ask_detailed(question, verbose=verbose, **kwargs)
+                result["error"] = None
+            except Exception as e:
+                result = {
+                    "answer": None,
+                    "source": None,
+                    "error": str(e),
+                    "elapsed": time.perf_counter() - question_start
+                }
+                if verbose:
+                    print(f"错误: {e}\n")
+            result["question"] = question
+            return result
+        
+        if max_workers <= 1 or total <= 1:
+            for i, question in enumerate(questions):
+                print(f"\n[{i + 1}/{total}] ", end="")
+                results[i] = run(question, True)
+        else:
+            print(f"并发提问 {total} 个问题（最大并发数 {max_workers}）...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(run, question, False): i for i, question in enumerate(questions)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    results[i] = future.result()
+                    status = "出错" if results[i]["error"] else "完成"
+                    print(f"[{done}/{total}] {status} ({results[i]['elapsed']:.2f}s): {questions[i]}")
+            
+            self._print_batch_results(results)
+        
+        total_latency = sum(result["elapsed"] for result in results)
+        return self._batch_report(results, start, total_latency)
+    
+    def _batch_ask_packed(self, questions: list, pack_size: int, max_workers: int,
+                          max_retries: int, kwargs: Dict[str, Any]):
+        """
+        打包模式批量提问：能直接回答的问题（字段查找、缓存）先处理，
+        其余问题每 pack_size 个合并为一次请求，只重试回答解析失败的问题
+        
+        Returns:
+            (按问题顺序的结果列表, 各请求耗时之和)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from question_packer import make_question_ids, build_packed_prompt, parse_packed_answer
+        
+        params = dict(kwargs)
+        use_field_lookup = params.pop("use_field_lookup", None)
+        use_cache = params.pop("use_cache", None)
+        params.pop("verbose", None)
+        
+        total = len(questions)
+        results = [None] * total
+        cache_keys = {}
+        pending = []
+        
+        for i, question in enumerate(questions):
+            question_start = time.perf_counter()
+            try:
+                result, cache_keys[i] = self._answer_locally(question, True, use_field_lookup, use_cache,
+                                                             params, question_start, _silent)
+            except Exception as e:
+                result = {"answer": None, "source": None, "error": str(e),
+                          "elapsed": time.perf_counter() - question_start}
+            if result:
+                result.setdefault("error", None)
+                result["question"] = question
+                results[i] = result
+            else:
+                pending.append(i)
+        
+        print(f"打包提问: {total} 个问题中 {total - len(pending)} 个已直接回答，"
+              f"{len(pending)} 个需要LLM（每次请求 {pack_size} 个）")
+        
+        def run_pack(pack: list) -> Dict[str, Any]:
+            ids = make_question_ids(len(pack))
+            prompt = build_packed_prompt(dict(zip(ids, (questions[i] for i in pack))))
+            pack_start = time.perf_counter()
+            try:
+                text = self.llm_client.ask(prompt, context=self.pdf_content, **self._llm_kwargs(True, params))
+                answers, failed = parse_packed_answer(text, ids)
+                error = "无法解析打包回答" if failed else None
+            except Exception as e:
+                answers, failed, error = {}, ids, str(e)
+            return {
+                "answers": {pack[ids.index(qid)]: answer for qid, answer in answers.items()},
+                "failed": [pack[ids.index(qid)] for qid in failed],
+                "error": error,
+                "elapsed": time.perf_counter() - pack_start,
+                "usage": self.llm_client.last_usage
+            }
+        
+        total_latency = 0.0
+        errors = {}
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            packs = [pending[j:j + pack_size] for j in range(0, len(pending), pack_size)]
+            if max_workers > 1 and len(packs) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    outcomes = list(executor.map(run_pack, packs))
+            else:
+                outcomes = [run_pack(pack) for pack in packs]
+            
+            pending = []
+            for pack, outcome in zip(packs, outcomes):
+                total_latency += outcome["elapsed"]
+                for i, answer in outcome["answers"].items():
+                    results[i] = {
+                        "question": questions[i],
+                        "answer": answer,
+                        "source": "llm_packed",
+                        "elapsed": outcome["elapsed"],
+                        "usage": outcome["usage"],
+                        "pack_size": len(pack),
+                        "error": None
+                    }
+                    self._store_answer(cache_keys.get(i), questions[i], answer, True, params)
+                for i in outcome["failed"]:
+                    errors[i] = outcome["error"]
+                pending.extend(outcome["failed"])
+                print(f"[第{attempt + 1}轮] 打包请求 {len(pack)} 个问题: 成功 {len(outcome['answers'])}, "
+                      f"失败 {len(outcome['failed'])} ({outcome['elapsed']:.2f}s)")
+        
+        for i in pending:
+            results[i] = {
+                "question": questions[i],
+                "answer": None,
+                "source": None,
+                "elapsed": 0.0,
+                "error": errors.get(i) or "无法解析打包回答"
+            }
+        
+        self._print_batch_results(results)
+        return results, total_latency
+    
+    @staticmethod
+    def _print_batch_results(results: list):
+        """按问题顺序输出批量提问的回答"""
+        total = len(results)
+        for i, result in enumerate(results):
+            print(f"\n[{i + 1}/{total}] 问题: {result['question']}")
+            if result["error"]:
+                print(f"错误: {result['error']}")
+            else:
+                print(f"回答: {result['answer']}")
+    
+    def _batch_report(self, results: list, start: float, total_latency: float) -> Dict[str, Any]:
+        """汇总批量提问结果并输出统计"""
+        total = len(results)
+        wall_time = time.perf_counter() - start
+        errors = sum(1 for result in results if result["error"])
+        
+        print(f"\n批量提问完成: {total - errors}/{total} 成功, 总耗时 {wall_time:.2f}s, "
+              f"各请求耗时合计 {total_latency:.2f}s")
+        
+        # 同一文档的上下文前缀只需付费一次，后续请求应命中提供商的提示词缓存
+        stats = self.llm_client.get_usage_stats()
+        if stats["requests"] and stats["input_tokens"]:
+            print(f"提示词缓存: 共 {stats['input_tokens']} 输入tokens, "
+                  f"命中 {stats['cached_tokens']} ({stats['cache_hit_rate']:.0%})")
+        if stats.get("retries"):
+            print(f"重试: {stats['retries']} 次（其中限流 {stats.get('rate_limited', 0)} 次）")
+        limiter = getattr(self.llm_client, "limiter", None)
+        if limiter:
+            print(f"自适应并发上限: {limiter.limit}")
 
+        return {
+            "results": results,
+            "wall_time": wall_time,
+            "total_latency": total_latency,
+            "errors": errors
+        }
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="PDF问答系统")
     parser.add_argument("pdf_file", nargs="?", help="PDF文件路径")
-    parser.add_argument("-q", "--question", help="要提问的问题")
+    parser.add_argument("-q", "--question", action="append", help="要提问的问题（可多次指定，批量提问）")
     parser.add_argument("-c", "--config", default="config.json", help="配置文件路径")
     parser.add_argument("-i", "--interactive", action="store_true", help="交互模式")
-    parser.add_argument("--info", action="store_true", help="显示PDF信息")
+    # 只做提取的命令每次只能执行一个
+    extract_commands = parser.add_mutually_exclusive_group()
+    extract_commands.add_argument("--info", action="store_true", help="显示PDF信息（不读取配置、不创建LLM客户端）")
+    extract_commands.add_argument("--fields", action="store_true", help="打印表单字段（不使用LLM）")
+    extract_commands.add_argument("--text", action="store_true", help="打印提取的文本（不使用LLM）")
+    parser.add_argument("--json", action="store_true",
+                        help="以JSON输出；与 -q 一起使用时输出回答，单独使用时输出全部提取内容（不使用LLM）")
+    parser.add_argument("--no-field-lookup", action="store_true", help="禁用字段直接查找，所有问题都交给LLM")
+    parser.add_argument("--no-cache", action="store_true", help="绕过答案缓存，重新调用LLM")
+    parser.add_argument("-j", "--max-workers", type=int, help="批量提问的最大并发数（默认读取配置 settings.max_concurrency）")
+    parser.add_argument("--pack-size", type=int, default=1, help="批量提问时每次请求打包的问题数（默认1，不打包）")
+    parser.add_argument("--profile", action="store_true", help="加载PDF后打印各提取阶段的耗时分解")
+    parser.add_argument("--profile-out", help="用cProfile分析PDF加载并把数据保存到该文件")
+    parser.add_argument("--metrics-out", help="结束时把LLM调用指标写入文件（.json 为JSON，其他为Prometheus文本格式）")
+    parser.add_argument("--low-memory", action="store_true", help="低内存模式：逐页释放解析的对象，提取后释放PDF（默认只对大文件启用）")
+    parser.add_argument("--jsonl", action="store_true", help="常驻模式：从标准输入逐行读取JSON请求，向标准输出写入JSON响应")
     
     args = parser.parse_args()
+    if args.json and (args.interactive or args.jsonl):
+        parser.error("--json 不能与 -i/--interactive 或 --jsonl 一起使用")
+    
+    # 只做提取的命令在读取配置之前处理，不导入也不创建LLM客户端
+    command = next((name for name in ("info", "fields", "text") if getattr(args, name)),
+                   "json" if args.json and not args.question else None)
+    if command and (args.question or args.interactive):
+        parser.error(f"--{command} 不能与 -q/--question 或 -i/--interactive 一起使用")
+    if command:
+        if not args.pdf_file:
+            print("错误: 请指定PDF文件")
+            return
+        from pdf_cli import run_command
+        status = run_command(command, args.pdf_file, as_json=args.json, low_memory=args.low_memory or None)
+        if status:
+            sys.exit(status)
+        return
+    
+    from llm_client import LLMClientFactory
+    from answer_cache import create_answer_cache
+    from extraction_cache import create_extraction_cache
     
     # 加载配置
     try:
-        llm_client = LLMClientFactory.create_from_file(args.config)
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        llm_client = LLMClientFactory.create_from_config(config.get("llm", {}))
+        answer_cache = create_answer_cache(config.get("cache", {}))
+        extraction_cache = create_extraction_cache(config.get("extraction_cache", {}))
+        max_workers = args.max_workers or config.get("settings", {}).get("max_concurrency", 4)
+        max_history_tokens = config.get("settings", {}).get("max_history_tokens", 4000)
+        warm_up = config.get("llm", {}).get("http", {}).get("warm_up", True)
     except FileNotFoundError:
         print(f"错误: 找不到配置文件 {args.config}")
         print("请创建配置文件或使用 --config 指定配置文件路径")
@@ -181,45 +806,101 @@ def main():
         print(f"错误: 加载配置失败 - {e}")
         return
     
+    if args.jsonl:
+        # 常驻模式：文档和LLM客户端在请求之间保持，不必每个问题重新启动
+        from jsonl_worker import JSONLWorker
+        worker = JSONLWorker(llm_client, answer_cache, field_lookup=not args.no_field_lookup,
+                             use_cache=not args.no_cache, extraction_cache=extraction_cache,
+                             low_memory=args.low_memory or None)
+        worker.run(preload=args.pdf_file)
+        if args.metrics_out and llm_client.metrics is not None:
+            llm_client.metrics.write(args.metrics_out)
+        return
+    
     # 创建问答系统
-    qa_system = PDFQASystem(llm_client)
+    qa_system = PDFQASystem(
+        llm_client,
+        field_lookup=not args.no_field_lookup,
+        answer_cache=answer_cache,
+        use_cache=not args.no_cache,
+        warm_up=warm_up,
+        extraction_cache=extraction_cache,
+        low_memory=args.low_memory or None
+    )
+    
+    # 以JSON输出回答时，加载和提问过程的提示信息写到标准错误，标准输出只有JSON
+    progress = redirect_stdout(sys.stderr) if args.json else nullcontext()
     
     # 加载PDF
     if args.pdf_file:
         try:
-            qa_system.load_pdf(args.pdf_file)
+            with progress:
+                if args.profile_out:
+                    from pdf_extractor import profile_call
+                    profile_call(lambda: qa_system.load_pdf(args.pdf_file), args.profile_out)
+                else:
+                    qa_system.load_pdf(args.pdf_file)
         except Exception as e:
             print(f"错误: {e}")
             return
+        if args.profile or args.profile_out:
+            with progress:
+                if qa_system._extractor:
+                    print("各阶段耗时:")
+                    print(qa_system._extractor.stats.format_report() + "\n")
+                else:
+                    print("提取结果缓存命中，未解析PDF\n")
     
     # 执行操作
-    if args.info:
-        qa_system.show_pdf_info()
-    elif args.question:
+    if args.question:
         if not qa_system.pdf_content:
             print("错误: 请指定PDF文件")
             return
-        qa_system.ask(args.question)
+        if args.json:
+            with progress:
+                report = qa_system.batch_ask_detailed(args.question, max_workers=max_workers,
+                                                      pack_size=args.pack_size)
+            print(json.dumps(report["results"], ensure_ascii=False, indent=2, default=str))
+        elif len(args.question) == 1:
+            qa_system.ask_detailed(args.question[0], stream=True)
+        else:
+            qa_system.batch_ask(args.question, max_workers=max_workers, pack_size=args.pack_size)
     elif args.interactive:
         if not qa_system.pdf_content:
             print("错误: 请指定PDF文件")
             return
-        qa_system.interactive_mode()
+        qa_system.interactive_mode(max_history_tokens=max_history_tokens)
     else:
         # 默认进入交互模式
         if qa_system.pdf_content:
-            qa_system.interactive_mode()
+            qa_system.interactive_mode(max_history_tokens=max_history_tokens)
         else:
             print("使用方法:")
             print(f"  python {os.path.basename(__file__)} <pdf_file> [选项]")
             print("\n选项:")
-            print("  -q, --question TEXT    提问问题")
+            print("  -q, --question TEXT    提问问题（可多次指定）")
+            print("  -j, --max-workers N    批量提问的最大并发数")
+            print("  --pack-size N          批量提问时每次请求打包的问题数")
             print("  -i, --interactive      交互模式")
-            print("  --info                 显示PDF信息")
+            print("  --info                 显示PDF信息（不需要配置文件）")
+            print("  --fields               打印表单字段（不需要配置文件）")
+            print("  --text                 打印提取的文本（不需要配置文件）")
+            print("  --json                 以JSON输出回答（与 -q 一起使用）或提取结果（不需要配置文件）")
+            print("  --no-field-lookup      禁用字段直接查找")
+            print("  --no-cache             绕过答案缓存")
+            print("  --profile              打印PDF提取各阶段的耗时分解")
+            print("  --profile-out FILE     用cProfile分析PDF加载并保存数据")
+            print("  --metrics-out FILE     结束时导出LLM调用指标")
+            print("  --low-memory           低内存模式（用于很大的PDF）")
+            print("  --jsonl                常驻模式，从标准输入读取JSONL请求")
             print("  -c, --config FILE      配置文件路径 (默认: config.json)")
             print("\n示例:")
             print(f"  python {os.path.basename(__file__)} document.pdf -i")
             print(f"  python {os.path.basename(__file__)} document.pdf -q '这个文档的主要内容是什么？'")
+    
+    if args.metrics_out and llm_client.metrics is not None:
+        llm_client.metrics.write(args.metrics_out)
+        print(f"✓ LLM调用指标已写入: {args.metrics_out}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,506 @@
+"""
+本地HTTP服务
+常驻进程提供 /extract、/fields、/ask、/batch_ask 接口以及 /health、/metrics：
+PDF提取在工作进程池中进行（不阻塞事件循环），LLM客户端、答案缓存和已提取的文档在请求之间共享
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import functools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, Any, Optional, List, Tuple
+from llm_client import LLMClientFactory, LLMClient
+from llm_metrics import REGISTRY
+from answer_cache import AnswerCache, hash_file, create_answer_cache
+from extraction_cache import ExtractionCache, create_extraction_cache
+from batch_extract import EXTRACT_MODES, extract_document, init_worker
+from pdf_qa_system import PDFQASystem
+
+
+# 默认配置（config.json 的 server 部分）
+DEFAULT_SERVER_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "workers": 2,
+    "max_documents": 32,
+    "max_document_mb": 1024,
+    "max_body_bytes": 1048576,
+    "root": None
+}
+
+
+class HTTPError(Exception):
+    """返回给客户端的错误（状态码和说明）"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_body(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class QAServer:
+    """PDF提取和问答的HTTP服务"""
+    
+    def __init__(self, llm_client: LLMClient, answer_cache: Optional[AnswerCache] = None,
+                 workers: int = 2, max_documents: int = 32, max_document_mb: Optional[float] = 1024,
+                 max_concurrency: int = 4, max_body_bytes: int = 1048576, root: Optional[str] = None,
+                 field_lookup: bool = True, extraction_cache: Optional[ExtractionCache] = None):
+        """
+        初始化服务
+        
+        Args:
+            llm_client: 所有请求共享的LLM客户端
+            answer_cache: 共享的答案缓存（可选）
+            workers: 提取PDF的工作进程数（0表示在线程中提取，仍不阻塞事件循环）
+            max_documents: 内存中缓存的提取结果数（按最近使用淘汰）
+            max_document_mb: 单个文档提取时的内存上限（MB）
+            max_concurrency: /batch_ask 中同时进行的LLM请求数
+            max_body_bytes: 请求体大小上限
+            root: 只允许访问该目录下的PDF（为None时不限制）
+            field_lookup: 是否启用字段直接查找
+            extraction_cache: 持久化的提取结果缓存（可选），命中时问答不再提取PDF
+        """
+        self.llm_client = llm_client
+        self.answer_cache = answer_cache
+        self.workers = workers
+        self.max_documents = max_documents
+        self.max_document_mb = max_document_mb
+        self.max_concurrency = max_concurrency
+        self.max_body_bytes = max_body_bytes
+        self.root = os.path.realpath(root) if root else None
+        self.field_lookup = field_lookup
+        self.extraction_cache = extraction_cache
+        self.pool = self._create_pool()
+        self.started = time.time()
+        self.metrics = REGISTRY
+        # (路径, 修改时间, 大小, 模式) -> 提取结果；文件变化后自动失效
+        self._documents: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._loading: Dict[tuple, asyncio.Future] = {}
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self.routes = {
+            ("GET", "/health"): self.handle_health,
+            ("GET", "/metrics"): self.handle_metrics,
+            ("POST", "/extract"): self.handle_extract,
+            ("POST", "/fields"): self.handle_fields,
+            ("POST", "/ask"): self.handle_ask,
+            ("POST", "/batch_ask"): self.handle_batch_ask
+        }
+    
+    def _create_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+    
+    def _resolve_path(self, body: Dict[str, Any]) -> str:
+        """校验请求中的PDF路径"""
+        path = body.get("path")
+        if not path or not isinstance(path, str):
+            raise HTTPError(400, "缺少 path 参数")
+        real_path = os.path.realpath(path)
+        if self.root and os.path.commonpath([self.root, real_path]) != self.root:
+            raise HTTPError(403, f"不允许访问 {self.root} 以外的文件")
+        if not os.path.isfile(real_path):
+            raise HTTPError(404, f"PDF文件不存在: {path}")
+        return real_path
+    
+    async def _run_extraction(self, path: str, mode: str) -> Dict[str, Any]:
+        """在工作进程中提取（只采样RSS，不使用tracemalloc，避免拖慢提取）"""
+        # 内存上限依赖中断主线程，在线程中提取时不能使用
+        limit = self.max_document_mb if self.pool else None
+        func = functools.partial(extract_document, path, mode, limit, trace_python=False)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, func)
+        except BrokenProcessPool:
+            # 工作进程被强制终止（例如OOM）后进程池不可再用，重建后返回错误
+            self.metrics.inc("server_worker_crashes_total", help_text="工作进程异常退出次数")
+            broken, self.pool = self.pool, self._create_pool()
+            broken.shutdown(wait=False)
+            raise HTTPError(500, "提取该文档时工作进程异常退出（可能超出内存）")
+        if result["status"] != "ok":
+            status = 413 if result["status"] == "memory_limit" else 422
+            raise HTTPError(status, f"提取失败: {result['error']}")
+        return result
+    
+    async def _cached(self, path: str, mode: str, load) -> Tuple[Any, bool]:
+        """
+        读取缓存的提取结果，没有时调用 load() 生成；同一文档的并发请求只提取一次
+        
+        Returns:
+            (结果, 是否来自缓存)
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, mode)
+        if key in self._documents:
+            self._documents.move_to_end(key)
+            self.metrics.inc("server_document_cache_total", help_text="文档缓存查询次数", result="hit")
+            return self._documents[key], True
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key]), True
+        
+        self.metrics.inc("server_document_cache_total", help_text="文档缓存查询次数", result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await load()
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他请求在等待时，避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+        future.set_result(value)
+        self._documents[key] = value
+        while len(self._documents) > self.max_documents:
+            self._documents.popitem(last=False)
+        return value, False
+    
+    async def get_extraction(self, path: str, mode: str) -> Tuple[Dict[str, Any], bool]:
+        """获取指定模式的提取结果"""
+        return await self._cached(path, mode, lambda: self._run_extraction(path, mode))
+    
+    async def get_qa_system(self, path: str) -> Tuple[PDFQASystem, bool]:
+        """获取文档对应的问答系统（提取在工作进程中进行，哈希和持久化缓存读写在线程中进行）"""
+        async def load():
+            loop = asyncio.get_running_loop()
+            document_hash = await loop.run_in_executor(None, hash_file, path)
+            content = None
+            if self.extraction_cache:
+                content = await loop.run_in_executor(None, self.extraction_cache.get, document_hash)
+            if content is None:
+                result, _ = await self.get_extraction(path, "qa")
+                content = result["content"]
+                if self.extraction_cache:
+                    await loop.run_in_executor(None, self.extraction_cache.set, document_hash, content,
+                                               result.get("pages"), path)
+            qa_system = PDFQASystem(self.llm_client, field_lookup=self.field_lookup,
+                                    answer_cache=self.answer_cache, warm_up=False)
+            qa_system.load_extracted(path, document_hash, content["formatted"], content["fields"],
+                                     content["labels"], content["metadata"], content["field_count"])
+            return qa_system
+        return await self._cached(path, "qa_system", load)
+    
+    async def handle_health(self, body: Dict[str, Any], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """GET /health"""
+        return {
+            "status": "ok",
+            "uptime": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "documents_cached": len(self._documents),
+            "documents_loading": len(self._loading),
+            "provider": self.llm_client.provider,
+            "model": self.llm_client.model
+        }
+    
+    async def handle_metrics(self, body: Dict[str, Any], query: Dict[str, List[str]]):
+        """GET /metrics（?format=json 时返回JSON，否则为Prometheus文本格式）"""
+        if query.get("format", [""])[0] == "json":
+            return self.metrics.to_dict()
+        return self.metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+    
+    async def handle_extract(self, body: Dict[str, Any], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """POST /extract {"path", "mode"（all/text/fields/formatted，默认all）}"""
+        path = self._resolve_path(body)
+        mode = body.get("mode", "all")
+        if mode not in EXTRACT_MODES or mode == "qa":
+            raise HTTPError(400, f"不支持的提取模式: {mode}")
+        result, cached = await self.get_extraction(path, mode)
+        return {
+            "file": body["path"],
+            "mode": mode,
+            "pages": result["pages"],
+            "content": result["content"],
+            "cached": cached,
+            "seconds": result["seconds"],
+            "rss_growth_mb": result["rss_growth_mb"]
+        }
+    
+    async def handle_fields(self, body: Dict[str, Any], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """POST /fields {"path"}：解释后的表单字段和字段标签"""
+        path = self._resolve_path(body)
+        result, cached = await self.get_extraction(path, "qa")
+        return {
+            "file": body["path"],
+            "fields": result["content"]["fields"],
+            "labels": result["content"]["labels"],
+            "cached": cached
+        }
+    
+    @staticmethod
+    def _ask_options(body: Dict[str, Any]) -> Dict[str, Any]:
+        options = {}
+        for key in ("use_field_lookup", "use_cache"):
+            if key in body:
+                options[key] = bool(body[key])
+        for key in ("temperature", "max_tokens"):
+            if key in body:
+                options[key] = body[key]
+        return options
+    
+    async def handle_ask(self, body: Dict[str, Any], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """POST /ask {"path", "question", 可选 use_field_lookup、use_cache、temperature、max_tokens}"""
+        path = self._resolve_path(body)
+        question = body.get("question")
+        if not question or not isinstance(question, str):
+            raise HTTPError(400, "缺少 question 参数")
+        qa_system, _ = await self.get_qa_system(path)
+        result = await qa_system.aask_detailed(question, **self._ask_options(body))
+        return dict(result, question=question)
+    
+    async def handle_batch_ask(self, body: Dict[str, Any], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        """POST /batch_ask {"path", "questions", 可选 max_concurrency 及 /ask 的参数}"""
+        path = self._resolve_path(body)
+        questions = body.get("questions")
+        if not questions or not isinstance(questions, list):
+            raise HTTPError(400, "缺少 questions 参数")
+        max_concurrency = body.get("max_concurrency", self.max_concurrency)
+        if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency <= 0:
+            raise HTTPError(400, f"max_concurrency 必须是正整数: {max_concurrency!r}")
+        qa_system, _ = await self.get_qa_system(path)
+        options = self._ask_options(body)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        start = time.perf_counter()
+        
+        async def run(question):
+            async with semaphore:
+                try:
+                    result = await qa_system.aask_detailed(str(question), **options)
+                    return dict(result, question=question)
+                except Exception as e:
+                    return {"question": question, "answer": None, "error": str(e)}
+        
+        results = await asyncio.gather(*(run(question) for question in questions))
+        return {
+            "results": results,
+            "wall_time": time.perf_counter() - start,
+            "errors": sum(1 for result in results if result.get("error"))
+        }
+    
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, bytes, str]:
+        """
+        处理一个请求
+        
+        Returns:
+            (状态码, 响应体, Content-Type)
+        """
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                known = any(path == url.path for _, path in self.routes)
+                raise HTTPError(405 if known else 404, f"不支持的请求: {method} {url.path}")
+            try:
+                payload = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "请求体不是有效的JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "请求体必须是JSON对象")
+            result = await handler(payload, parse_qs(url.query))
+            if isinstance(result, tuple):
+                status, data, content_type = 200, result[0].encode("utf-8"), result[1]
+            else:
+                status, data, content_type = 200, _json_body(result), "application/json; charset=utf-8"
+        except HTTPError as e:
+            status, data, content_type = e.status, _json_body({"error": e.message}), "application/json; charset=utf-8"
+        except Exception as e:
+            status, data, content_type = 500, _json_body({"error": str(e)}), "application/json; charset=utf-8"
+        
+        path_label = url.path if handler else "other"
+        self.metrics.inc("server_requests_total", help_text="HTTP请求次数", path=path_label, status=status)
+        self.metrics.observe("server_request_latency_seconds", time.perf_counter() - start,
+                             help_text="HTTP请求耗时（秒）", path=path_label)
+        return status, data, content_type
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的请求（支持HTTP/1.1 keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._write(writer, 400, _json_body({"error": "无效的请求行"}), "application/json", False)
+                    break
+                method, target, version = parts
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                length = int(headers.get("content-length") or 0)
+                if length > self.max_body_bytes:
+                    await self._write(writer, 413, _json_body({"error": "请求体过大"}), "application/json", False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                
+                status, data, content_type = await self.dispatch(method.upper(), target, body)
+                await self._write(writer, status, data, content_type, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: int, data: bytes, content_type: str, keep_alive: bool):
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+    
+    def _warm_pool(self):
+        """预先启动工作进程，第一个请求不必等待进程启动和导入"""
+        if self.pool:
+            for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> int:
+        """
+        开始监听
+        
+        Returns:
+            实际监听的端口（port 为0时由系统分配）
+        """
+        self._loop = asyncio.get_running_loop()
+        await self._loop.run_in_executor(None, self._warm_pool)
+        self.llm_client.warm_up()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+    
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8765):
+        """启动并持续提供服务"""
+        port = await self.start(host, port)
+        print(f"✓ 服务已启动: http://{host}:{port}")
+        print(f"  工作进程: {self.workers}，LLM: {self.llm_client.provider}/{self.llm_client.model}")
+        async with self._server:
+            await self._server.serve_forever()
+    
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        在后台线程的事件循环中启动服务（用于测试或嵌入其他程序）
+        
+        Returns:
+            实际监听的端口
+        """
+        ready = threading.Event()
+        result = {}
+        
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                result["port"] = loop.run_until_complete(self.start(host, port))
+            except Exception as e:
+                result["error"] = e
+                ready.set()
+                return
+            ready.set()
+            loop.run_forever()
+            loop.close()
+        
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["port"]
+    
+    def close(self):
+        """停止监听并关闭工作进程池"""
+        if self._thread and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_server(config: Dict[str, Any], **overrides) -> Tuple[QAServer, str, int]:
+    """
+    从完整配置创建服务
+    
+    Args:
+        config: config.json 的内容（使用 llm、cache、settings、server 部分）
+        **overrides: 覆盖 server 部分的参数（值为None时忽略）
+    
+    Returns:
+        (服务, 监听地址, 端口)
+    """
+    options = dict(DEFAULT_SERVER_CONFIG)
+    options.update(config.get("server", {}))
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    server = QAServer(
+        LLMClientFactory.create_from_config(config.get("llm", {})),
+        answer_cache=create_answer_cache(config.get("cache", {})),
+        extraction_cache=create_extraction_cache(config.get("extraction_cache", {})),
+        workers=options["workers"],
+        max_documents=options["max_documents"],
+        max_document_mb=options["max_document_mb"],
+        max_concurrency=config.get("settings", {}).get("max_concurrency", 4),
+        max_body_bytes=options["max_body_bytes"],
+        root=options["root"]
+    )
+    return server, options["host"], options["port"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description="PDF提取和问答HTTP服务")
+    parser.add_argument("-c", "--config", default="config.json", help="配置文件路径")
+    parser.add_argument("--host", help="监听地址（默认127.0.0.1）")
+    parser.add_argument("-p", "--port", type=int, help="监听端口（默认8765）")
+    parser.add_argument("-j", "--workers", type=int, help="提取PDF的工作进程数（默认2）")
+    parser.add_argument("--root", help="只允许访问该目录下的PDF")
+    args = parser.parse_args(argv)
+    
+    try:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        server, host, port = create_server(config, host=args.host, port=args.port,
+                                           workers=args.workers, root=args.root)
+    except FileNotFoundError:
+        print(f"错误: 找不到配置文件 {args.config}")
+        return 1
+    except Exception as e:
+        print(f"错误: 启动服务失败 - {e}")
+        return 1
+    
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+问题打包
+把多个问题打包到一次LLM请求中，要求LLM按问题编号返回JSON，再拆分为各问题的回答
+"""
+
+import re
+import json
+from typing import Dict, List, Tuple
+
+
+PACKED_INSTRUCTION = (
+    "请根据文档内容依次回答下面的问题。\n"
+    "只输出一个JSON对象，键为问题编号（如 \"q1\"），值为对应问题的回答文本（字符串），"
+    "不要输出JSON以外的任何内容。\n"
+)
+
+# ```json ... ``` 代码块
+CODE_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def make_question_ids(count: int, start: int = 1) -> List[str]:
+    """生成问题编号 q1, q2, ..."""
+    return [f"q{i}" for i in range(start, start + count)]
+
+
+def build_packed_prompt(questions: Dict[str, str]) -> str:
+    """
+    构建打包提问的提示词
+    
+    Args:
+        questions: 问题编号到问题的有序字典
+    
+    Returns:
+        作为用户消息发送的提示词
+    """
+    lines = [PACKED_INSTRUCTION]
+    for question_id, question in questions.items():
+        lines.append(f"{question_id}: {question}")
+    return "\n".join(lines)
+
+
+def _extract_json_object(text: str):
+    """从回复中提取JSON对象（兼容代码块和前后多余文字）"""
+    candidates = CODE_BLOCK_PATTERN.findall(text) + [text]
+    for candidate in candidates:
+        start = candidate.find("{")
+        end = candidate.rfind("}")
+        if start == -1 or end <= start:
+            continue
+        try:
+            data = json.loads(candidate[start:end + 1])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def parse_packed_answer(text: str, question_ids: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    解析并校验打包回答
+    
+    Args:
+        text: LLM回复
+        question_ids: 本次请求包含的问题编号
+    
+    Returns:
+        (成功解析的 问题编号->回答, 需要重试的问题编号列表)
+    """
+    data = _extract_json_object(text or "")
+    if data is None:
+        return {}, list(question_ids)
+    
+    answers = {}
+    failed = []
+    for question_id in question_ids:
+        value = data.get(question_id)
+        if isinstance(value, str) and value.strip():
+            answers[question_id] = value.strip()
+        elif isinstance(value, (int, float, bool)):
+            answers[question_id] = str(value)
+        elif isinstance(value, (list, dict)) and value:
+            answers[question_id] = json.dumps(value, ensure_ascii=False)
+        else:
+            failed.append(question_id)
+    return answers, failed
+
+
+if __name__ == "__main__":
+    questions = dict(zip(make_question_ids(2), ["公司名称是什么？", "公司有多少员工？"]))
+    print(build_packed_prompt(questions))
+    print()
+    print(parse_packed_answer('```json\n{"q1": "Moxtra", "q2": ""}\n```', list(questions)))
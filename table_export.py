@@ -0,0 +1,281 @@
+"""
+宽表导出
+把一批表单PDF的字段导出为一行一个表单、一列一个字段的列式文件：
+安装了pyarrow时输出Parquet或Arrow IPC（字段值字典编码），否则输出CSV。
+不同版本的表单合并为所有字段的并集；提取结果先按行写入临时文件，再按行组写出，内存占用不随表单数增长
+"""
+
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import tempfile
+import argparse
+import importlib.util
+from typing import Dict, Any, Optional, List, Iterator
+
+
+# 每行开头的固定列（字段列按第一次出现的顺序排在后面）
+BASE_COLUMNS = ("_file", "_pages")
+# 与固定列同名或以此开头的字段，列名加上这个前缀，避免与固定列或其他字段重名
+FIELD_PREFIX = "field."
+
+FORMATS = ("parquet", "arrow", "csv")
+EXTENSIONS = {".parquet": "parquet", ".arrow": "arrow", ".arrows": "arrow", ".csv": "csv"}
+
+
+def column_name(field_name: str) -> str:
+    """字段对应的列名：通常就是字段名，与固定列冲突时加 FIELD_PREFIX 前缀"""
+    if field_name in BASE_COLUMNS or field_name.startswith(FIELD_PREFIX):
+        return FIELD_PREFIX + field_name
+    return field_name
+
+
+def pyarrow_available() -> bool:
+    """是否安装了pyarrow（只检查，不导入）"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def resolve_format(output_path: str, output_format: Optional[str] = None) -> str:
+    """
+    确定输出格式：指定的格式优先，否则按扩展名；需要pyarrow的格式在未安装时改为CSV
+    
+    Returns:
+        parquet、arrow 或 csv
+    """
+    output_format = output_format or EXTENSIONS.get(os.path.splitext(output_path)[1].lower(), "parquet")
+    if output_format not in FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}（可用: {', '.join(FORMATS)}）")
+    if output_format != "csv" and not pyarrow_available():
+        print(f"未安装pyarrow，改为输出CSV（pip install pyarrow 后可输出 {output_format}）", file=sys.stderr)
+        return "csv"
+    return output_format
+
+
+class TableExporter:
+    """
+    逐个接收表单的字段值，结束时写出宽表
+    
+    行先以JSON写入临时文件，同时记录字段名的并集；finish() 按 row_group_size 分批读回，
+    每批补齐缺失的列后写成一个行组，任何时候内存中最多只有一个行组
+    """
+    
+    def __init__(self, output_path: str, output_format: Optional[str] = None, row_group_size: int = 10000):
+        """
+        初始化导出器
+        
+        Args:
+            output_path: 输出文件路径
+            output_format: parquet、arrow 或 csv（默认按扩展名，未安装pyarrow时为csv）
+            row_group_size: 每个行组的行数
+        """
+        self.output_format = resolve_format(output_path, output_format)
+        if self.output_format == "csv" and not output_path.lower().endswith(".csv"):
+            output_path = os.path.splitext(output_path)[0] + ".csv"
+        self.output_path = output_path
+        self.row_group_size = row_group_size
+        # 字段名 -> None，按第一次出现的顺序保存所有表单字段的并集
+        self.columns: Dict[str, None] = {}
+        self.rows = 0
+        self.errors = 0
+        directory = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(directory, exist_ok=True)
+        # 临时文件放在输出目录，避免把大量数据写到可能很小的 /tmp
+        self._spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=directory)
+    
+    def add_row(self, pdf_path: str, values: Dict[str, Any], pages: Optional[int] = None):
+        """
+        添加一个表单
+        
+        Args:
+            pdf_path: PDF文件路径
+            values: 字段名到值的字典（None和空字符串写为空值）
+            pages: 页数
+        """
+        values = {column_name(name): str(value) for name, value in values.items()
+                  if value is not None and value != ""}
+        for name in values:
+            if name not in self.columns:
+                self.columns[name] = None
+        self._spool.write(json.dumps([pdf_path, pages, values], ensure_ascii=False) + "\n")
+        self.rows += 1
+    
+    def add_result(self, result: Dict[str, Any]):
+        """添加 batch_extract 的提取结果（records 模式），提取失败的文档只计数"""
+        if result["status"] != "ok":
+            self.errors += 1
+            return
+        values = {record["name"]: record["value"] for record in result["content"]["fields"]}
+        self.add_row(result["file"], values, result.get("pages"))
+    
+    def _row_groups(self) -> Iterator[List[list]]:
+        """按行组读回临时文件中的行"""
+        self._spool.flush()
+        self._spool.seek(0)
+        group = []
+        for line in self._spool:
+            group.append(json.loads(line))
+            if len(group) >= self.row_group_size:
+                yield group
+                group = []
+        if group:
+            yield group
+    
+    def _write_csv(self):
+        with open(self.output_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(list(BASE_COLUMNS) + list(self.columns))
+            for group in self._row_groups():
+                writer.writerows([[path, pages] + [values.get(name) for name in self.columns]
+                                  for path, pages, values in group])
+    
+    def _write_arrow(self):
+        import pyarrow as pa
+        
+        # 字段值重复度高（Yes/No、选项值等），字典编码后每个值只存一次
+        value_type = pa.dictionary(pa.int32(), pa.string())
+        schema = pa.schema([pa.field("_file", pa.string()), pa.field("_pages", pa.int32())] +
+                           [pa.field(name, value_type) for name in self.columns])
+        
+        def to_table(group):
+            arrays = [pa.array([row[0] for row in group], pa.string()),
+                      pa.array([row[1] for row in group], pa.int32())]
+            arrays.extend(pa.array([row[2].get(name) for row in group], pa.string()).dictionary_encode()
+                          for name in self.columns)
+            return pa.Table.from_arrays(arrays, schema=schema)
+        
+        if self.output_format == "parquet":
+            import pyarrow.parquet as pq
+            with pq.ParquetWriter(self.output_path, schema) as writer:
+                for group in self._row_groups():
+                    writer.write_table(to_table(group), row_group_size=len(group))
+        else:
+            # IPC流格式允许每批使用各自的字典（文件格式要求所有批次共用同一个字典）
+            with pa.OSFile(self.output_path, "wb") as sink, pa.ipc.new_stream(sink, schema) as writer:
+                for group in self._row_groups():
+                    writer.write_table(to_table(group))
+    
+    def finish(self) -> Dict[str, Any]:
+        """
+        写出宽表并删除临时文件
+        
+        Returns:
+            {"path", "format", "rows", "columns", "errors"}
+        """
+        try:
+            if self.output_format == "csv":
+                self._write_csv()
+            else:
+                self._write_arrow()
+        finally:
+            self._spool.close()
+        return {
+            "path": self.output_path,
+            "format": self.output_format,
+            "rows": self.rows,
+            "columns": len(BASE_COLUMNS) + len(self.columns),
+            "errors": self.errors
+        }
+
+
+def export_pdfs(pdf_paths: List[str], output_path: str, output_format: Optional[str] = None,
+                workers: int = 2, row_group_size: int = 10000) -> Dict[str, Any]:
+    """
+    提取PDF表单并导出宽表（提取在 batch_extract 的工作进程中进行，结果不在内存中累积）
+    
+    Args:
+        pdf_paths: PDF文件路径列表
+        output_path: 输出文件路径
+        output_format: parquet、arrow 或 csv
+        workers: 工作进程数（0表示在当前进程中提取）
+        row_group_size: 每个行组的行数
+    
+    Returns:
+        导出统计（见 TableExporter.finish）
+    """
+    from batch_extract import BatchExtractor
+    
+    exporter = TableExporter(output_path, output_format, row_group_size)
+    BatchExtractor(workers=workers, mode="records", trace_python=False).run(
+        pdf_paths, exporter.add_result, keep_results=False)
+    return exporter.finish()
+
+
+def export_field_store(db_path: str, output_path: str, output_format: Optional[str] = None,
+                       row_group_size: int = 10000) -> Dict[str, Any]:
+    """
+    从字段库（field_store.py）导出宽表，不需要重新提取PDF
+    
+    Args:
+        db_path: 字段库路径
+        output_path: 输出文件路径
+        output_format: parquet、arrow 或 csv
+        row_group_size: 每个行组的行数
+    
+    Returns:
+        导出统计（见 TableExporter.finish）
+    """
+    from field_store import FieldStore
+    
+    # FieldStore 会创建不存在的数据库，路径写错时应当报错而不是导出一张空表
+    if not os.path.exists(db_path):
+        raise ValueError(f"字段库不存在: {db_path}")
+    store = FieldStore(db_path)
+    exporter = TableExporter(output_path, output_format, row_group_size)
+    with store._connect() as conn:
+        # 按文档顺序逐行读取游标，同一时间只组装一个文档的字段
+        cursor = conn.execute(
+            "SELECT d.id, d.path, d.pages, f.name, f.value FROM documents d "
+            "LEFT JOIN fields f ON f.document_id = d.id ORDER BY d.id"
+        )
+        current, values = None, {}
+        for document_id, path, pages, name, value in cursor:
+            if current is None or document_id != current[0]:
+                if current:
+                    exporter.add_row(current[1], values, current[2])
+                current, values = (document_id, path, pages), {}
+            if name is not None:
+                values[name] = value
+        if current:
+            exporter.add_row(current[1], values, current[2])
+    return exporter.finish()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description="把表单字段导出为宽表（一行一个表单，一列一个字段）")
+    parser.add_argument("pdf_files", nargs="*", help="PDF文件、通配符或目录")
+    parser.add_argument("-o", "--output", required=True, help="输出文件（.parquet、.arrow 或 .csv）")
+    parser.add_argument("--format", choices=FORMATS, help="输出格式（默认按扩展名）")
+    parser.add_argument("--from-store", metavar="DB", help="从字段库导出，不重新提取PDF")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="工作进程数（0表示在当前进程中提取）")
+    parser.add_argument("--row-group-size", type=int, default=10000, help="每个行组的行数")
+    args = parser.parse_args(argv)
+    
+    if bool(args.pdf_files) == bool(args.from_store):
+        parser.error("请指定PDF文件或 --from-store（二选一）")
+    
+    start = time.perf_counter()
+    try:
+        if args.from_store:
+            summary = export_field_store(args.from_store, args.output, args.format, args.row_group_size)
+        else:
+            pdf_paths = []
+            for pattern in args.pdf_files:
+                if os.path.isdir(pattern):
+                    pattern = os.path.join(pattern, "**", "*.pdf")
+                pdf_paths.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+            summary = export_pdfs(pdf_paths, args.output, args.format, args.workers, args.row_group_size)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    
+    print(f"✓ 已导出 {summary['rows']} 行 × {summary['columns']} 列到 {summary['path']}（{summary['format']}），"
+          f"提取失败 {summary['errors']} 个，耗时 {time.perf_counter() - start:.2f}s")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+测试答案缓存：相同文档和问题不重复调用LLM，并验证过期和容量淘汰
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from answer_cache import AnswerCache
+from pdf_qa_system import PDFQASystem
+from llm_client import LLMClient
+from llm_offline import StubClient
+
+
+class CountingClient(LLMClient):
+    """统计调用次数的假LLM客户端"""
+    
+    provider = "fake"
+    model = "fake-model"
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        return f"回答{self.calls}"
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat([{"role": "user", "content": question}], **kwargs)
+
+
+def test_answer_cache():
+    """测试问答系统使用缓存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "cache.sqlite"))
+        client = CountingClient()
+        qa_system = PDFQASystem(client, "New Client Risk Review.pdf",
+                                field_lookup=False, answer_cache=cache)
+        
+        first = qa_system.ask_detailed("What is this document about?")
+        second = qa_system.ask_detailed("  what is this document about ")
+        assert first["source"] == "llm"
+        assert second["source"] == "cache"
+        assert second["answer"] == first["answer"]
+        assert client.calls == 1
+        print("✓ 相同问题命中缓存")
+        
+        third = qa_system.ask_detailed("What is this document about?", temperature=0.1)
+        assert third["source"] == "llm"
+        assert client.calls == 2
+        print("✓ 生成参数不同时不命中缓存")
+        
+        bypass = qa_system.ask_detailed("What is this document about?", use_cache=False)
+        assert bypass["source"] == "llm"
+        assert qa_system.ask_detailed("What is this document about?")["answer"] == bypass["answer"]
+        print("✓ 绕过缓存时刷新缓存")
+
+
+def test_cache_eviction():
+    """测试过期和容量淘汰"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "cache.sqlite"), ttl=0.05, max_entries=2)
+        
+        cache.set("a", "A")
+        time.sleep(0.1)
+        assert cache.get("a") is None
+        print("✓ 过期条目失效")
+        
+        cache.ttl = None
+        for key in ["a", "b", "c"]:
+            cache.set(key, key.upper())
+            time.sleep(0.01)
+        assert cache.stats()["entries"] == 2
+        assert cache.get("a") is None
+        assert cache.get("c") == "C"
+        print("✓ 超出容量时淘汰最久未使用的条目")
+
+
+class ThreadRecordingCache(AnswerCache):
+    """记录读写所在线程的答案缓存"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+    
+    def get(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().get(*args, **kwargs)
+    
+    def set(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().set(*args, **kwargs)
+
+
+def test_async_cache_off_loop():
+    """测试异步提问时答案缓存的读写不在事件循环线程上执行"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ThreadRecordingCache(os.path.join(tmp, "cache.sqlite"))
+        qa_system = PDFQASystem(StubClient(latency=0), "New Client Risk Review.pdf",
+                                field_lookup=False, answer_cache=cache, warm_up=False)
+        
+        async def ask_twice():
+            first = await qa_system.aask_detailed("What is this document about?")
+            second = await qa_system.aask_detailed("What is this document about?")
+            return first, second
+        
+        first, second = asyncio.run(ask_twice())
+        assert first["source"] == "llm" and second["source"] == "cache"
+        assert len(cache.threads) == 3 and threading.get_ident() not in cache.threads
+        print("✓ 异步提问时答案缓存在线程池中读写")
+
+
+if __name__ == "__main__":
+    test_answer_cache()
+    test_cache_eviction()
+    test_async_cache_off_loop()
@@ -0,0 +1,82 @@
+"""
+测试异步问答：aask() 基于异步SDK客户端，多个问题可在同一事件循环中并发
+"""
+
+import time
+import asyncio
+from types import SimpleNamespace
+from llm_client import OpenAIClient, AnthropicClient, LLMClient
+from pdf_qa_system import PDFQASystem
+
+
+class SyncOnlyClient(LLMClient):
+    """只实现同步接口的客户端，异步接口使用基类的默认实现"""
+    
+    def chat(self, messages, **kwargs):
+        return "同步回答"
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat([{"role": "user", "content": question}])
+
+
+def test_openai_aask():
+    """测试OpenAI异步客户端并发请求"""
+    client = OpenAIClient(api_key="test-key")
+    requests = []
+    
+    async def create(**params):
+        requests.append(params)
+        await asyncio.sleep(0.1)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=params["messages"][-1]["content"]))],
+            usage=None
+        )
+    
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    client._create_async_client = lambda: async_client
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    
+    async def run():
+        return await asyncio.gather(*(qa_system.aask(f"问题{i}") for i in range(5)))
+    
+    start = time.perf_counter()
+    answers = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    
+    assert answers == [f"问题{i}" for i in range(5)]
+    assert requests[0]["messages"][0] is qa_system.context_prefix[0]
+    assert elapsed < 0.4
+    print(f"✓ 5个异步请求并发完成，耗时 {elapsed:.2f}s")
+
+
+def test_anthropic_aask():
+    """测试Anthropic异步客户端"""
+    client = AnthropicClient(api_key="test-key")
+    
+    async def create(**params):
+        assert params["system"][0]["cache_control"] == {"type": "ephemeral"}
+        return SimpleNamespace(content=[SimpleNamespace(text="异步回答")], usage=None)
+    
+    client._create_async_client = lambda: SimpleNamespace(messages=SimpleNamespace(create=create))
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    
+    result = asyncio.run(qa_system.aask_detailed("问题"))
+    assert result["answer"] == "异步回答"
+    assert result["source"] == "llm"
+    print("✓ Anthropic异步问答")
+
+
+def test_default_aask():
+    """测试没有异步SDK时回退到线程执行，字段查找仍然生效"""
+    qa_system = PDFQASystem(SyncOnlyClient(), "Business_Information_Form.pdf")
+    
+    assert asyncio.run(qa_system.aask("Summarize the document")) == "同步回答"
+    result = asyncio.run(qa_system.aask_detailed("What is the company name?"))
+    assert result["source"] == "field_lookup"
+    print("✓ 默认异步实现和字段查找")
+
+
+if __name__ == "__main__":
+    test_openai_aask()
+    test_anthropic_aask()
+    test_default_aask()
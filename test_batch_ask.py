@@ -0,0 +1,76 @@
+"""
+测试并发批量提问：结果保持问题顺序，单个问题出错不影响其他问题
+"""
+
+import time
+import threading
+from pdf_qa_system import PDFQASystem
+from llm_client import LLMClient
+
+
+class SlowClient(LLMClient):
+    """模拟有延迟的LLM客户端，记录最大并发数"""
+    
+    def __init__(self, delay=0.1):
+        super().__init__()
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+    
+    def chat(self, messages, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            question = messages[-1]["content"]
+            if "出错" in question:
+                raise RuntimeError("模拟的API错误")
+            return f"回答: {question}"
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat([{"role": "user", "content": question}])
+
+
+def test_concurrent_batch_ask():
+    """测试并发批量提问"""
+    client = SlowClient(delay=0.1)
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    
+    questions = [f"问题{i}" for i in range(8)]
+    questions[3] = "这个问题会出错"
+    
+    report = qa_system.batch_ask_detailed(questions, max_workers=4)
+    
+    assert [item["question"] for item in report["results"]] == questions
+    assert report["results"][0]["answer"] == "回答: 问题0"
+    assert report["results"][3]["error"] == "模拟的API错误"
+    assert report["results"][3]["answer"] is None
+    assert report["errors"] == 1
+    print("✓ 结果保持问题顺序，错误被单独记录")
+    
+    assert client.max_in_flight <= 4
+    assert report["wall_time"] < report["total_latency"]
+    print(f"✓ 最大并发 {client.max_in_flight}, 总耗时 {report['wall_time']:.2f}s, "
+          f"耗时合计 {report['total_latency']:.2f}s")
+    
+    answers = qa_system.batch_ask(questions[:2], max_workers=2)
+    assert list(answers) == questions[:2]
+    print("✓ batch_ask返回按顺序排列的字典")
+
+
+def test_sequential_batch_ask():
+    """测试逐个提问时单个错误不会中断批次"""
+    qa_system = PDFQASystem(SlowClient(delay=0), "New Client Risk Review.pdf", field_lookup=False)
+    answers = qa_system.batch_ask(["问题A", "出错的问题", "问题B"])
+    assert answers == {"问题A": "回答: 问题A", "出错的问题": None, "问题B": "回答: 问题B"}
+    print("✓ 逐个提问时错误不中断批次")
+
+
+if __name__ == "__main__":
+    test_concurrent_batch_ask()
+    test_sequential_batch_ask()
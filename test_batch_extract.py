@@ -0,0 +1,85 @@
+"""
+测试批量提取的峰值内存记录、内存上限和工作进程重启
+"""
+
+import os
+import multiprocessing
+import batch_extract
+from batch_extract import BatchExtractor, MemoryMonitor, MemoryLimitExceeded, extract_document
+
+
+SAMPLE_PDFS = ["Business_Information_Form.pdf", "Business_Expense_Reimbursement_Form.pdf", "pdf-form.pdf"]
+
+
+def test_memory_monitor():
+    """测试内存监控记录峰值，超过上限时中断"""
+    with MemoryMonitor() as monitor:
+        data = [bytes(1024) for _ in range(5000)]
+        del data
+    stats = monitor.to_dict()
+    assert stats["peak_traced_mb"] >= 4
+    assert stats["peak_rss_mb"] > 0
+    
+    try:
+        with MemoryMonitor(limit_mb=20, interval=0.005):
+            chunks = []
+            for _ in range(2000):
+                chunks.append(bytes(1024 * 1024))
+        assert False, "应该超过内存上限"
+    except MemoryLimitExceeded as e:
+        assert "20 MB" in str(e)
+    print("✓ 内存监控记录峰值并在超过上限时中断")
+
+
+def test_extract_document():
+    """测试单个文档的提取结果包含峰值内存，超过上限时被标记"""
+    result = extract_document("Business_Information_Form.pdf", mode="fields")
+    assert result["status"] == "ok" and result["content"]
+    assert result["pages"] == 1
+    assert result["peak_traced_mb"] is not None and result["rss_growth_mb"] >= 0
+    
+    result = extract_document("New Client Risk Review.pdf", mode="all", max_document_mb=0.1, sample_interval=0.001)
+    assert result["status"] == "memory_limit" and result["content"] is None
+    
+    result = extract_document("missing.pdf")
+    assert result["status"] == "error"
+    print("✓ 单个文档记录峰值内存，超过上限时标记为 memory_limit")
+
+
+def test_batch_recycle():
+    """测试批量提取的结果顺序和工作进程重启"""
+    extractor = BatchExtractor(workers=2, mode="fields", recycle_after_documents=1)
+    results = extractor.run(SAMPLE_PDFS)
+    assert [result["file"] for result in results] == SAMPLE_PDFS
+    assert all(result["status"] == "ok" for result in results)
+    assert len({result["worker_pid"] for result in results}) == 3
+    assert extractor.stats["recycled"] == 3 and extractor.stats["workers_started"] == 3
+    
+    serial = BatchExtractor(workers=0, mode="fields").run(SAMPLE_PDFS[:1])
+    assert serial[0]["content"] == results[0]["content"]
+    print("✓ 工作进程处理指定数量的文档后重启")
+
+
+def test_worker_crash():
+    """测试工作进程异常退出时定位到具体文件"""
+    if multiprocessing.get_start_method() != "fork":
+        print("（跳过：需要fork启动方式）")
+        return
+    # 模拟被OOM终止的工作进程（fork出的子进程继承这个提取模式）
+    batch_extract.EXTRACT_MODES["crash"] = lambda extractor: os._exit(9)
+    try:
+        extractor = BatchExtractor(workers=1, mode="crash")
+        results = extractor.run(SAMPLE_PDFS[:2])
+    finally:
+        del batch_extract.EXTRACT_MODES["crash"]
+    assert [result["status"] for result in results] == ["crashed", "crashed"]
+    assert results[1]["file"] == SAMPLE_PDFS[1] and "9" in results[1]["error"]
+    assert extractor.stats["crashed"] == 2
+    print("✓ 工作进程异常退出时标记对应的文件")
+
+
+if __name__ == "__main__":
+    test_memory_monitor()
+    test_extract_document()
+    test_batch_recycle()
+    test_worker_crash()
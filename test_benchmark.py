@@ -0,0 +1,60 @@
+"""
+测试提取基准测试：统计耗时和峰值内存，与基线比较发现回归
+"""
+
+import os
+import json
+import tempfile
+import benchmark
+
+
+def test_benchmark_file():
+    """测试单个PDF的基准测试结果"""
+    results = benchmark.benchmark_file("Business_Information_Form.pdf", ["open", "fields"], repeat=3, warmup=0)
+    assert set(results) == {"open", "fields"}
+    for stats in results.values():
+        assert stats["runs"] == 3
+        assert 0 < stats["min"] <= stats["p50"] <= stats["p95"] <= stats["max"]
+        assert stats["peak_memory_kb"] > 0
+    print("✓ 统计 mean/p50/p95 和峰值内存")
+
+
+def test_compare_with_baseline():
+    """测试与基线比较"""
+    current = {"results": {"a.pdf": {"text": {"p50": 0.030}, "open": {"p50": 0.0012}}}}
+    baseline = {"results": {"a.pdf": {"text": {"p50": 0.020}, "open": {"p50": 0.0005}}}}
+    comparisons = {item["operation"]: item for item in benchmark.compare_with_baseline(current, baseline, 0.2)}
+    assert comparisons["text"]["regression"]
+    assert abs(comparisons["text"]["change"] - 0.5) < 1e-9
+    # 慢了一倍多，但绝对差值不到1ms，视为抖动
+    assert not comparisons["open"]["regression"]
+    print("✓ 超过阈值的变慢被判定为回归")
+
+
+def test_main_with_baseline():
+    """测试命令行：保存结果、生成基线、与基线比较"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        baseline = os.path.join(tmp, "baseline.json")
+        args = ["Business_Information_Form.pdf", "--ops", "open", "-n", "2", "-o", output, "--baseline", baseline]
+        
+        assert benchmark.main(args) == 0
+        assert os.path.exists(baseline)
+        
+        # 基线快得离谱时应报告回归
+        with open(baseline, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["results"]["Business_Information_Form.pdf"]["open"]["p50"] = 1e-6
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        assert benchmark.main(args) == 1
+        
+        with open(output, "r", encoding="utf-8") as f:
+            assert "pypdf" in json.load(f)["meta"]
+    print("✓ 命令行保存结果并与基线比较")
+
+
+if __name__ == "__main__":
+    test_benchmark_file()
+    test_compare_with_baseline()
+    test_main_with_baseline()
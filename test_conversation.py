@@ -0,0 +1,65 @@
+"""
+测试多轮对话：追问时带上历史，历史超出预算时被摘要，文档前缀保持不变
+"""
+
+from conversation import ConversationSession, estimate_tokens
+from pdf_qa_system import PDFQASystem
+from llm_client import LLMClient
+
+
+class EchoClient(LLMClient):
+    """记录收到的消息列表的假LLM客户端"""
+    
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+    
+    def chat(self, messages, **kwargs):
+        self.requests.append(messages)
+        return "回答" * 50
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat(self._build_messages(question, context, kwargs.pop("prefix", None)))
+
+
+def test_session_budget():
+    """测试历史裁剪和摘要"""
+    session = ConversationSession([{"role": "system", "content": "文档"}], max_history_tokens=300)
+    for i in range(10):
+        session.add_turn(f"问题{i}", "回答" * 50)
+        assert session.history_tokens() <= 300 or len(session.history) == 2
+    
+    messages = session.build_messages("下一个问题")
+    assert messages[0] == {"role": "system", "content": "文档"}
+    assert "（此前对话摘要）" in messages[1]["content"]
+    assert messages[-1] == {"role": "user", "content": "下一个问题"}
+    assert session.history[-2]["content"] == "问题9"
+    assert estimate_tokens(session.summary) <= session.max_summary_tokens
+    print(f"✓ 历史受预算约束: {session.stats()}")
+
+
+def test_follow_up_questions():
+    """测试追问时带上历史，并且文档前缀不变"""
+    client = EchoClient()
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    session = qa_system.start_session(max_history_tokens=500)
+    
+    qa_system.ask_detailed("列出所有勾选的选项", session=session)
+    qa_system.ask_detailed("第二个呢？", session=session)
+    
+    first, second = client.requests
+    assert first[0] is second[0] is qa_system.context_prefix[0]
+    assert second[1] == {"role": "user", "content": "列出所有勾选的选项"}
+    assert second[-1] == {"role": "user", "content": "第二个呢？"}
+    print("✓ 追问带上历史，文档前缀保持不变")
+    
+    for i in range(10):
+        qa_system.ask_detailed(f"问题{i}", session=session, verbose=False)
+    assert session.history_tokens() <= 500
+    assert client.requests[-1][0] is qa_system.context_prefix[0]
+    print("✓ 长对话的历史不会无限增长")
+
+
+if __name__ == "__main__":
+    test_session_budget()
+    test_follow_up_questions()
@@ -0,0 +1,52 @@
+"""
+测试PDF提取的分阶段计时和计数
+"""
+
+import os
+import tempfile
+from pdf_extractor import PDFExtractor, ExtractionStats, profile_call
+
+
+def test_nested_stages():
+    """测试嵌套阶段的总耗时和自身耗时"""
+    stats = ExtractionStats()
+    with stats.stage("outer"):
+        with stats.stage("inner"):
+            sum(range(100000))
+    outer, inner = stats.stages["outer"], stats.stages["inner"]
+    assert outer["total"] >= inner["total"]
+    assert abs(outer["self"] - (outer["total"] - inner["total"])) < 1e-9
+    print("✓ 嵌套阶段的自身耗时扣除子阶段")
+
+
+def test_extractor_stats():
+    """测试提取器记录各阶段耗时和计数"""
+    extractor = PDFExtractor("Business_Information_Form.pdf")
+    extractor.get_formatted_content()
+    stats = extractor.stats.to_dict()
+    
+    for stage in ("open", "metadata", "extract_text", "annotations", "get_fields", "form_fields", "format_fields"):
+        assert stats["stages"][stage]["calls"] >= 1, stage
+    assert stats["counters"]["pages"] == 1
+    assert stats["counters"]["widgets"] > 0
+    assert stats["counters"]["characters"] > 0
+    
+    report = extractor.stats.format_report()
+    assert "extract_text" in report and "widgets=" in report
+    print("✓ 提取器记录各阶段耗时和计数")
+    print(report)
+
+
+def test_profile_dump():
+    """测试cProfile数据保存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "extract.prof")
+        content = profile_call(lambda: PDFExtractor("Business_Information_Form.pdf").extract_text(), path, top=3)
+        assert content and os.path.getsize(path) > 0
+    print("✓ cProfile数据已保存")
+
+
+if __name__ == "__main__":
+    test_nested_stages()
+    test_extractor_stats()
+    test_profile_dump()
@@ -0,0 +1,69 @@
+"""
+测试字段直接查找：可确定的问题不调用LLM，其余问题回退到LLM
+"""
+
+from pdf_qa_system import PDFQASystem
+from llm_client import LLMClient
+
+
+class RecordingClient(LLMClient):
+    """记录调用次数的假LLM客户端"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def chat(self, messages, **kwargs):
+        self.calls.append(messages)
+        return "LLM回答"
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat([{"role": "user", "content": question}], **kwargs)
+
+
+def test_field_lookup():
+    """测试字段查找快速路径"""
+    client = RecordingClient()
+    qa_system = PDFQASystem(client, "Business_Information_Form.pdf")
+    
+    result = qa_system.ask_detailed("What is the company name?")
+    assert result["source"] == "field_lookup"
+    assert result["field"] == "company_name"
+    assert result["answer"] == "Moxtra HF Site"
+    
+    result = qa_system.ask_detailed("Does the company have vehicles?")
+    assert result["source"] == "field_lookup"
+    assert result["answer"] == "No"
+    assert not client.calls
+    print("✓ 字段问题直接回答，未调用LLM")
+    
+    result = qa_system.ask_detailed("Summarize the risks described in this document")
+    assert result["source"] == "llm"
+    assert result["answer"] == "LLM回答"
+    assert len(client.calls) == 1
+    print("✓ 无法确定的问题回退到LLM")
+    
+    result = qa_system.ask_detailed("What is the company name?", use_field_lookup=False)
+    assert result["source"] == "llm"
+    print("✓ 可以关闭字段查找")
+
+
+def test_checkbox_lookup():
+    """测试勾选框问题"""
+    qa_system = PDFQASystem(RecordingClient(), "New Client Risk Review.pdf")
+    
+    result = qa_system.ask_detailed("Is 'Company has drivers' checked?")
+    assert result["source"] == "field_lookup"
+    assert result["field"] == "Company has drivers"
+    assert result["answer"].startswith("Yes")
+    print("✓ 勾选框问题直接回答")
+
+    for question in ("Does the company NOT have drivers?", "Company has drivers or not?",
+                     "Does the company have drivers or vehicles?", "公司没有司机吗？", "公司有司机还是车辆？"):
+        assert qa_system.ask_detailed(question)["source"] == "llm", question
+    assert qa_system.ask_detailed("Is 'Company has drivers' not checked?")["source"] == "llm"
+    print("✓ 否定或选择的问题交给LLM")
+
+
+if __name__ == "__main__":
+    test_field_lookup()
+    test_checkbox_lookup()
@@ -0,0 +1,107 @@
+"""
+测试表单字段库：批量入库、按字段值跨文档查询、未变化的文件跳过
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from pypdf import PdfWriter
+from field_store import FieldStore
+from pdf_extractor import PDFExtractor
+from answer_cache import hash_file
+
+
+def test_index_and_query():
+    """测试提取入库、查询勾选的字段和增量更新"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("Business_Information_Form.pdf", "New Client Risk Review.pdf", "pdf-form.pdf"):
+            shutil.copy(name, tmp)
+        paths = sorted(os.path.join(tmp, name) for name in os.listdir(tmp))
+        store = FieldStore(os.path.join(tmp, "fields.sqlite"))
+        
+        counts = store.index_files(paths, workers=0)
+        assert counts == {"indexed": 3, "unchanged": 0, "errors": 0}
+        stats = store.stats()
+        assert stats["documents"] == 3 and stats["fields"] > 50
+        print(f"✓ 入库 {stats['documents']} 个文档、{stats['fields']} 个字段")
+        
+        risk_review = os.path.join(tmp, "New Client Risk Review.pdf")
+        assert store.find_documents("RadioButton5", checked=True) == [risk_review]
+        assert store.find_documents("RadioButton5", checked=False) == []
+        rows = store.query("company_name")
+        assert rows[0]["value"] == "Moxtra HF Site" and rows[0]["type"] == "Tx" and rows[0]["page"] == 1
+        assert {row["name"] for row in store.query(like="%moxo%")} >= {"contact_email", "Textfield0"}
+        print("✓ 按字段名、值、LIKE模式和勾选状态查询")
+        
+        assert store.index_files(paths, workers=0) == {"indexed": 0, "unchanged": 3, "errors": 0}
+        shutil.copy("Business_Information_Form.pdf", risk_review)
+        assert store.index_files(paths, workers=0)["indexed"] == 1
+        assert store.find_documents("RadioButton5") == []
+        assert len(store.find_documents("company_name")) == 2
+        print("✓ 未变化的文件跳过，修改后的文件替换旧字段")
+        
+        assert store.remove(risk_review) and store.get_document(risk_review) is None
+        assert store.get_document(paths[0])["fields"]
+        assert store.get_document(paths[0])["doc_hash"] == hash_file(paths[0])
+        print("✓ 读取和删除单个文档")
+        
+        missing = os.path.join(tmp, "missing.pdf")
+        failed = []
+        counts = store.index_files([paths[0], missing], workers=0, force=True, on_result=failed.append)
+        assert counts == {"indexed": 1, "unchanged": 0, "errors": 1}
+        assert [r["file"] for r in failed if r["status"] == "error"] == [missing]
+        print("✓ 不存在的文件计为错误，其他文件照常入库")
+        
+        store.add_documents([{"path": "relative/form.pdf", "fields": [{"name": "note", "value": "x"}]}])
+        assert store.get_document("relative/form.pdf")["fields"]
+        assert store.find_documents("note") == [os.path.abspath("relative/form.pdf")]
+        print("✓ 相对路径按绝对路径入库和查找")
+
+
+def test_text_field_not_checked():
+    """测试文本框的值为 "Yes" 时不算勾选"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "yes.pdf")
+        writer = PdfWriter(clone_from="Business_Information_Form.pdf")
+        writer.update_page_form_field_values(writer.pages[0], {"company_name": "Yes"}, auto_regenerate=False)
+        writer.write(path)
+        records = {record["name"]: record for record in PDFExtractor(path).get_field_records()}
+        assert records["company_name"]["value"] == "Yes" and records["company_name"]["type"] == "Tx"
+        assert not records["company_name"]["is_checked"]
+    print("✓ 只有按钮字段有勾选状态")
+
+
+def test_bulk_insert():
+    """测试大量文档在一个事务中写入，查询使用索引"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FieldStore(os.path.join(tmp, "fields.sqlite"))
+        documents = [
+            {"path": f"/forms/{i}.pdf", "metadata": {"Title": f"Form {i}"}, "fields": [
+                {"name": f"field_{j}", "type": "Btn" if j % 2 else "Tx",
+                 "value": ("Yes" if i % 7 == 0 else "No") if j % 2 else f"value {i}",
+                 "is_checked": j % 2 == 1 and i % 7 == 0} for j in range(20)
+            ]} for i in range(2000)
+        ]
+        start = time.perf_counter()
+        assert store.add_documents(documents) == 2000
+        elapsed = time.perf_counter() - start
+        assert store.stats()["fields"] == 40000
+        
+        start = time.perf_counter()
+        paths = store.find_documents("field_3", checked=True)
+        query_time = time.perf_counter() - start
+        assert len(paths) == len(range(0, 2000, 7))
+        
+        with store._connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT document_id FROM fields WHERE name = ? AND is_checked = ?",
+                ("field_3", 1)))
+        assert "idx_fields_name_checked" in plan
+        print(f"✓ 2000个文档、40000个字段写入耗时 {elapsed:.2f}s，查询勾选的文档耗时 {query_time * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_index_and_query()
+    test_text_field_not_checked()
+    test_bulk_insert()
@@ -0,0 +1,100 @@
+"""
+测试表单差异比较：字段和页面文本的增删改、提取结果缓存命中时不解析PDF、只把差异交给问答系统
+"""
+
+import os
+import tempfile
+from pypdf import PdfWriter
+from extraction_cache import ExtractionCache
+from form_diff import diff_pdfs, make_snapshot, diff_snapshots, format_delta
+from pdf_qa_system import PDFQASystem
+from llm_offline import StubClient
+
+ORIGINAL = "Business_Information_Form.pdf"
+
+
+def _write_revision(path: str, values: dict):
+    """复制表单并修改字段值"""
+    writer = PdfWriter(clone_from=ORIGINAL)
+    writer.update_page_form_field_values(writer.pages[0], values, auto_regenerate=False)
+    writer.write(path)
+
+
+def _content(fields: dict, pages: dict) -> dict:
+    """按提取结果缓存的格式构建内容"""
+    text = "\n\n".join(f"=== 第 {page} 页 ===\n{body}" for page, body in pages.items())
+    return {
+        "formatted": f"【PDF文档信息】\nTitle: Form\n\n【文档文本内容】\n{text}\n\n【表单字段内容】\n• a: 1\n",
+        "fields": {name: {"interpreted_value": value} for name, value in fields.items()},
+        "labels": {"company": "Company Name"}
+    }
+
+
+def test_diff_snapshots():
+    """测试字段和页面文本的新增、删除和修改"""
+    old = make_snapshot("v1.pdf", "h1", _content(
+        {"company": "Moxtra", "employees": "10", "fax": "555"},
+        {1: "Section 1\nName: Moxtra", 2: "Appendix"}), pages=3, include_text=True)
+    new = make_snapshot("v2.pdf", "h2", _content(
+        {"company": "Acme", "employees": "10", "email": "a@b.c"},
+        {1: "Section 1\nName: Acme", 3: "Signature"}), pages=3, include_text=True)
+    diff = diff_snapshots(old, new)
+    assert diff["changed"] == {"company": {"old": "Moxtra", "new": "Acme"}}
+    assert diff["added"] == {"email": "a@b.c"} and diff["removed"] == {"fax": "555"}
+    assert diff["unchanged"] == 1 and not diff["identical"]
+    assert diff["pages"] == {"added": [3], "removed": [2], "changed": [1]}
+    assert diff["text_changes"][1] == ["-Name: Moxtra", "+Name: Acme"]
+    assert diff["text_changes"][3] == ["+Signature"]
+    
+    delta = format_delta(diff)
+    assert "• company（Company Name）: Moxtra → Acme" in delta and "=== 第 2 页 ===\n-Appendix" in delta
+    assert "employees" not in delta
+    print("✓ 字段和页面文本的新增、删除、修改")
+
+
+def test_diff_pdfs_with_cache():
+    """测试比较两个PDF，提取结果缓存命中时不再解析PDF"""
+    with tempfile.TemporaryDirectory() as tmp:
+        revision = os.path.join(tmp, "v2.pdf")
+        _write_revision(revision, {"company_name": "Acme Corp"})
+        cache = ExtractionCache(os.path.join(tmp, "cache.sqlite"))
+        
+        first = diff_pdfs(ORIGINAL, revision, cache, include_text=True)
+        assert first["changed"] == {"company_name": {"old": "Moxtra HF Site", "new": "Acme Corp"}}
+        assert not first["added"] and not first["removed"] and not first["text_changes"]
+        assert not first["cached"]
+        
+        second = diff_pdfs(ORIGINAL, revision, cache, include_text=True)
+        assert second["cached"] and second["changed"] == first["changed"]
+        print(f"✓ 首次比较 {first['seconds'] * 1000:.1f}ms，缓存命中后 {second['seconds'] * 1000:.1f}ms")
+        
+        same = diff_pdfs(ORIGINAL, ORIGINAL, cache)
+        assert same["identical"] and same["unchanged"] > 0 and not same["changed"]
+        print("✓ 相同文档没有差异")
+
+
+def test_ask_about_delta():
+    """测试问答系统只把差异作为上下文"""
+    with tempfile.TemporaryDirectory() as tmp:
+        revision = os.path.join(tmp, "v2.pdf")
+        _write_revision(revision, {"company_name": "Acme Corp"})
+        qa_system = PDFQASystem(StubClient(latency=0), warm_up=False)
+        diff = qa_system.load_diff(ORIGINAL, revision)
+        
+        assert qa_system.document_hash == diff["hash"]
+        assert "Moxtra HF Site → Acme Corp" in qa_system.pdf_content
+        full = PDFQASystem(StubClient(latency=0), ORIGINAL, warm_up=False).pdf_content
+        assert len(qa_system.pdf_content) < len(full) / 2
+        result = qa_system.ask_detailed("What changed?", verbose=False)
+        assert result["source"] == "llm"
+        print(f"✓ 差异上下文 {len(qa_system.pdf_content)} 字符（完整内容 {len(full)} 字符）")
+        
+        with_text = qa_system.load_diff(ORIGINAL, revision, include_text=True)
+        assert with_text["hash"] != diff["hash"] and qa_system.document_hash == with_text["hash"]
+        print("✓ 是否比较页面文本的差异上下文使用不同的缓存键")
+
+
+if __name__ == "__main__":
+    test_diff_snapshots()
+    test_diff_pdfs_with_cache()
+    test_ask_about_delta()
@@ -0,0 +1,169 @@
+"""
+测试对冲请求：主客户端停滞时由备用客户端回答，主客户端出错时回退，流式请求的慢速一方被关闭
+"""
+
+import time
+import asyncio
+from llm_client import LLMClient, LLMClientFactory
+from llm_hedge import HedgedClient, LatencyTracker
+from llm_resilience import AIMDLimiter
+
+
+class SlowClient(LLMClient):
+    """按设定延迟回答的假LLM客户端"""
+    
+    def __init__(self, name, delay=0.0, fail=False):
+        super().__init__()
+        self.model = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.closed = False
+    
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.model} 失败")
+        self._record_usage({"input_tokens": 10, "output_tokens": 1})
+        return f"{self.model} 的回答"
+    
+    def chat_stream(self, messages, **kwargs):
+        self.calls += 1
+        try:
+            time.sleep(self.delay)
+            for text in (self.model, " 的", "回答"):
+                yield text
+                time.sleep(0.01)
+        finally:
+            self.closed = True
+    
+    async def achat(self, messages, **kwargs):
+        self.calls += 1
+        
+        async def request():
+            await asyncio.sleep(self.delay)
+            return f"{self.model} 的回答"
+        
+        return await self._acall(request)
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat(self._build_messages(question, context, kwargs.pop("prefix", None)))
+
+
+def test_latency_percentile():
+    """测试延迟百分位和对冲等待时间"""
+    tracker = LatencyTracker()
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert tracker.percentile(0.95) == 0.95
+    
+    client = HedgedClient(SlowClient("a"), SlowClient("b"), min_samples=10, min_delay=0.1, max_delay=0.5)
+    assert client.hedge_delay() == 0.5
+    for _ in range(10):
+        client.latency.record(0.2)
+    assert client.hedge_delay() == 0.2
+    print("✓ 对冲等待时间基于主客户端延迟的p95")
+
+
+def test_hedge_on_stall():
+    """测试主客户端快速时不对冲，停滞时由备用客户端回答"""
+    fast = HedgedClient(SlowClient("primary", 0.01), SlowClient("secondary"), delay=0.2)
+    assert fast.ask("问题") == "primary 的回答"
+    assert fast.secondary.calls == 0
+    
+    client = HedgedClient(SlowClient("primary", 2.0), SlowClient("secondary", 0.01), delay=0.1)
+    start = time.perf_counter()
+    assert client.ask("问题") == "secondary 的回答"
+    assert time.perf_counter() - start < 1.0
+    stats = client.get_usage_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    # 用量只由备用客户端记录一次（主请求仍在进行）
+    assert stats["requests"] == 1 and stats["input_tokens"] == 10
+    assert client.last_usage == {"input_tokens": 10, "output_tokens": 1}
+    print("✓ 主客户端停滞时对冲请求先返回")
+
+
+def test_fallback_on_error():
+    """测试主客户端出错时立即回退"""
+    client = HedgedClient(SlowClient("primary", fail=True), SlowClient("secondary"), delay=5.0)
+    start = time.perf_counter()
+    assert client.ask("问题") == "secondary 的回答"
+    assert time.perf_counter() - start < 1.0
+    assert client.get_usage_stats()["fallbacks"] == 1
+    
+    both_fail = HedgedClient(SlowClient("a", fail=True), SlowClient("b", fail=True), delay=0.05)
+    try:
+        both_fail.ask("问题")
+        assert False, "两个客户端都失败时应抛出异常"
+    except RuntimeError as e:
+        assert "a 失败" in str(e)
+    print("✓ 主客户端出错时回退到备用客户端")
+
+
+def test_async_hedge_cancels_loser():
+    """测试异步对冲取消较慢的请求"""
+    client = HedgedClient(SlowClient("primary", 5.0), SlowClient("secondary", 0.01), delay=0.05)
+    
+    async def run():
+        start = time.perf_counter()
+        answer = await client.aask("问题")
+        return answer, time.perf_counter() - start
+    
+    answer, elapsed = asyncio.run(run())
+    assert answer == "secondary 的回答" and elapsed < 1.0
+    print("✓ 异步对冲请求取消较慢的一方")
+
+    primary, secondary = SlowClient("primary", 5.0), SlowClient("secondary", 0.01)
+    primary.limiter = AIMDLimiter(initial=2, max_limit=2)
+    secondary.limiter = AIMDLimiter(initial=2, max_limit=2)
+    client = HedgedClient(primary, secondary, delay=0.05)
+    
+    async def hedge_twice():
+        for _ in range(2):
+            assert await client.aask("问题") == "secondary 的回答"
+        # 让被取消的主请求执行完清理
+        await asyncio.sleep(0.01)
+        return primary.limiter.in_flight, secondary.limiter.in_flight
+    
+    assert asyncio.run(hedge_twice()) == (0, 0)
+    print("✓ 被取消的一方归还并发名额")
+
+
+def test_stream_hedge():
+    """测试流式对冲：先输出的一方胜出，另一方的流被关闭"""
+    primary = SlowClient("primary", 0.5)
+    client = HedgedClient(primary, SlowClient("secondary", 0.0), delay=0.05)
+    assert "".join(client.ask_stream("问题")) == "secondary 的回答"
+    time.sleep(0.6)
+    assert primary.closed
+    
+    client = HedgedClient(SlowClient("primary"), SlowClient("secondary"), delay=1.0)
+    assert "".join(client.ask_stream("问题")) == "primary 的回答"
+    assert client.secondary.calls == 0
+    # 流式请求只记录首个token的延迟，不影响完整回答的对冲等待时间
+    assert len(client.ttft) == 1 and len(client.latency) == 0
+    print("✓ 流式对冲请求")
+
+
+def test_factory():
+    """测试从配置创建对冲客户端"""
+    client = LLMClientFactory.create_from_config({
+        "provider": "hedged",
+        "primary": {"provider": "openai", "api_key": "k", "model": "gpt-4o-mini"},
+        "secondary": {"provider": "anthropic", "api_key": "k", "model": "claude-3-5-haiku-latest"},
+        "hedge": {"percentile": 0.9, "max_delay": 8.0}
+    })
+    assert isinstance(client, HedgedClient)
+    assert client.primary.provider == "openai" and client.secondary.provider == "anthropic"
+    assert client.model == "gpt-4o-mini" and client.hedge_delay() == 8.0
+    print("✓ 从配置创建对冲客户端")
+
+
+if __name__ == "__main__":
+    test_latency_percentile()
+    test_hedge_on_stall()
+    test_fallback_on_error()
+    test_async_hedge_cancels_loser()
+    test_stream_hedge()
+    test_factory()
@@ -0,0 +1,77 @@
+"""
+测试共享连接池：相同配置复用SDK客户端，连接池参数生效，加载PDF时预热连接，异步客户端按事件循环缓存
+"""
+
+import asyncio
+from types import SimpleNamespace
+from llm_client import OpenAIClient, AnthropicClient, LLMClientFactory
+from pdf_qa_system import PDFQASystem
+
+
+def test_shared_sdk_clients():
+    """测试相同 (提供商, base_url, 密钥) 复用同一个SDK客户端"""
+    first = LLMClientFactory.create_from_config({"provider": "openai", "api_key": "pool-key"})
+    second = LLMClientFactory.create_from_config({"provider": "openai", "api_key": "pool-key", "model": "gpt-4"})
+    other_key = OpenAIClient(api_key="other-key")
+    other_url = OpenAIClient(api_key="pool-key", base_url="http://localhost:8000/v1")
+    private = OpenAIClient(api_key="pool-key", shared=False)
+    
+    assert first is not second
+    assert first.client is second.client
+    assert first.client is not other_key.client
+    assert first.client is not other_url.client
+    assert first.client is not private.client
+    assert first.client.max_retries == 0
+    print("✓ 相同配置共享SDK客户端和连接池")
+
+
+def test_http_options():
+    """测试连接池和超时配置"""
+    client = LLMClientFactory.create_from_config({
+        "provider": "anthropic",
+        "api_key": "pool-key",
+        "http": {"timeout": 15.0, "connect_timeout": 2.0, "max_connections": 4, "warm_up": False}
+    })
+    assert client.client.timeout.read == 15.0
+    assert client.client.timeout.connect == 2.0
+    assert client.async_client.timeout.read == 15.0
+    assert AnthropicClient(api_key="pool-key").client is not client.client
+    print("✓ 连接池和超时配置生效")
+
+
+def test_warm_up_on_load():
+    """测试加载PDF时预热连接，共享的SDK客户端只预热一次"""
+    pings = []
+    client = OpenAIClient(api_key="warm-key", shared=False)
+    client.client = SimpleNamespace(models=SimpleNamespace(list=lambda: pings.append(1)))
+    original_warm_up = client.warm_up
+    client.warm_up = lambda: original_warm_up(background=False)
+    
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf")
+    qa_system.load_pdf("Business_Information_Form.pdf")
+    assert pings == [1]
+    
+    PDFQASystem(client, "New Client Risk Review.pdf", warm_up=False)
+    assert pings == [1]
+    print("✓ 加载PDF时预热连接，只预热一次")
+
+
+def test_async_client_per_loop():
+    """测试异步SDK客户端按事件循环缓存，再次 asyncio.run 时重新创建"""
+    client = OpenAIClient(api_key="loop-key", shared=False)
+    
+    async def get_twice():
+        return client.async_client, client.async_client
+    
+    first = asyncio.run(get_twice())
+    second = asyncio.run(get_twice())
+    assert first[0] is first[1]
+    assert second[0] is second[1] and second[0] is not first[0]
+    print("✓ 同一事件循环复用异步客户端，新的事件循环使用新的客户端")
+
+
+if __name__ == "__main__":
+    test_shared_sdk_clients()
+    test_http_options()
+    test_warm_up_on_load()
+    test_async_client_per_loop()
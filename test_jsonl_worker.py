@@ -0,0 +1,65 @@
+"""
+测试JSONL常驻工作模式（使用离线stub客户端）
+"""
+
+import io
+import json
+from llm_offline import StubClient
+from jsonl_worker import JSONLWorker
+
+
+def _run(lines, preload=None, **options):
+    """运行工作进程，返回解析后的响应行"""
+    output = io.StringIO()
+    worker = JSONLWorker(StubClient(latency=0), **options)
+    worker.run(io.StringIO("\n".join(lines) + "\n"), output, preload=preload)
+    return worker, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_requests():
+    """测试 load、ask、fields、info 请求，文档在请求之间保持"""
+    worker, responses = _run([
+        json.dumps({"id": 1, "op": "load", "path": "Business_Information_Form.pdf"}),
+        json.dumps({"id": 2, "op": "ask", "question": "What is the company name?"}),
+        json.dumps({"id": 3, "op": "fields"}),
+        json.dumps({"id": 4, "op": "info"}),
+        json.dumps({"id": 5, "op": "ask", "path": "Business_Information_Form.pdf", "question": "Summarize"})
+    ], low_memory=True)
+    assert [response["id"] for response in responses] == [1, 2, 3, 4, 5]
+    assert all(response["ok"] for response in responses)
+    assert responses[0]["result"]["pages"] == 1
+    assert responses[1]["result"]["answer"] == "Moxtra HF Site"
+    assert "company_name" in responses[2]["result"]["fields"]
+    assert responses[3]["result"]["fields"] == 13  # 与 --info 一样包括空字段
+    assert responses[3]["result"]["metadata"]["Title"]
+    assert responses[4]["result"]["source"] == "llm"
+    assert len(worker.documents) == 1  # 同一文档只加载一次
+    _, qa_system = next(iter(worker.documents.values()))
+    assert qa_system.extractor.stats.stages["open"]["calls"] == 1  # 低内存模式加载后释放了PDF，fields、info 不重新打开
+    print("✓ load、ask、fields、info 请求正常，文档只加载一次")
+
+
+def test_errors_and_stream():
+    """测试错误响应、流式输出和预加载"""
+    _, responses = _run([
+        "not json",
+        json.dumps({"id": "a", "op": "unknown"}),
+        json.dumps({"id": "b", "op": "ask", "question": "x", "path": "missing.pdf"}),
+        json.dumps({"id": "c", "op": "ask", "question": "Summarize", "stream": True})
+    ], preload="Business_Information_Form.pdf")
+    
+    assert responses[0]["id"] is None and responses[0]["ok"]  # 预加载
+    assert responses[1]["id"] is None and not responses[1]["ok"]
+    assert responses[2]["id"] == "a" and "unknown" in responses[2]["error"]
+    assert responses[3]["type"] == "FileNotFoundError"
+    
+    tokens = [r["text"] for r in responses if r.get("event") == "token"]
+    final = responses[-1]
+    assert final["id"] == "c" and final["ok"]
+    assert tokens and "".join(tokens) == final["result"]["answer"]
+    print("✓ 无效请求返回错误，流式提问先输出token事件")
+
+
+if __name__ == "__main__":
+    test_requests()
+    test_errors_and_stream()
@@ -0,0 +1,111 @@
+"""
+测试LLM调用指标：每次调用记录耗时、首个token耗时、token用量和重试次数，可导出JSON和Prometheus格式
+"""
+
+import json
+import asyncio
+from types import SimpleNamespace
+from llm_client import OpenAIClient
+from llm_metrics import MetricsRegistry, Histogram
+from llm_offline import StubClient
+from llm_resilience import RetryPolicy
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+    response = None
+
+
+def test_histogram():
+    """测试直方图的桶计数和百分位估算"""
+    histogram = Histogram((1, 2, 5))
+    for value in (0.5, 1.5, 1.8, 4, 10):
+        histogram.observe(value)
+    data = histogram.to_dict()
+    assert data["count"] == 5 and data["buckets"] == {"1": 1, "2": 3, "5": 4, "+Inf": 5}
+    assert histogram.percentile(0.5) == 2
+    print("✓ 直方图桶计数和百分位")
+    
+    slow = Histogram((1, 2, 5))
+    slow.observe(30)
+    assert slow.percentile(0.95) == 5
+    assert json.loads(json.dumps(slow.to_dict()))["p95"] == 5
+    print("✓ 超出最大桶时百分位返回最大的桶边界，导出为合法JSON")
+
+
+def test_client_metrics():
+    """测试客户端调用自动记录指标"""
+    registry = MetricsRegistry()
+    client = OpenAIClient(api_key="test-key", model="gpt-test")
+    client.metrics = registry
+    client.retry_policy = RetryPolicy(max_retries=2, base_delay=0.001)
+    failures = [FakeRateLimitError()]
+    
+    def create(**params):
+        if failures:
+            raise failures.pop()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="回答"))],
+            usage=SimpleNamespace(prompt_tokens=1500, completion_tokens=20,
+                                  prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+        )
+    
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    client.ask("问题1")
+    client.ask("问题2")
+    
+    labels = {"provider": "openai", "model": "gpt-test"}
+    assert registry.get_counter("llm_requests_total", status="ok", **labels) == 2
+    assert registry.get_counter("llm_retries_total") == 1
+    assert registry.get_counter("llm_input_tokens_total") == 3000
+    assert registry.get_counter("llm_cached_tokens_total") == 2048
+    assert registry.get_histogram("llm_request_latency_seconds", **labels).count == 2
+    assert registry.get_histogram("llm_prompt_tokens", **labels).sum == 3000
+    
+    def bad_request(**params):
+        raise ValueError("bad request")
+    
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=bad_request)))
+    try:
+        client.ask("问题3")
+    except ValueError:
+        pass
+    assert registry.get_counter("llm_requests_total", status="error", **labels) == 1
+    print("✓ 同步调用记录耗时、token、缓存命中和重试")
+
+
+def test_stream_and_async_metrics():
+    """测试流式调用记录首个token耗时，异步调用同样计量"""
+    registry = MetricsRegistry()
+    client = StubClient(latency=0.05, tokens_per_second=0)
+    client.metrics = registry
+    "".join(client.ask_stream("流式问题"))
+    asyncio.run(client.aask("异步问题"))
+    
+    ttft = registry.get_histogram("llm_time_to_first_token_seconds", provider="stub", model="stub")
+    assert ttft.count == 1 and ttft.sum >= 0.05
+    assert registry.get_counter("llm_requests_total") == 2
+    print("✓ 流式调用记录首个token耗时")
+
+
+def test_export():
+    """测试导出JSON和Prometheus格式"""
+    registry = MetricsRegistry()
+    client = StubClient(latency=0, tokens_per_second=0)
+    client.metrics = registry
+    client.ask("问题")
+    
+    data = json.loads(registry.to_json())
+    assert data["counters"]["llm_requests_total"][0]["labels"]["status"] == "ok"
+    text = registry.to_prometheus()
+    assert "# TYPE llm_request_latency_seconds histogram" in text
+    assert 'llm_requests_total{model="stub",provider="stub",status="ok"} 1' in text
+    assert 'llm_request_latency_seconds_bucket{model="stub",provider="stub",le="+Inf"} 1' in text
+    print("✓ 导出JSON和Prometheus文本格式")
+
+
+if __name__ == "__main__":
+    test_histogram()
+    test_client_metrics()
+    test_stream_and_async_metrics()
+    test_export()
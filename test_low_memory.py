@@ -0,0 +1,100 @@
+"""
+测试低内存模式：提取结果与普通模式一致，逐页释放解析的对象，提取后可以释放PdfReader
+"""
+
+import io
+import gc
+import os
+import tempfile
+import tracemalloc
+from pdf_extractor import PDFExtractor
+from pdf_generator import generate_form_pdf
+from pdf_qa_system import PDFQASystem
+from llm_offline import StubClient
+
+PDFS = ["Business_Information_Form.pdf", "New Client Risk Review.pdf", "pdf-form.pdf"]
+
+
+def test_same_results():
+    """测试两种模式提取的文本、格式化内容和表单字段相同"""
+    for pdf_path in PDFS:
+        normal = PDFExtractor(pdf_path, low_memory=False)
+        low = PDFExtractor(pdf_path, low_memory=True)
+        assert low.extract_text() == normal.extract_text()
+        assert low.get_formatted_content() == normal.get_formatted_content()
+        assert low.extract_form_fields() == normal.extract_form_fields()
+        assert low.get_field_records() == normal.get_field_records()
+        
+        output = io.StringIO()
+        assert low.write_text(output) == len(output.getvalue())
+        assert output.getvalue() == normal.extract_text()
+    print(f"✓ {len(PDFS)} 个PDF在两种模式下的提取结果相同，write_text 与 extract_text 一致")
+
+
+def _page_memory(pdf_path: str, low_memory: bool) -> int:
+    """逐页提取文本，返回处理各页之后仍占用内存的最大值（字节，不含页面字典和已产生的文本）"""
+    extractor = PDFExtractor(pdf_path, low_memory=low_memory)
+    len(extractor.reader.pages)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in extractor._iter_page_texts():
+            # 字体等对象有循环引用，先回收再测量
+            gc.collect()
+            peak = max(peak, tracemalloc.get_traced_memory()[0])
+        return peak
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_bounded_by_page():
+    """测试低内存模式下解析占用的内存不随页数增长，普通模式随页数增长"""
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = {}
+        for pages in (20, 160):
+            path = os.path.join(tmp, f"{pages}.pdf")
+            generate_form_pdf(path, pages=pages, text_lines=10, fields_per_page=2)
+            memory[pages] = {low: _page_memory(path, low) for low in (True, False)}
+    assert memory[160][True] < memory[20][True] * 2
+    assert memory[160][False] > memory[20][False] * 4
+    print(f"✓ 低内存模式 20页 {memory[20][True] // 1024}KB、160页 {memory[160][True] // 1024}KB；"
+          f"普通模式 20页 {memory[20][False] // 1024}KB、160页 {memory[160][False] // 1024}KB")
+
+
+def test_release_and_reopen():
+    """测试逐页释放对象缓存、close() 后重新打开"""
+    extractor = PDFExtractor("New Client Risk Review.pdf", low_memory=True)
+    assert not extractor.reader.stream.closed
+    for _ in extractor._iter_pages():
+        pass
+    assert len(extractor.reader.resolved_objects) == 0
+    
+    normal = PDFExtractor("New Client Risk Review.pdf", low_memory=False)
+    normal.extract_text()
+    assert len(normal.reader.resolved_objects) > 0
+    print("✓ 低内存模式每页处理完后清空对象缓存")
+    
+    stream = extractor._stream
+    extractor.close()
+    assert stream.closed and extractor._reader is None
+    assert extractor.extract_form_fields() == normal.extract_form_fields()
+    extractor.close()
+    print("✓ close() 关闭文件，之后使用时重新打开")
+
+
+def test_qa_system_detach():
+    """测试问答系统在低内存模式下加载后释放PdfReader，仍可回答问题"""
+    qa_system = PDFQASystem(StubClient(latency=0), warm_up=False, low_memory=True)
+    qa_system.load_pdf("Business_Information_Form.pdf")
+    assert qa_system.extractor._reader is None
+    assert qa_system.total_pages == 1
+    assert qa_system.ask("What is the company name?") == "Moxtra HF Site"
+    print("✓ 问答系统加载后只保留提取的内容")
+
+
+if __name__ == "__main__":
+    test_same_results()
+    test_memory_bounded_by_page()
+    test_release_and_reopen()
+    test_qa_system_detach()
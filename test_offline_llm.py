@@ -0,0 +1,133 @@
+"""
+测试离线客户端：stub按延迟和token模型生成回答，replay录制后按请求哈希回放
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+from llm_client import LLMClientFactory
+from llm_offline import StubClient, ReplayClient, ReplayMissError
+from concurrent.futures import ThreadPoolExecutor
+from llm_resilience import RetryPolicy, AIMDLimiter
+from llm_metrics import MetricsRegistry
+from pdf_qa_system import PDFQASystem
+
+
+def test_stub_client():
+    """测试模拟客户端的延迟、用量和缓存命中"""
+    client = LLMClientFactory.create_from_config({
+        "provider": "stub", "latency": 0.05, "tokens_per_second": 1000, "output_tokens": 50
+    })
+    assert isinstance(client, StubClient)
+    prefix = client.build_context_prefix("文档内容" * 200)
+    
+    start = time.perf_counter()
+    assert client.ask("公司名称是什么？", prefix=prefix) == "模拟回答: 公司名称是什么？"
+    assert time.perf_counter() - start >= 0.1
+    assert client.last_usage["output_tokens"] == 50 and client.last_usage["cached_tokens"] == 0
+    
+    client.ask("员工人数？", prefix=prefix)
+    assert client.last_usage["cached_tokens"] > 800
+    
+    assert "".join(client.ask_stream("流式问题", prefix=prefix)) == "模拟回答: 流式问题"
+    assert asyncio.run(client.aask("异步问题")) == "模拟回答: 异步问题"
+    print("✓ stub客户端按延迟和token模型回答")
+
+
+def test_stub_errors_are_retried():
+    """测试模拟限流错误会被重试"""
+    client = StubClient(latency=0, tokens_per_second=0, error_rate=0.5, seed=1)
+    client.retry_policy = RetryPolicy(max_retries=10, base_delay=0.001)
+    for i in range(10):
+        client.ask(f"问题{i}")
+    stats = client.get_usage_stats()
+    assert stats["requests"] == 10 and stats["rate_limited"] > 0
+    print(f"✓ stub模拟的限流错误被重试 ({stats['rate_limited']} 次)")
+
+
+def test_stub_latency_holds_limiter():
+    """测试模拟的延迟期间占用限流名额：并发上限为1时请求依次完成"""
+    client = StubClient(latency=0.05, tokens_per_second=0)
+    client.limiter = AIMDLimiter(initial=1, max_limit=1)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        in_flight = pool.submit(lambda: (time.sleep(0.02), client.limiter.in_flight)[1])
+        list(pool.map(client.ask, ["问题A", "问题B"]))
+    assert in_flight.result() == 1
+    assert time.perf_counter() - start >= 0.1
+    
+    async def ask_both():
+        await asyncio.gather(client.aask("异步A"), client.aask("异步B"))
+    
+    start = time.perf_counter()
+    asyncio.run(ask_both())
+    assert time.perf_counter() - start >= 0.1 and client.limiter.in_flight == 0
+    print("✓ stub客户端在模拟的延迟期间占用限流名额")
+
+
+def test_stub_packed_batch():
+    """测试stub客户端支持打包提问"""
+    qa_system = PDFQASystem(StubClient(latency=0, tokens_per_second=0), "New Client Risk Review.pdf",
+                            field_lookup=False)
+    results = qa_system.batch_ask(["问题A", "问题B", "问题C"], pack_size=3)
+    assert results["问题B"] == "模拟回答: 问题B"
+    print("✓ stub客户端支持打包提问")
+
+
+def test_record_and_replay():
+    """测试录制后离线回放"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cassette = os.path.join(tmp, "cassette.jsonl")
+        recorder = ReplayClient(cassette, inner=StubClient(model="m", latency=0.05), mode="auto")
+        first = recorder.ask("问题1", context="文档")
+        assert recorder.get_usage_stats()["recorded"] == 1
+        assert "".join(recorder.ask_stream("问题2", context="文档")) == "模拟回答: 问题2"
+        
+        player = LLMClientFactory.create_from_config({"provider": "replay", "cassette": cassette, "model": "m"})
+        assert player.mode == "replay"
+        start = time.perf_counter()
+        assert player.ask("问题1", context="文档") == first
+        assert time.perf_counter() - start < 0.05
+        assert player.last_usage["output_tokens"] == 32
+        assert asyncio.run(player.aask("问题2", context="文档")) == "模拟回答: 问题2"
+        assert player.get_usage_stats()["replayed"] == 2
+        
+        try:
+            player.ask("没录过的问题", context="文档")
+            assert False, "没有记录时应报错"
+        except ReplayMissError:
+            pass
+    print("✓ 录制后按请求哈希回放")
+
+
+def test_replay_metrics():
+    """测试录制的请求只计量一次（实际调用的客户端），回放的请求由回放客户端计量"""
+    registry = MetricsRegistry()
+    with tempfile.TemporaryDirectory() as tmp:
+        inner = StubClient(model="m", latency=0)
+        client = ReplayClient(os.path.join(tmp, "cassette.jsonl"), inner=inner, mode="auto")
+        inner.metrics = client.metrics = registry
+        
+        client.ask("问题1")
+        "".join(client.ask_stream("问题2"))
+        asyncio.run(client.aask("问题3"))
+        assert registry.get_counter("llm_requests_total") == 3
+        assert registry.get_counter("llm_requests_total", provider="stub", model="m", status="ok") == 3
+        
+        client.ask("问题1")
+        "".join(client.ask_stream("问题2"))
+        asyncio.run(client.aask("问题3"))
+        assert registry.get_counter("llm_requests_total") == 6
+        assert registry.get_counter("llm_requests_total", provider="replay", model="m", status="ok") == 3
+    print("✓ 录制时每个请求只计量一次")
+
+
+if __name__ == "__main__":
+    test_stub_client()
+    test_stub_errors_are_retried()
+    test_stub_latency_holds_limiter()
+    test_stub_packed_batch()
+    test_record_and_replay()
+    test_replay_metrics()
@@ -0,0 +1,70 @@
+"""
+测试打包提问：多个问题合并为一次请求，只重试解析失败的问题
+"""
+
+import re
+import json
+from pdf_qa_system import PDFQASystem
+from question_packer import parse_packed_answer
+from llm_client import LLMClient
+
+
+class PackedClient(LLMClient):
+    """按编号回答打包问题的假LLM客户端，第一次遇到包含"漏掉"的问题时故意不回答"""
+    
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+        self.skipped = set()
+    
+    def chat(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        answers = {}
+        for question_id, question in re.findall(r"^(q\d+): (.+)$", prompt, re.MULTILINE):
+            if "漏掉" in question and question not in self.skipped:
+                self.skipped.add(question)
+                continue
+            answers[question_id] = f"回答: {question}"
+        return "```json\n" + json.dumps(answers, ensure_ascii=False) + "\n```"
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat([{"role": "user", "content": question}])
+
+
+def test_parse_packed_answer():
+    """测试解析打包回答"""
+    answers, failed = parse_packed_answer('前言 {"q1": "A", "q2": 3, "q3": ""} 结束', ["q1", "q2", "q3", "q4"])
+    assert answers == {"q1": "A", "q2": "3"}
+    assert failed == ["q3", "q4"]
+    
+    answers, failed = parse_packed_answer("不是JSON", ["q1"])
+    assert answers == {} and failed == ["q1"]
+    print("✓ 解析和校验打包回答")
+
+
+def test_packed_batch_ask():
+    """测试打包模式批量提问"""
+    client = PackedClient()
+    qa_system = PDFQASystem(client, "Business_Information_Form.pdf")
+    
+    questions = ["问题1", "问题2", "这个会被漏掉", "问题4", "What is the company name?"]
+    report = qa_system.batch_ask_detailed(questions, pack_size=2)
+    
+    assert [item["question"] for item in report["results"]] == questions
+    assert report["results"][0]["answer"] == "回答: 问题1"
+    assert report["results"][2]["answer"] == "回答: 这个会被漏掉"
+    assert report["results"][4]["source"] == "field_lookup"
+    assert report["errors"] == 0
+    print("✓ 打包回答按问题顺序拆分")
+    
+    # 4个LLM问题分2个包，第二轮只重试漏掉的1个问题
+    assert len(client.prompts) == 3
+    assert "这个会被漏掉" in client.prompts[2]
+    assert "问题4" not in client.prompts[2]
+    print("✓ 只重试解析失败的问题")
+
+
+if __name__ == "__main__":
+    test_parse_packed_answer()
+    test_packed_batch_ask()
@@ -0,0 +1,114 @@
+"""
+测试只做提取的命令行：不读取配置、不导入LLM相关模块，启动时间在预算内
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from pdf_cli import run_command, get_info
+
+PDF = "Business_Information_Form.pdf"
+
+# 只做提取的命令不应导入的模块
+HEAVY_MODULES = ("llm_client", "openai", "anthropic", "asyncio", "sqlite3", "ssl", "answer_cache")
+
+# 导入 pdf_qa_system / pdf_cli 的时间预算（秒，不含延迟导入的pypdf）
+IMPORT_BUDGET = 0.15
+
+
+def _python(code: str) -> str:
+    """在新的解释器中运行代码，返回标准输出"""
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def _import_time(module: str) -> float:
+    """用 -X importtime 测量模块的累计导入时间（秒）"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e6
+    raise AssertionError(f"未找到 {module} 的导入时间")
+
+
+def test_commands():
+    """测试 info、fields、text、json 命令的输出"""
+    info = get_info(PDF)
+    assert info["pages"] == 1 and info["fields"] == 13
+    
+    for command in ("info", "fields", "text", "json"):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            assert run_command(command, PDF) == 0
+        assert output.getvalue().strip(), command
+    
+    output = io.StringIO()
+    with redirect_stdout(output):
+        run_command("fields", PDF, as_json=True)
+    assert json.loads(output.getvalue())["company_name"] == "Moxtra HF Site"
+    assert run_command("info", "missing.pdf") == 1
+    print("✓ info、fields、text、json 命令输出正确，文件不存在时返回1")
+
+
+def test_no_llm_imports():
+    """测试 --info 不需要配置文件，也不导入LLM客户端等模块"""
+    output = _python(
+        "import sys, json, pdf_qa_system\n"
+        f"sys.argv = ['pdf_qa_system.py', {PDF!r}, '--info', '-c', 'missing_config.json']\n"
+        "pdf_qa_system.main()\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    assert "总页数: 1" in output
+    assert "找不到配置文件" not in output
+    assert json.loads(output.strip().splitlines()[-1]) == []
+    print("✓ --info 不读取配置，未导入LLM相关模块")
+
+
+def test_question_json():
+    """测试 -q 与 --json 一起使用时以JSON输出回答，冲突的选项报错"""
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "config.json")
+        with open(config, "w", encoding="utf-8") as f:
+            json.dump({"llm": {"provider": "stub", "latency": 0, "http": {"warm_up": False}},
+                       "cache": {"enabled": False}, "extraction_cache": {"enabled": False}}, f)
+        result = subprocess.run([sys.executable, "pdf_qa_system.py", PDF, "-q", "What is the company name?",
+                                 "--json", "-c", config], capture_output=True, text=True, check=True)
+        answers = json.loads(result.stdout)
+        assert len(answers) == 1 and answers[0]["question"] == "What is the company name?"
+        assert answers[0]["answer"] == "Moxtra HF Site"
+        print("✓ -q 与 --json 一起使用时输出回答的JSON")
+    
+    for extra in (["--info", "--text"], ["--info", "-q", "问题"], ["-i", "--json"]):
+        result = subprocess.run([sys.executable, "pdf_qa_system.py", PDF, *extra], capture_output=True, text=True)
+        # 互斥组的错误信息来自argparse（英文），其他冲突由主函数报告
+        assert result.returncode == 2, extra
+        assert "不能与" in result.stderr or "not allowed with" in result.stderr, extra
+    print("✓ 冲突的选项报错，不再静默忽略")
+
+
+def test_import_budget():
+    """测试导入时间在预算内（pypdf在执行命令时才导入）"""
+    modules = json.loads(_python(
+        "import sys, json, pdf_qa_system, pdf_cli\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    ))
+    assert "pypdf" not in modules
+    assert not set(HEAVY_MODULES) & set(modules)
+    
+    for module in ("pdf_qa_system", "pdf_cli"):
+        seconds = _import_time(module)
+        assert seconds < IMPORT_BUDGET, f"{module} 导入耗时 {seconds * 1000:.0f}ms"
+        print(f"✓ {module} 导入耗时 {seconds * 1000:.1f}ms（预算 {IMPORT_BUDGET * 1000:.0f}ms）")
+
+
+if __name__ == "__main__":
+    test_commands()
+    test_no_llm_imports()
+    test_question_json()
+    test_import_budget()
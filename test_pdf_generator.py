@@ -0,0 +1,63 @@
+"""
+测试合成表单PDF生成器
+"""
+
+import os
+import hashlib
+import tempfile
+from pdf_extractor import PDFExtractor
+from pdf_generator import generate_form_pdf, generate_preset
+
+
+def test_generated_fields():
+    """测试生成的字段数量、层级和值能被提取器读取"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "form.pdf")
+        summary = generate_form_pdf(path, pages=3, text_lines=5, fields_per_page=12, nesting_depth=3,
+                                    checkbox_ratio=0.25, radio_ratio=0.25, filled_fraction=1.0, seed=1)
+        assert summary["pages"] == 3 and summary["fields"] == 36 and summary["filled"] == 36
+        assert summary["widgets"] > summary["fields"]  # 单选按钮组每组多个控件
+        
+        extractor = PDFExtractor(path)
+        assert len(extractor.reader.pages) == 3
+        assert "Section 2" in extractor.extract_text()
+        fields = extractor.extract_form_fields()
+        # 完整名称为 page{n}.level2.field_*（注释中的值另以短名称合并进来）
+        leaves = [name for name in fields if name.startswith("page") and name.split(".")[-1].startswith("field_")]
+        assert len(leaves) == 36
+        assert all(name.count(".") == 2 for name in leaves)
+        assert all(fields[name] not in (None, "", "Off") for name in leaves)
+        assert extractor.stats.to_dict()["counters"]["parent_hops"] > 0
+    print("✓ 字段数量、层级和值可以被提取")
+
+
+def test_filled_fraction_and_seed():
+    """测试未填写字段和相同种子的可重复性"""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"form{i}.pdf") for i in range(2)]
+        for path in paths:
+            summary = generate_form_pdf(path, pages=2, fields_per_page=10, checkbox_ratio=0, radio_ratio=0,
+                                        filled_fraction=0.0, seed=7)
+            assert summary["filled"] == 0
+        digests = [hashlib.sha256(open(path, "rb").read()).hexdigest() for path in paths]
+        assert digests[0] == digests[1]
+        
+        fields = PDFExtractor(paths[0]).extract_form_fields()
+        assert len(fields) == 20 and all(value is None for value in fields.values())
+    print("✓ 未填写的字段没有值，相同种子生成相同文档")
+
+
+def test_preset_reused():
+    """测试预设文档生成后被复用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = generate_preset("small", tmp)
+        mtime = os.path.getmtime(path)
+        assert generate_preset("small", tmp) == path
+        assert os.path.getmtime(path) == mtime
+    print("✓ 预设文档生成后复用")
+
+
+if __name__ == "__main__":
+    test_generated_fields()
+    test_filled_fraction_and_seed()
+    test_preset_reused()
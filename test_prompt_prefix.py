@@ -0,0 +1,124 @@
+"""
+测试稳定的文档前缀：同一文档只构建一次前缀，Anthropic标记cache_control，并记录缓存命中
+"""
+
+from types import SimpleNamespace
+from llm_client import LLMClient, OpenAIClient, AnthropicClient, DOCUMENT_SYSTEM_PROMPT
+from pdf_qa_system import PDFQASystem
+
+
+def fake_openai_response(text, prompt_tokens, cached_tokens):
+    """构造OpenAI格式的响应"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=5,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+        )
+    )
+
+
+def fake_anthropic_response(text, input_tokens, cache_read, cache_creation):
+    """构造Anthropic格式的响应"""
+    return SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=5,
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_creation
+        )
+    )
+
+
+def test_openai_prefix():
+    """测试OpenAI客户端复用前缀并统计缓存命中"""
+    client = OpenAIClient(api_key="test-key")
+    requests = []
+    
+    def create(**params):
+        requests.append(params)
+        cached = 1024 if len(requests) > 1 else 0
+        return fake_openai_response("回答", 1100, cached)
+    
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    qa_system.batch_ask(["问题1", "问题2"])
+    
+    first, second = requests[0]["messages"], requests[1]["messages"]
+    assert first[0] == second[0]
+    assert first[0]["role"] == "system"
+    assert first[0]["content"].startswith(DOCUMENT_SYSTEM_PROMPT)
+    assert first[-1] == {"role": "user", "content": "问题1"}
+    print("✓ 文档前缀在前且逐字节一致")
+    
+    stats = client.get_usage_stats()
+    assert stats["requests"] == 2
+    assert stats["cached_tokens"] == 1024
+    assert client.last_usage["cached_tokens"] == 1024
+    print(f"✓ 缓存命中统计: {stats}")
+
+
+def test_anthropic_prefix():
+    """测试Anthropic客户端使用cache_control"""
+    client = AnthropicClient(api_key="test-key")
+    requests = []
+    
+    def create(**params):
+        requests.append(params)
+        if len(requests) == 1:
+            return fake_anthropic_response("回答", 20, 0, 1500)
+        return fake_anthropic_response("回答", 20, 1500, 0)
+    
+    client.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    qa_system.ask("问题1")
+    result = qa_system.ask_detailed("问题2")
+    
+    system = requests[0]["system"]
+    assert system is requests[1]["system"]
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert requests[1]["messages"] == [{"role": "user", "content": "问题2"}]
+    print("✓ system前缀带有cache_control标记")
+    
+    assert result["usage"]["cached_tokens"] == 1500
+    assert result["usage"]["input_tokens"] == 1520
+    stats = client.get_usage_stats()
+    assert stats["cache_creation_tokens"] == 1500
+    print(f"✓ 缓存命中统计: {stats}")
+
+
+class BaselineClient(LLMClient):
+    """不调用 super().__init__() 的旧式客户端"""
+    
+    model = "baseline"
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        return "回答"
+    
+    def ask(self, question, context=None, **kwargs):
+        return self.chat(self._build_messages(question, context, kwargs.get("prefix")))
+
+
+def test_baseline_subclass():
+    """测试不调用 super().__init__() 的子类仍可使用用量统计和批量提问"""
+    client = BaselineClient()
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False, warm_up=False)
+    answers = qa_system.batch_ask(["问题1", "问题2"], max_workers=2)
+    assert list(answers.values()) == ["回答", "回答"] and client.calls == 2
+    client._record_usage({"input_tokens": 10})
+    assert client.get_usage_stats()["input_tokens"] == 10
+    print("✓ 旧式子类的用量统计在第一次使用时创建")
+
+
+if __name__ == "__main__":
+    test_openai_prefix()
+    test_anthropic_prefix()
+    test_baseline_subclass()
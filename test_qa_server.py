@@ -0,0 +1,111 @@
+"""
+测试本地HTTP服务（使用离线stub客户端）
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from llm_offline import StubClient
+from pdf_generator import generate_form_pdf
+from qa_server import QAServer
+
+
+PDF = "Business_Information_Form.pdf"
+
+
+def _call(port, path, body=None):
+    """发送请求，返回 (状态码, 响应内容)"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data,
+                                     method="POST" if body is not None else "GET")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            text = response.read().decode("utf-8")
+            status = response.status
+    except urllib.error.HTTPError as e:
+        text = e.read().decode("utf-8")
+        status = e.code
+    return status, json.loads(text) if text.startswith("{") else text
+
+
+def test_endpoints():
+    """测试各接口的基本行为和错误处理"""
+    server = QAServer(StubClient(latency=0), workers=1)
+    port = server.start_in_thread()
+    try:
+        status, health = _call(port, "/health")
+        assert status == 200 and health["status"] == "ok" and health["provider"] == "stub"
+        
+        status, result = _call(port, "/extract", {"path": PDF, "mode": "text"})
+        assert status == 200 and "Business Information" in result["content"] and not result["cached"]
+        assert _call(port, "/extract", {"path": PDF, "mode": "text"})[1]["cached"]
+        
+        status, result = _call(port, "/fields", {"path": PDF})
+        assert status == 200 and result["fields"]["company_name"]["interpreted_value"] == "Moxtra HF Site"
+        
+        status, result = _call(port, "/ask", {"path": PDF, "question": "What is the company name?"})
+        assert status == 200 and result["answer"] == "Moxtra HF Site" and result["source"] == "field_lookup"
+        
+        status, result = _call(port, "/batch_ask", {"path": PDF, "questions": ["Summarize the form", "What risks?"]})
+        assert status == 200 and result["errors"] == 0
+        assert [item["source"] for item in result["results"]] == ["llm", "llm"]
+        
+        assert _call(port, "/ask", {"path": "missing.pdf", "question": "x"})[0] == 404
+        assert _call(port, "/ask", {"path": PDF})[0] == 400
+        for max_concurrency in (0, -1, "4", 1.5, None, True):
+            body = {"path": PDF, "questions": ["x"], "max_concurrency": max_concurrency}
+            assert _call(port, "/batch_ask", body)[0] == 400, max_concurrency
+        assert _call(port, "/extract", {"path": PDF, "mode": "bogus"})[0] == 400
+        assert _call(port, "/nowhere")[0] == 404
+        assert _call(port, "/ask")[0] == 405
+        
+        status, metrics = _call(port, "/metrics")
+        assert status == 200 and "server_requests_total" in metrics and "llm_requests_total" in metrics
+    finally:
+        server.close()
+    print("✓ /health、/extract、/fields、/ask、/batch_ask、/metrics 正常工作")
+
+
+def test_concurrent_clients():
+    """测试并发请求：同一文档只提取一次，提取大文档时事件循环不被阻塞"""
+    server = QAServer(StubClient(latency=0.2), workers=2)
+    port = server.start_in_thread()
+    try:
+        questions = [f"Question {i}?" for i in range(8)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda q: _call(port, "/ask", {"path": PDF, "question": q}), questions))
+        elapsed = time.perf_counter() - start
+        assert all(status == 200 for status, _ in results)
+        assert elapsed < 8 * 0.2  # LLM请求并发进行
+        assert server.metrics.get_counter("server_document_cache_total", result="miss") >= 1
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            large = os.path.join(tmp, "large.pdf")
+            generate_form_pdf(large, pages=60, fields_per_page=30)
+            done = threading.Event()
+            
+            def extract():
+                _call(port, "/extract", {"path": large, "mode": "fields"})
+                done.set()
+            
+            threading.Thread(target=extract).start()
+            time.sleep(0.1)
+            start = time.perf_counter()
+            status, _ = _call(port, "/health")
+            assert status == 200 and time.perf_counter() - start < 0.5
+            assert not done.is_set(), "提取应该仍在进行"
+            assert done.wait(60)
+    finally:
+        server.close()
+    print(f"✓ 8个并发提问耗时 {elapsed:.2f}s，提取大文档时 /health 仍立即响应")
+
+
+if __name__ == "__main__":
+    test_endpoints()
+    test_concurrent_clients()
@@ -0,0 +1,241 @@
+"""
+测试重试与自适应并发：限流时退避重试并遵守Retry-After，AIMD限流器按反馈收缩和增长
+"""
+
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+from llm_client import OpenAIClient
+from llm_offline import StubClient
+from llm_resilience import RetryPolicy, AIMDLimiter, classify_error, call_with_retry, acall_with_retry
+
+
+class FakeStatusError(Exception):
+    """带状态码和响应头的假SDK异常"""
+    
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    """与SDK同名的网络错误"""
+
+
+def test_classify_error():
+    """测试错误分类和Retry-After解析"""
+    info = classify_error(FakeStatusError(429, {"retry-after": "2"}))
+    assert info["retryable"] and info["rate_limited"] and info["retry_after"] == 2.0
+    assert classify_error(FakeStatusError(429, {"retry-after-ms": "250"}))["retry_after"] == 0.25
+    assert classify_error(FakeStatusError(503))["retryable"]
+    assert not classify_error(FakeStatusError(400))["retryable"]
+    assert classify_error(APIConnectionError())["retryable"]
+    assert not classify_error(ValueError())["retryable"]
+    print("✓ 错误分类和Retry-After解析")
+
+
+def test_backoff_delay():
+    """测试退避时间"""
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    for attempt in range(6):
+        assert 0 <= policy.compute_delay(attempt) <= min(10.0, 2 ** attempt)
+    assert policy.compute_delay(0, retry_after=3.0) == 3.0
+    assert policy.compute_delay(0, retry_after=60.0) == 10.0
+    assert RetryPolicy(jitter=False).compute_delay(2) == 4.0
+    print("✓ 指数退避带抖动，遵守Retry-After上限")
+
+
+def test_retry_then_success():
+    """测试限流后重试成功，并遵守Retry-After等待"""
+    calls = []
+    
+    def flaky():
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            raise FakeStatusError(429, {"retry-after": "0.2"})
+        return "ok"
+    
+    assert call_with_retry(flaky, RetryPolicy(max_retries=2, base_delay=0.01)) == "ok"
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.19
+    
+    calls.clear()
+    
+    def bad_request():
+        calls.append(time.perf_counter())
+        raise FakeStatusError(400)
+    
+    try:
+        call_with_retry(bad_request, RetryPolicy(max_retries=3))
+        assert False, "不可重试的错误应直接抛出"
+    except FakeStatusError:
+        pass
+    assert len(calls) == 1
+    print("✓ 可重试错误重试成功，不可重试错误直接抛出")
+
+
+def test_aimd_limiter():
+    """测试AIMD限流器的收缩、增长和并发上限"""
+    limiter = AIMDLimiter(initial=8, max_limit=10, decrease_cooldown=0)
+    limiter.acquire()
+    limiter.release(success=False, rate_limited=True)
+    assert limiter.limit == 4
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert 4 < limiter.limit <= 10
+    
+    limiter = AIMDLimiter(initial=2, max_limit=2)
+    peak = [0]
+    lock = threading.Lock()
+    
+    def work():
+        limiter.acquire()
+        with lock:
+            peak[0] = max(peak[0], limiter.in_flight)
+        time.sleep(0.02)
+        limiter.release()
+    
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 2 and limiter.in_flight == 0
+    print("✓ AIMD限流器: 限流减半、成功增长，并发不超过上限")
+
+
+def test_cancelled_calls_release():
+    """测试取消或中断的调用也归还并发名额"""
+    limiter = AIMDLimiter(initial=2, max_limit=2)
+    
+    async def slow():
+        await asyncio.sleep(10)
+    
+    async def fast():
+        return "ok"
+    
+    async def run():
+        tasks = [asyncio.create_task(acall_with_retry(slow, limiter=limiter)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert limiter.in_flight == 2
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert limiter.in_flight == 0
+        return await asyncio.wait_for(acall_with_retry(fast, limiter=limiter), timeout=1)
+    
+    assert asyncio.run(run()) == "ok"
+    
+    def interrupted():
+        raise KeyboardInterrupt
+    
+    try:
+        call_with_retry(interrupted, RetryPolicy(max_retries=3), limiter)
+    except KeyboardInterrupt:
+        pass
+    assert limiter.in_flight == 0
+    print("✓ 取消和中断的调用归还并发名额")
+
+
+def test_async_waiters_fifo():
+    """测试异步等待者按排队顺序获得名额，并能被其他线程的 release() 唤醒"""
+    limiter = AIMDLimiter(initial=1, max_limit=1)
+    order = []
+    
+    async def worker(index):
+        await limiter.acquire_async()
+        order.append(index)
+        await asyncio.sleep(0.01)
+        limiter.release(success=False)
+    
+    async def run():
+        limiter.acquire()
+        tasks = []
+        for index in range(5):
+            tasks.append(asyncio.create_task(worker(index)))
+            await asyncio.sleep(0)
+        # 排队期间取消的等待者不占用名额
+        tasks[2].cancel()
+        threading.Timer(0.05, limiter.release, kwargs={"success": False}).start()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # 释放的名额直接交给排队者，后来者不能插队
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        limiter.release(success=False)
+        assert not limiter.try_acquire()
+        await asyncio.wait_for(waiter, timeout=1)
+        limiter.release(success=False)
+    
+    asyncio.run(run())
+    assert order == [0, 1, 3, 4]
+    assert limiter.in_flight == 0
+    print("✓ 异步等待者先到先得，由 release() 唤醒")
+
+
+def test_stream_holds_slot():
+    """测试流式请求在流读完或关闭之前一直占用并发名额"""
+    client = StubClient(latency=0, tokens_per_second=0, response="一段比较长的流式回答文本")
+    client.limiter = AIMDLimiter(initial=1, max_limit=1)
+    messages = [{"role": "user", "content": "问题"}]
+    
+    stream = client.chat_stream(messages)
+    first = next(stream)
+    assert client.limiter.in_flight == 1
+    assert first + "".join(stream) == "一段比较长的流式回答文本"
+    assert client.limiter.in_flight == 0
+    
+    stream = client.chat_stream(messages)
+    next(stream)
+    assert not client.limiter.try_acquire()
+    stream.close()
+    assert client.limiter.in_flight == 0
+    print("✓ 流式请求读完或关闭后才归还并发名额")
+
+
+def test_client_retries():
+    """测试客户端同步和异步请求的重试统计"""
+    client = OpenAIClient(api_key="test-key")
+    client.retry_policy = RetryPolicy(max_retries=3, base_delay=0.01)
+    client.limiter = AIMDLimiter(initial=4, decrease_cooldown=0)
+    failures = [FakeStatusError(429), FakeStatusError(500)]
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="回答"))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2, prompt_tokens_details=None)
+    )
+    
+    def create(**params):
+        if failures:
+            raise failures.pop(0)
+        return response
+    
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert client.ask("问题") == "回答"
+    stats = client.get_usage_stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 1 and stats["requests"] == 1
+    assert client.limiter.limit == 2
+    
+    failures.append(FakeStatusError(503))
+    
+    async def acreate(**params):
+        return create(**params)
+    
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate)))
+    client._create_async_client = lambda: async_client
+    assert asyncio.run(client.aask("问题")) == "回答"
+    assert client.get_usage_stats()["retries"] == 3
+    print("✓ 客户端同步/异步请求自动重试并记录次数")
+
+
+if __name__ == "__main__":
+    test_classify_error()
+    test_backoff_delay()
+    test_retry_then_success()
+    test_aimd_limiter()
+    test_cancelled_calls_release()
+    test_async_waiters_fifo()
+    test_stream_holds_slot()
+    test_client_retries()
@@ -0,0 +1,84 @@
+"""
+测试流式问答：逐段返回回答，记录首个token耗时，并在结束时记录用量
+"""
+
+import time
+from types import SimpleNamespace
+from llm_client import OpenAIClient, AnthropicClient
+from pdf_qa_system import PDFQASystem
+
+
+def openai_chunk(text=None, usage=None):
+    """构造OpenAI流式数据块"""
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeAnthropicStream:
+    """模拟 anthropic 的 MessageStream 上下文管理器"""
+    
+    def __init__(self, texts):
+        self.text_stream = iter(texts)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        return False
+    
+    def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(
+            input_tokens=10, output_tokens=3,
+            cache_read_input_tokens=1000, cache_creation_input_tokens=0
+        ))
+
+
+def test_openai_stream():
+    """测试OpenAI流式问答"""
+    client = OpenAIClient(api_key="test-key")
+    requests = []
+    
+    def create(**params):
+        requests.append(params)
+        
+        def chunks():
+            time.sleep(0.05)
+            yield openai_chunk("你好")
+            time.sleep(0.1)
+            yield openai_chunk("，世界")
+            yield openai_chunk(usage=SimpleNamespace(
+                prompt_tokens=1200, completion_tokens=4,
+                prompt_tokens_details=SimpleNamespace(cached_tokens=1024)
+            ))
+        return chunks()
+    
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    qa_system = PDFQASystem(client, "New Client Risk Review.pdf", field_lookup=False)
+    
+    tokens = []
+    result = qa_system.ask_detailed("问题", stream=True, on_token=tokens.append)
+    
+    assert requests[0]["stream"] is True
+    assert tokens == ["你好", "，世界"]
+    assert result["answer"] == "你好，世界"
+    assert result["ttft"] < result["elapsed"]
+    assert result["usage"]["cached_tokens"] == 1024
+    print(f"✓ OpenAI流式回答，首token {result['ttft']:.2f}s，总耗时 {result['elapsed']:.2f}s")
+
+
+def test_anthropic_stream():
+    """测试Anthropic流式问答"""
+    client = AnthropicClient(api_key="test-key")
+    client.client = SimpleNamespace(messages=SimpleNamespace(
+        stream=lambda **params: FakeAnthropicStream(["第一段", "第二段"])
+    ))
+    
+    chunks = list(client.ask_stream("问题", context="文档"))
+    assert chunks == ["第一段", "第二段"]
+    assert client.last_usage["cached_tokens"] == 1000
+    print("✓ Anthropic流式回答")
+
+
+if __name__ == "__main__":
+    test_openai_stream()
+    test_anthropic_stream()
@@ -0,0 +1,122 @@
+"""
+测试宽表导出：不同版本表单的字段合并为并集，按行组写出，内存占用不随行数增长
+"""
+
+import os
+import csv
+import tempfile
+import unittest
+import tracemalloc
+from table_export import TableExporter, export_pdfs, export_field_store, main, pyarrow_available
+
+PDFS = ["Business_Information_Form.pdf", "New Client Risk Review.pdf", "pdf-form.pdf"]
+
+
+def _synthetic_rows(exporter: TableExporter, rows: int):
+    """添加三个版本的表单：共有字段加各版本独有的字段"""
+    for i in range(rows):
+        version = i % 3
+        values = {f"common_{j}": ("Yes" if (i + j) % 2 else "No") for j in range(20)}
+        values.update({f"v{version}_field_{j}": f"option {j % 4}" for j in range(10)})
+        exporter.add_row(f"/forms/{i}.pdf", values, pages=2)
+
+
+def test_csv_export():
+    """测试从PDF导出CSV：每个表单一行，列为所有字段的并集"""
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = export_pdfs(PDFS, os.path.join(tmp, "wide.csv"), workers=0, row_group_size=2)
+        assert summary["rows"] == 3 and summary["errors"] == 0
+        with open(summary["path"], encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 3 and len(rows[0]) == summary["columns"]
+        by_file = {os.path.basename(row["_file"]): row for row in rows}
+        assert by_file["Business_Information_Form.pdf"]["company_name"] == "Moxtra HF Site"
+        assert by_file["New Client Risk Review.pdf"]["company_name"] == ""
+        assert by_file["New Client Risk Review.pdf"]["RadioButton5"] == "Yes"
+        print(f"✓ 导出 {summary['rows']} 行 × {summary['columns']} 列CSV，缺失的字段为空")
+
+
+def test_column_names():
+    """测试与固定列同名的字段不会覆盖文件路径和页数"""
+    with tempfile.TemporaryDirectory() as tmp:
+        exporter = TableExporter(os.path.join(tmp, "wide.csv"), "csv")
+        exporter.add_row("/forms/a.pdf", {"_file": "附件.pdf", "_pages": "3", "field._file": "x", "name": "A"}, pages=2)
+        summary = exporter.finish()
+        with open(summary["path"], encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert summary["columns"] == 6
+        assert rows[0]["_file"] == "/forms/a.pdf" and rows[0]["_pages"] == "2"
+        assert rows[0]["field._file"] == "附件.pdf" and rows[0]["field._pages"] == "3"
+        assert rows[0]["field.field._file"] == "x" and rows[0]["name"] == "A"
+        print("✓ 与固定列同名的字段加前缀，不覆盖文件路径和页数")
+
+
+def test_missing_store():
+    """测试字段库不存在时报错，不创建空库"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "missing.sqlite")
+        try:
+            export_field_store(db_path, os.path.join(tmp, "wide.csv"), "csv")
+            assert False, "应当抛出ValueError"
+        except ValueError:
+            pass
+        assert main(["--from-store", db_path, "-o", os.path.join(tmp, "wide.csv")]) == 2
+        assert not os.path.exists(db_path)
+        print("✓ 字段库不存在时报错")
+
+
+def test_bounded_memory():
+    """测试大量行按行组写出时内存占用有上限"""
+    with tempfile.TemporaryDirectory() as tmp:
+        exporter = TableExporter(os.path.join(tmp, "wide.csv"), "csv", row_group_size=500)
+        tracemalloc.start()
+        try:
+            _synthetic_rows(exporter, 20000)
+            summary = exporter.finish()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert summary["rows"] == 20000 and summary["columns"] == 2 + 20 + 30
+        assert peak < 10 * 1024 * 1024, f"峰值内存 {peak / 1024 / 1024:.1f} MB"
+        with open(summary["path"], encoding="utf-8") as f:
+            assert sum(1 for _ in f) == 20001
+        print(f"✓ 20000行×52列导出的Python峰值内存 {peak / 1024 / 1024:.1f} MB")
+
+
+def test_arrow_export():
+    """测试Parquet和Arrow IPC输出（字典编码，每个行组的字段并集一致）"""
+    if not pyarrow_available():
+        # pytest 把 unittest.SkipTest 报告为跳过
+        raise unittest.SkipTest("未安装pyarrow，跳过Parquet/Arrow测试")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        exporter = TableExporter(os.path.join(tmp, "wide.parquet"), row_group_size=1000)
+        _synthetic_rows(exporter, 3000)
+        summary = exporter.finish()
+        parquet = pq.ParquetFile(summary["path"])
+        assert parquet.metadata.num_rows == 3000 and parquet.num_row_groups == 3
+        table = parquet.read()
+        assert pa.types.is_dictionary(table.schema.field("common_0").type)
+        assert table.column("v1_field_0").null_count == 2000
+        print("✓ Parquet输出按行组写入，字段值字典编码")
+        
+        exporter = TableExporter(os.path.join(tmp, "wide.arrow"), row_group_size=1000)
+        _synthetic_rows(exporter, 3000)
+        summary = exporter.finish()
+        with pa.OSFile(summary["path"], "rb") as source:
+            table = pa.ipc.open_stream(source).read_all()
+        assert table.num_rows == 3000 and table.column("v2_field_3").to_pylist()[2] == "option 3"
+        print("✓ Arrow IPC输出可读回")
+
+
+if __name__ == "__main__":
+    test_csv_export()
+    test_column_names()
+    test_missing_store()
+    test_bounded_memory()
+    try:
+        test_arrow_export()
+    except unittest.SkipTest as e:
+        print(f"- {e}")
@@ -0,0 +1,97 @@
+"""
+测试监视目录自动提取：写入稳定后才提取，内容未变化的文件按哈希跳过，提取结果供问答直接使用
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from extraction_cache import ExtractionCache
+from watch_folder import FolderWatcher
+from pdf_qa_system import PDFQASystem
+from llm_offline import StubClient
+
+PDF = "Business_Information_Form.pdf"
+OTHER_PDF = "New Client Risk Review.pdf"
+
+
+def _step_until_idle(watcher: FolderWatcher, timeout: float = 10.0):
+    """推进监视器直到没有待处理和提取中的文件"""
+    deadline = time.monotonic() + timeout
+    while True:
+        watcher.step(0.05)
+        if watcher.idle:
+            return
+        assert time.monotonic() < deadline, "监视器未在超时前处理完文件"
+
+
+def test_extract_and_skip():
+    """测试已有文件被提取、重复内容和临时文件被跳过、重新启动后按哈希跳过"""
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, "inbox")
+        os.makedirs(inbox)
+        shutil.copy(PDF, os.path.join(inbox, "a.pdf"))
+        shutil.copy(PDF, os.path.join(inbox, "copy_of_a.pdf"))
+        shutil.copy(OTHER_PDF, os.path.join(inbox, "b.pdf"))
+        shutil.copy(PDF, os.path.join(inbox, ".hidden.pdf"))
+        shutil.copy(PDF, os.path.join(inbox, "c.pdf.part"))
+        cache = ExtractionCache(os.path.join(tmp, "extractions.sqlite"))
+        
+        results = []
+        watcher = FolderWatcher(inbox, cache, workers=0, settle_seconds=0, on_result=results.append)
+        watcher.run(once=True)
+        assert watcher.stats == {"extracted": 2, "skipped": 1, "errors": 0}
+        assert sorted(os.path.basename(r["file"]) for r in results) == ["a.pdf", "b.pdf", "copy_of_a.pdf"]
+        assert cache.stats()["entries"] == 2
+        print("✓ 提取新文件，相同内容只提取一次，忽略隐藏和临时文件")
+        
+        watcher = FolderWatcher(inbox, cache, workers=0, settle_seconds=0)
+        watcher.run(once=True)
+        assert watcher.stats == {"extracted": 0, "skipped": 3, "errors": 0}
+        print("✓ 重新启动后内容未变化的文件按哈希跳过")
+        
+        qa_system = PDFQASystem(StubClient(latency=0), extraction_cache=cache, warm_up=False)
+        qa_system.load_pdf(os.path.join(inbox, "a.pdf"))
+        assert cache.hits == 1
+        assert qa_system._extractor is None and qa_system.total_pages == 1
+        assert qa_system.ask_detailed("What is the company name?")["answer"] == "Moxtra HF Site"
+        print("✓ 问答系统直接使用缓存的提取结果，不打开PDF")
+        assert qa_system.extractor.pdf_path == os.path.join(inbox, "a.pdf")
+        print("✓ 需要时再创建提取器")
+
+
+def test_partial_write_and_change():
+    """测试正在写入的文件等稳定后才提取，文件修改后重新提取"""
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, "inbox")
+        os.makedirs(inbox)
+        cache = ExtractionCache(os.path.join(tmp, "extractions.sqlite"))
+        watcher = FolderWatcher(inbox, cache, workers=1, settle_seconds=0.3, poll_interval=0.05)
+        watcher.start()
+        try:
+            with open(PDF, "rb") as f:
+                data = f.read()
+            target = os.path.join(inbox, "form.pdf")
+            chunk = len(data) // 4 + 1
+            with open(target, "wb") as f:
+                for i in range(0, len(data), chunk):
+                    f.write(data[i:i + chunk])
+                    f.flush()
+                    watcher.step(0.1)
+                    assert not watcher.running, "文件仍在写入时不应开始提取"
+            _step_until_idle(watcher)
+            assert watcher.stats == {"extracted": 1, "skipped": 0, "errors": 0}
+            print(f"✓ 分块写入的文件稳定后只提取一次（{'inotify' if watcher.inotify else '轮询'}）")
+            
+            shutil.copy(OTHER_PDF, target)
+            _step_until_idle(watcher)
+            assert watcher.stats["extracted"] == 2
+            assert cache.stats()["entries"] == 2
+            print("✓ 文件内容变化后重新提取")
+        finally:
+            watcher.close()
+
+
+if __name__ == "__main__":
+    test_extract_and_skip()
+    test_partial_write_and_change()
@@ -0,0 +1,398 @@
+"""
+监视目录自动提取
+监视投放目录中新增或修改的PDF（Linux上使用inotify，不可用时轮询），文件大小和修改时间稳定后
+在工作进程池中提取，结果写入提取结果缓存，第一次提问时不必再等待解析PDF；
+内容未变化的文件按内容哈希跳过
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import select
+import signal
+import ctypes
+import ctypes.util
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from answer_cache import hash_file
+from extraction_cache import ExtractionCache, create_extraction_cache
+from batch_extract import extract_document, init_worker
+
+
+# 默认配置（config.json 的 watch 部分）
+DEFAULT_WATCH_CONFIG = {
+    "directory": "inbox",
+    "workers": 2,
+    "settle_seconds": 2.0,
+    "poll_interval": 1.0,
+    "max_document_mb": 1024,
+    "use_inotify": True
+}
+
+# inotify 事件（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """通过ctypes调用inotify监视单个目录（不需要第三方依赖，非Linux平台上创建失败）"""
+    
+    def __init__(self, directory: str):
+        """
+        开始监视目录
+        
+        Raises:
+            OSError: 当前平台不支持inotify或超出监视数量限制
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(f"当前平台不支持inotify: {e}")
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 失败: {os.strerror(error)}")
+        if add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch 失败: {os.strerror(error)}")
+    
+    def read(self, timeout: float) -> Optional[List[str]]:
+        """
+        等待事件
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            发生变化的文件名列表（可能重复）；事件队列溢出时返回None，调用方应重新扫描目录
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+    
+    def close(self):
+        """停止监视"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def is_candidate(name: str) -> bool:
+    """是否是需要处理的PDF（忽略隐藏文件和编辑器、下载工具的临时文件）"""
+    return name.lower().endswith(".pdf") and not name.startswith((".", "~"))
+
+
+class FolderWatcher:
+    """
+    监视目录并增量提取
+    
+    文件的 (大小, 修改时间) 在 settle_seconds 内不再变化才视为写入完成；
+    同一签名的文件只处理一次（成功、跳过或失败），文件再次变化后重新处理
+    """
+    
+    def __init__(self, directory: str, extraction_cache: ExtractionCache, workers: int = 2,
+                 settle_seconds: float = 2.0, poll_interval: float = 1.0,
+                 max_document_mb: Optional[float] = 1024, use_inotify: bool = True,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        初始化监视器
+        
+        Args:
+            directory: 投放目录
+            extraction_cache: 写入提取结果的缓存
+            workers: 提取PDF的工作进程数（0表示在后台线程中提取，不限制内存）
+            settle_seconds: 文件多久不再变化后开始提取（秒）
+            poll_interval: 轮询间隔（秒），使用inotify时为检查待处理文件的间隔
+            max_document_mb: 单个文档提取时的内存上限（MB）
+            use_inotify: 是否尝试使用inotify（不可用时自动改为轮询）
+            on_result: 每个文件处理完成后的回调（可用于更新其他检索索引），
+                参数为 {"file", "status"（extracted/skipped/error）, "doc_hash", "content", ...}
+        """
+        if not os.path.isdir(directory):
+            raise ValueError(f"目录不存在: {directory}")
+        self.directory = directory
+        self.extraction_cache = extraction_cache
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_document_mb = max_document_mb
+        self.use_inotify = use_inotify
+        self.on_result = on_result
+        # 路径 -> (签名, 最近一次变化的时间)
+        self.pending: Dict[str, Tuple[tuple, float]] = {}
+        # 路径 -> 已处理的签名
+        self.processed: Dict[str, tuple] = {}
+        # 提取任务 -> (路径, 签名, 内容哈希)
+        self.running: Dict[Future, Tuple[str, tuple, str]] = {}
+        self.stats = {"extracted": 0, "skipped": 0, "errors": 0}
+        self.pool = None
+        self.inotify: Optional[InotifyWatcher] = None
+        self._stopped = False
+    
+    def _create_pool(self):
+        if self.workers > 0:
+            return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        return ThreadPoolExecutor(max_workers=1)
+    
+    @staticmethod
+    def _signature(path: str) -> Optional[tuple]:
+        """文件的 (大小, 修改时间)，文件不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def notice(self, path: str):
+        """记录一个可能发生变化的文件（新文件或签名变化时进入待处理队列）"""
+        signature = self._signature(path)
+        if signature is None:
+            self.pending.pop(path, None)
+            self.processed.pop(path, None)
+            return
+        if self.processed.get(path) == signature:
+            return
+        if any(task[0] == path and task[1] == signature for task in self.running.values()):
+            return
+        if path not in self.pending or self.pending[path][0] != signature:
+            self.pending[path] = (signature, time.monotonic())
+    
+    def scan(self):
+        """扫描整个目录"""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if is_candidate(entry.name) and entry.is_file():
+                    self.notice(entry.path)
+    
+    def check_pending(self):
+        """重新检查待处理文件，写入已稳定的文件交给工作进程"""
+        now = time.monotonic()
+        for path in list(self.pending):
+            self.notice(path)
+            if path in self.pending:
+                signature, changed_at = self.pending[path]
+                if now - changed_at >= self.settle_seconds:
+                    del self.pending[path]
+                    self._dispatch(path, signature)
+    
+    def _dispatch(self, path: str, signature: tuple):
+        """内容已提取过的文件直接跳过，其余提交给工作进程"""
+        try:
+            doc_hash = hash_file(path)
+        except FileNotFoundError:
+            return
+        if self.extraction_cache.contains(doc_hash) or any(task[2] == doc_hash for task in self.running.values()):
+            self.processed[path] = signature
+            self._report({"file": path, "status": "skipped", "doc_hash": doc_hash})
+            return
+        # 内存上限依赖中断主线程，只在工作进程中生效
+        limit = self.max_document_mb if self.workers > 0 else None
+        future = self.pool.submit(extract_document, path, "qa", limit, trace_python=False)
+        self.running[future] = (path, signature, doc_hash)
+    
+    def collect(self):
+        """处理已完成的提取任务，把结果写入提取结果缓存"""
+        for future in [future for future in self.running if future.done()]:
+            path, signature, doc_hash = self.running.pop(future)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # 工作进程被强制终止（例如OOM）后进程池不可再用，重建后把未完成的文件放回队列
+                broken, self.pool = self.pool, self._create_pool()
+                broken.shutdown(wait=False)
+                for task in self.running.values():
+                    self.pending[task[0]] = (task[1], time.monotonic())
+                self.running.clear()
+                self.processed[path] = signature
+                self._report({"file": path, "status": "error", "doc_hash": doc_hash,
+                              "error": "工作进程异常退出（可能超出内存）"})
+                return
+            
+            if self._signature(path) != signature:
+                # 提取期间文件又被修改，结果作废，等待新内容稳定后重新提取
+                self.notice(path)
+                continue
+            self.processed[path] = signature
+            if result["status"] != "ok":
+                self._report(dict(result, status="error", doc_hash=doc_hash))
+                continue
+            self.extraction_cache.set(doc_hash, result["content"], result.get("pages"), path)
+            self._report(dict(result, status="extracted", doc_hash=doc_hash))
+    
+    def _report(self, result: Dict[str, Any]):
+        """更新统计并调用回调"""
+        key = {"extracted": "extracted", "skipped": "skipped"}.get(result["status"], "errors")
+        self.stats[key] += 1
+        if self.on_result:
+            self.on_result(result)
+    
+    def start(self):
+        """创建工作进程池、开始监视并扫描已有文件"""
+        self.pool = self._create_pool()
+        if self.use_inotify:
+            try:
+                self.inotify = InotifyWatcher(self.directory)
+            except OSError as e:
+                print(f"inotify不可用，改为轮询: {e}", file=sys.stderr)
+        self.scan()
+    
+    def step(self, timeout: Optional[float] = None):
+        """等待一次文件变化（或超时）并推进待处理和提取中的文件"""
+        timeout = self.poll_interval if timeout is None else timeout
+        if self.inotify:
+            names = self.inotify.read(timeout)
+            if names is None:
+                self.scan()
+            else:
+                for name in set(names):
+                    if is_candidate(name):
+                        self.notice(os.path.join(self.directory, name))
+        else:
+            time.sleep(timeout)
+            self.scan()
+        self.check_pending()
+        self.collect()
+    
+    @property
+    def idle(self) -> bool:
+        """没有待处理和提取中的文件"""
+        return not self.pending and not self.running
+    
+    def run(self, once: bool = False):
+        """
+        持续监视直到 stop() 被调用
+        
+        Args:
+            once: 处理完目录中已有的文件后返回（不等待新文件）
+        """
+        if self.pool is None:
+            self.start()
+        try:
+            while not self._stopped:
+                # 有文件等待稳定或正在提取时缩短等待时间，及时处理
+                busy = self.pending or self.running
+                self.step(min(self.poll_interval, 0.1) if busy else self.poll_interval)
+                if once and self.idle:
+                    break
+        finally:
+            self.close()
+    
+    def stop(self):
+        """让 run() 在当前等待结束后返回"""
+        self._stopped = True
+    
+    def close(self):
+        """停止工作进程并关闭inotify"""
+        if self.pool:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+
+def create_watcher(config: Dict[str, Any], directory: Optional[str] = None, on_result=None,
+                   **overrides) -> FolderWatcher:
+    """
+    从完整配置创建监视器
+    
+    Args:
+        config: config.json 的内容（使用 watch 和 extraction_cache 部分）
+        directory: 投放目录（默认读取配置）
+        on_result: 每个文件处理完成后的回调
+        **overrides: 覆盖 watch 部分的参数（值为None时忽略）
+    """
+    options = dict(DEFAULT_WATCH_CONFIG)
+    options.update(config.get("watch", {}))
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    cache_config = dict(config.get("extraction_cache", {}), enabled=True)
+    return FolderWatcher(
+        directory or options["directory"],
+        create_extraction_cache(cache_config),
+        workers=options["workers"],
+        settle_seconds=options["settle_seconds"],
+        poll_interval=options["poll_interval"],
+        max_document_mb=options["max_document_mb"],
+        use_inotify=options["use_inotify"],
+        on_result=on_result
+    )
+
+
+def print_result(result: Dict[str, Any]):
+    """打印单个文件的处理结果"""
+    if result["status"] == "extracted":
+        print(f"✓ 已提取: {result['file']}（{result.get('pages')} 页，耗时 {result.get('seconds')}s）", flush=True)
+    elif result["status"] == "skipped":
+        print(f"- 跳过（内容已提取过）: {result['file']}", flush=True)
+    else:
+        print(f"✗ 提取失败: {result['file']} - {result.get('error')}", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description="监视投放目录并自动提取新的PDF")
+    parser.add_argument("directory", nargs="?", help="投放目录（默认读取配置 watch.directory）")
+    parser.add_argument("-c", "--config", default="config.json", help="配置文件路径（读取 watch 和 extraction_cache 部分）")
+    parser.add_argument("-j", "--workers", type=int, help="工作进程数（0表示在后台线程中提取）")
+    parser.add_argument("--settle", type=float, dest="settle_seconds", help="文件多久不再变化后开始提取（秒）")
+    parser.add_argument("--poll", action="store_true", help="不使用inotify，定期扫描目录")
+    parser.add_argument("--once", action="store_true", help="处理完目录中已有的文件后退出")
+    args = parser.parse_args(argv)
+    
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    
+    try:
+        watcher = create_watcher(config, args.directory, on_result=print_result,
+                                 workers=args.workers, settle_seconds=args.settle_seconds,
+                                 use_inotify=False if args.poll else None)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    
+    # Ctrl+C 和 SIGTERM 都在当前等待结束后停止，等待提取中的文件完成
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: watcher.stop())
+    
+    watcher.start()
+    mode = "inotify" if watcher.inotify else f"轮询（每 {watcher.poll_interval}s）"
+    print(f"监视目录: {watcher.directory}（{mode}），提取结果写入 {watcher.extraction_cache.db_path}", flush=True)
+    watcher.run(once=args.once)
+    print(json.dumps(watcher.stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())